@@ -0,0 +1,75 @@
+"""
+キャンペーン（多数のターゲットへの一括生成）のエンドポイント
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.schemas.dm import CampaignResponse, CampaignTargetStatus, CreateCampaignRequest
+from app.services.campaigns import create_campaign, get_campaign, list_targets, start_campaign, target_counts
+from app.core.security import APIError, NotFoundError
+from app.db.base import get_db
+
+router = APIRouter(prefix="/api/campaigns", tags=["Campaigns"])
+
+
+def _campaign_response(db: Session, campaign, include_targets: bool) -> CampaignResponse:
+    return CampaignResponse(
+        campaign_id=campaign.id,
+        name=campaign.name,
+        status=campaign.status,
+        counts=target_counts(db, campaign.id),
+        batch_ids=campaign.batch_ids or {},
+        error=campaign.error,
+        created_at=campaign.created_at,
+        completed_at=campaign.completed_at,
+        targets=[CampaignTargetStatus(**t) for t in list_targets(db, campaign.id)] if include_targets else None,
+    )
+
+
+@router.post("", response_model=CampaignResponse, status_code=202)
+async def create_dm_campaign(
+    request: CreateCampaignRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    キャンペーンを作成してバックグラウンドで実行を始める
+
+    リサーチは priority=batch で実行し、フック抽出・執筆は全ターゲット分をまとめてバッチ推論に投入する。
+    完了まで数分〜最大24時間かかるので、GET /api/campaigns/{campaign_id} で進捗を確認する。
+    完了したターゲットの生成結果は generation_id で取得できる（/api/export でまとめて取得することもできる）。
+    """
+    try:
+        campaign = create_campaign(
+            db,
+            name=request.name,
+            product_name=request.your_product_name,
+            product_summary=request.your_product_summary,
+            preferred_tones=request.preferred_tones,
+            targets=[
+                {
+                    "target_url": str(t.target_url),
+                    "target_role": t.target_role,
+                    "company_name": t.company_name,
+                }
+                for t in request.targets
+            ],
+        )
+    except APIError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    start_campaign(campaign.id)
+    return _campaign_response(db, campaign, include_targets=False)
+
+
+@router.get("/{campaign_id}", response_model=CampaignResponse)
+async def get_dm_campaign(
+    campaign_id: int,
+    include_targets: bool = Query(False, description="ターゲットごとのステータス・generation_id も返す"),
+    db: Session = Depends(get_db),
+):
+    """
+    キャンペーンの進捗（ターゲットのステータスごとの件数）を取得
+    """
+    try:
+        return _campaign_response(db, get_campaign(db, campaign_id), include_targets)
+    except NotFoundError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
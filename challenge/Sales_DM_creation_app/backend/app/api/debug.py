@@ -0,0 +1,48 @@
+"""
+デバッグ用エンドポイント（遅い実行のトレース参照）
+
+トレースストアはファイルを読むので、イベントループを止めないよう同期関数としてスレッドプールで実行する
+"""
+from fastapi import APIRouter, Query
+
+from app.core.security import NotFoundError
+from app.core.tracing import trace_store
+
+router = APIRouter(prefix="/api/debug", tags=["Debug"])
+
+
+@router.get("/traces")
+def list_traces(
+    limit: int = Query(20, ge=1, le=200),
+    include_spans: bool = Query(False, description="スパンツリーも含めるか"),
+):
+    """
+    保存されたトレースを遅い順に返す
+    """
+    records = trace_store.slowest(limit)
+    if include_spans:
+        return {"traces": records}
+    return {
+        "traces": [
+            {
+                "run_id": r.get("run_id"),
+                "recorded_at": r.get("recorded_at"),
+                "duration_ms": r.get("duration_ms"),
+                "status": r.get("status"),
+                "attrs": r.get("spans", {}).get("attrs", {}),
+                "profiled": "profile" in r,
+            }
+            for r in records
+        ]
+    }
+
+
+@router.get("/traces/{run_id}")
+def get_trace(run_id: str):
+    """
+    1回分のトレース（スパンツリー・プロファイル結果）を返す
+    """
+    record = trace_store.get(run_id)
+    if record is None:
+        raise NotFoundError(f"Trace not found: {run_id}")
+    return record
@@ -1,36 +1,211 @@
 """
 DM生成関連のAPIエンドポイント
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from fastapi.responses import StreamingResponse
 from typing import Optional
-import json
 import asyncio
+import time
+import uuid
 from datetime import datetime
 
 from app.schemas.dm import (
     GenerateDMRequest,
     GenerateDMResponse,
+    GenerateMultiRoleDMRequest,
+    GenerateMultiRoleDMResponse,
     ProgressUpdate,
+    DraftResponse,
+    RegenerateDMRequest,
     SaveDraftRequest,
     SaveDraftResponse,
 )
-from app.services.ai.agents import generate_dm_async
-from app.core.security import APIError, ValidationError
+from app.services.ai.agents import generate_dm_async, generate_multi_role_dm_async, regenerate_dm_async
+from app.services.drafts import create_draft, get_draft, get_draft_version
+from app.services.evidence import load_evidences
+from app.services.generations import (
+    get_generation,
+    get_generation_version,
+    merge_drafts,
+    save_generation,
+    update_generation,
+)
+from app.services.runs import AnyRunLog, RunLog, parse_last_event_id, run_registry
+from app.core.admission import admission, client_id_from_request
+from app.core.config import settings
+from app.core.responses import ORJSONResponse, etag_matches, make_etag, not_modified, set_etag, sse_event
+from app.core.scheduler import Priority, parse_priority
+from app.core.security import APIError, ConflictError, ValidationError, NotFoundError
 from app.db.base import get_db
 from sqlalchemy.orm import Session
 
 router = APIRouter(prefix="/api/dm", tags=["DM Generation"])
 
 
+def _profiling_requested(x_profile: Optional[str]) -> bool:
+    """X-Profile ヘッダーで cProfile の取得が要求されているか"""
+    return settings.profiling_enabled and (x_profile or "").lower() in ("1", "true", "yes")
+
+
+def _dm_response(
+    evidences: list,
+    hooks: list,
+    drafts: list,
+    created_at: datetime,
+    generation_id: Optional[int] = None,
+    run_id: Optional[str] = None,
+) -> ORJSONResponse:
+    """
+    GenerateDMResponse の形のレスポンス
+    
+    evidences / hooks / drafts はパイプラインで検証済みのモデルを dict にしたもの（DB の保存値も同じ）なので、
+    GenerateDMResponse に詰め直して再検証・再ダンプせず、そのまま orjson でエンコードする。
+    """
+    return ORJSONResponse({
+        "generation_id": generation_id,
+        "run_id": run_id,
+        "evidences": evidences,
+        "hooks": hooks,
+        "drafts": drafts,
+        "created_at": created_at,
+    })
+
+
 @router.post("/generate", response_model=GenerateDMResponse)
 async def generate_dm(
     request: GenerateDMRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
+    x_profile: Optional[str] = Header(None),
+    x_request_priority: Optional[str] = Header(None),
 ):
     """
     DMを生成するエンドポイント
+    
+    失敗時は X-Run-ID ヘッダーで run_id を返す。リクエストの run_id に指定して再試行すると
+    最後に完了したステップ（ノード・ドラフト1通単位）から再開する。
+    同じ内容の生成に合流した場合（single-flight）は、実際に実行した生成の run_id を返す。
+    X-Request-Priority: batch を付けると、interactive のリクエストが使っていない
+    プロバイダーの枠だけで実行する（既定は interactive）。
+    """
+    run_id = request.run_id or uuid.uuid4().hex
+    priority = parse_priority(x_request_priority)
+    client_id = client_id_from_request(http_request)
+    async with admission.admit(client_id):
+        try:
+            result = await generate_dm_async(
+                target_url=str(request.target_url),
+                target_role=request.target_role,
+                company_name=request.company_name,
+                your_product_name=request.your_product_name,
+                your_product_summary=request.your_product_summary,
+                preferred_tones=request.preferred_tones,
+                run_id=run_id,
+                profile=_profiling_requested(x_profile),
+                priority=priority,
+                client_id=client_id,
+            )
+            
+            return _dm_response(
+                result["evidences"],
+                result["hooks"],
+                result["drafts"],
+                created_at=datetime.now(),
+                generation_id=result.get("generation_id"),
+                run_id=result.get("run_id", run_id),
+            )
+            
+        except APIError as e:
+            # single-flight のフォロワーにはリーダーの run_id が e.headers に入っている
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=e.message,
+                headers={"X-Run-ID": run_id, **(e.headers or {})},
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Internal server error: {str(e)}",
+                headers={"X-Run-ID": run_id},
+            )
+
+
+@router.post("/generate/multi", response_model=GenerateMultiRoleDMResponse)
+async def generate_multi_role_dm(
+    request: GenerateMultiRoleDMRequest,
+    http_request: Request,
+    x_request_priority: Optional[str] = Header(None),
+):
+    """
+    同じ企業の複数の役職向けにDMを生成するエンドポイント
+    
+    リサーチと分析は1回だけ実行し、役職×トーンのコピーライティングだけを並行実行する。
+    役職ごとに generation_id が振られる。
+    """
+    priority = parse_priority(x_request_priority)
+    client_id = client_id_from_request(http_request)
+    async with admission.admit(client_id):
+        try:
+            result = await generate_multi_role_dm_async(
+                target_url=str(request.target_url),
+                target_roles=request.target_roles,
+                company_name=request.company_name,
+                your_product_name=request.your_product_name,
+                your_product_summary=request.your_product_summary,
+                preferred_tones=request.preferred_tones,
+                priority=priority,
+                client_id=client_id,
+            )
+            
+            # _dm_response と同じく、検証済みの dict をそのままエンコードする
+            return ORJSONResponse({
+                "evidences": result["evidences"],
+                "hooks": result["hooks"],
+                "results": result["results"],
+                "created_at": datetime.now(),
+            })
+            
+        except APIError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Internal server error: {str(e)}"
+            )
+
+
+def _sse_event(run_id: str, seq: int, data: dict) -> bytes:
+    """SSEイベントを組み立てる（id は再接続時の Last-Event-ID になる）"""
+    return sse_event(f"{run_id}:{seq}", data)
+
+
+async def _run_pipeline(
+    run: RunLog,
+    request: GenerateDMRequest,
+    profile: bool,
+    client_id: str,
+    priority: Priority,
+) -> None:
+    """
+    接続とは独立に生成を実行し、進捗と結果を run のイベントログに書き込む
+    
+    呼び出し元で admission.acquire 済みの実行枠は、生成が終わったらここで返す
     """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    def append_progress(update: ProgressUpdate):
+        if not run.done:
+            run.append({
+                "stage": update.stage,
+                "message": update.message,
+                "progress": update.progress,
+            })
+
+    def progress_callback(update: ProgressUpdate):
+        """進捗更新をイベントログに追加（グラフのワーカースレッドからも呼ばれる）"""
+        loop.call_soon_threadsafe(append_progress, update)
+
     try:
         result = await generate_dm_async(
             target_url=str(request.target_url),
@@ -39,128 +214,51 @@ async def generate_dm(
             your_product_name=request.your_product_name,
             your_product_summary=request.your_product_summary,
             preferred_tones=request.preferred_tones,
+            progress_callback=progress_callback,
+            run_id=run.run_id,
+            profile=profile,
+            priority=priority,
+            client_id=client_id,
         )
-        
-        return GenerateDMResponse(
-            generation_id=None,  # TODO: DB保存後にIDを返す
-            evidences=result["evidences"],
-            hooks=result["hooks"],
-            drafts=result["drafts"],
-            created_at=datetime.now(),
-        )
-        
-    except APIError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.message)
+        run.append({"stage": "completed", "result": {"run_id": run.run_id, **result}}, final=True)
+    except asyncio.CancelledError:
+        run.append({"error": "Generation cancelled", "stage": "error", "run_id": run.run_id}, final=True)
+        raise
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Internal server error: {str(e)}"
-        )
+        # run_id を返し、再試行時に途中から再開できるようにする（合流した場合はリーダーの run_id）
+        headers = (e.headers if isinstance(e, APIError) else None) or {}
+        run.append({"error": str(e), "stage": "error", "run_id": headers.get("X-Run-ID", run.run_id)}, final=True)
+    finally:
+        admission.release(client_id, time.perf_counter() - start)
 
 
-@router.post("/generate/stream")
-async def generate_dm_stream(request: GenerateDMRequest):
-    """
-    Server-Sent Events (SSE)で進捗をストリーミングしながらDMを生成
-    """
+def _event_stream(run: AnyRunLog, last_seq: int, http_request: Request):
+    """last_seq より後のイベントを再送し、その後は実行中の生成に合流して配信する"""
+
     async def event_generator():
-        progress_queue = asyncio.Queue()
-        
-        def progress_callback(update: ProgressUpdate):
-            """進捗更新をキューに追加"""
-            try:
-                # 実行中のイベントループを取得
-                loop = asyncio.get_running_loop()
-                # タスクとしてキューに追加
-                asyncio.create_task(progress_queue.put(update))
-            except RuntimeError:
-                # イベントループが実行されていない場合はスキップ
-                # （通常は発生しないはずだが、念のため）
-                pass
-        
-        # バックグラウンドでDM生成を開始
-        async def generate_task():
-            try:
-                await generate_dm_async(
-                    target_url=str(request.target_url),
-                    target_role=request.target_role,
-                    company_name=request.company_name,
-                    your_product_name=request.your_product_name,
-                    your_product_summary=request.your_product_summary,
-                    preferred_tones=request.preferred_tones,
-                    progress_callback=progress_callback,
-                )
-                # 完了シグナル
-                await progress_queue.put(None)
-            except Exception as e:
-                await progress_queue.put({
-                    "error": str(e),
-                    "stage": "error"
-                })
-        
-        # 結果を保持する変数
-        final_result = None
-        error_occurred = None
-        
-        # 生成タスクを開始
-        async def generate_with_result():
-            nonlocal final_result, error_occurred
-            try:
-                result = await generate_dm_async(
-                    target_url=str(request.target_url),
-                    target_role=request.target_role,
-                    company_name=request.company_name,
-                    your_product_name=request.your_product_name,
-                    your_product_summary=request.your_product_summary,
-                    preferred_tones=request.preferred_tones,
-                    progress_callback=progress_callback,
-                )
-                final_result = result
-                await progress_queue.put(None)  # 完了シグナル
-            except Exception as e:
-                error_occurred = str(e)
-                await progress_queue.put({"error": str(e), "stage": "error"})
-        
-        task = asyncio.create_task(generate_with_result())
-        
-        # 進捗をストリーミング
-        while True:
-            try:
-                update = await asyncio.wait_for(progress_queue.get(), timeout=1.0)
-                
-                if update is None:
-                    # 生成完了、最終結果を送信
-                    if final_result:
-                        yield f"data: {json.dumps({'stage': 'completed', 'result': final_result})}\n\n"
-                    break
-                
-                if isinstance(update, dict) and "error" in update:
-                    yield f"data: {json.dumps(update)}\n\n"
-                    break
-                
-                # SSE形式で送信
-                data = {
-                    "stage": update.stage,
-                    "message": update.message,
-                    "progress": update.progress,
-                }
-                yield f"data: {json.dumps(data)}\n\n"
-                
-            except asyncio.TimeoutError:
-                # タイムアウト時もハートビートを送信
-                yield f": heartbeat\n\n"
-                # タスクが完了しているかチェック
-                if task.done():
-                    if error_occurred:
-                        yield f"data: {json.dumps({'error': error_occurred, 'stage': 'error'})}\n\n"
-                    elif final_result:
-                        yield f"data: {json.dumps({'stage': 'completed', 'result': final_result})}\n\n"
-                    break
-                continue
-        
-        # タスクが完了するまで待機
-        await task
-    
+        sent_seq = last_seq
+        run.attach()
+        try:
+            while True:
+                pending = run.events_after(sent_seq)
+                for seq, data in pending:
+                    yield _sse_event(run.run_id, seq, data)
+                    sent_seq = seq
+                if pending:
+                    continue
+                if run.done:
+                    return
+
+                await run.wait_for_change(timeout=1.0)
+                if run.next_seq - 1 > sent_seq:
+                    continue
+                # 切断済みならハートビートを送らずに終了（猶予時間後に生成が止まる）
+                if await http_request.is_disconnected():
+                    return
+                yield b": heartbeat\n\n"
+        finally:
+            run.detach()
+
     return StreamingResponse(
         event_generator(),
         media_type="text/event-stream",
@@ -172,6 +270,189 @@ async def generate_dm_stream(request: GenerateDMRequest):
     )
 
 
+@router.post("/generate/stream")
+async def generate_dm_stream(
+    request: GenerateDMRequest,
+    http_request: Request,
+    x_profile: Optional[str] = Header(None),
+    x_request_priority: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events (SSE)で進捗をストリーミングしながらDMを生成
+    
+    各イベントには "{run_id}:{seq}" 形式の id を付ける。
+    Last-Event-ID ヘッダー付きで再接続すると、取りこぼしたイベントを再送して
+    実行中の生成に合流する（新しい生成は始めない）。
+    失敗した生成の run_id をリクエストに指定すると、最後に完了したステップから再開する。
+    クライアントが切断して stream_resume_grace_seconds 以内に再接続しなければ生成をキャンセルする
+    （同じ結果を待つ single-flight のフォロワーがいなければパイプラインも止まる）。
+    """
+    run_id, last_seq = parse_last_event_id(last_event_id)
+    run = await run_registry.find(run_id) if run_id else None
+    if run is None and request.run_id:
+        # 同じ run_id がまだ実行中ならそれに合流する（最初から配信）
+        existing = await run_registry.find(request.run_id)
+        if existing is not None and not existing.done:
+            run, last_seq = existing, 0
+    if run is None:
+        # 新しい生成を始めるときだけ実行枠を確保する（満杯なら SSE を始める前に 429 / 503 を返す）
+        priority = parse_priority(x_request_priority)
+        client_id = client_id_from_request(http_request)
+        await admission.acquire(client_id)
+        try:
+            run = await run_registry.create(request.run_id)
+            run.task = asyncio.create_task(
+                _run_pipeline(run, request, _profiling_requested(x_profile), client_id, priority)
+            )
+        except ConflictError:
+            admission.release(client_id)
+            # 同じ run_id を実行中（別のワーカーを含む）。ログが見つかればそれに合流し、まだ共有されていなければ 409 を返す
+            run = await run_registry.find(request.run_id)
+            if run is None:
+                raise
+        except BaseException:
+            # _run_pipeline が実行枠を引き継ぐ前に失敗・切断したら、ここで返さないと枠が漏れる
+            # （生成は実行していないので処理時間の推定には含めない）
+            admission.release(client_id)
+            raise
+        last_seq = 0
+    
+    return _event_stream(run, last_seq, http_request)
+
+
+@router.get("/runs/{run_id}/stream")
+async def resume_dm_stream(
+    run_id: str,
+    http_request: Request,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    実行中（または終了直後）の生成のSSEストリームに再接続する
+    
+    EventSource の自動再接続でも使えるよう GET で提供する。
+    Last-Event-ID がなければログに残っている最初のイベントから配信する。
+    """
+    run = await run_registry.find(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Run not found or expired: {run_id}")
+    
+    header_run_id, last_seq = parse_last_event_id(last_event_id)
+    if header_run_id != run_id:
+        last_seq = 0
+    return _event_stream(run, last_seq, http_request)
+
+
+def _etag(content_hash: Optional[str], updated_at: Optional[datetime]) -> Optional[str]:
+    """content_hash がまだない行（マイグレーション前に外部から書かれた行）には ETag を付けない"""
+    return make_etag(content_hash, updated_at) if content_hash else None
+
+
+def _generation_response(db: Session, generation) -> ORJSONResponse:
+    response = _dm_response(
+        load_evidences(db, generation),
+        generation.hooks or [],
+        generation.drafts or [],
+        created_at=generation.created_at or datetime.now(),
+        generation_id=generation.id,
+    )
+    return set_etag(response, _etag(generation.content_hash, generation.updated_at or generation.created_at))
+
+
+@router.get("/generations/{generation_id}", response_model=GenerateDMResponse)
+def get_dm_generation(
+    generation_id: int,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    保存済みの生成結果を取得
+    
+    ETag を返し、If-None-Match が一致すれば evidences / hooks / drafts を読まずに 304 を返す。
+    DB の読み込みがイベントループ（SSE の配信）を止めないよう、同期関数としてスレッドプールで実行する。
+    """
+    try:
+        etag = _etag(*get_generation_version(db, generation_id))
+        if etag and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return _generation_response(db, get_generation(db, generation_id))
+    except NotFoundError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@router.post("/generations/{generation_id}/regenerate", response_model=GenerateDMResponse)
+async def regenerate_dm(
+    generation_id: int,
+    request: RegenerateDMRequest,
+    http_request: Request,
+    db: Session = Depends(get_db),
+    x_request_priority: Optional[str] = Header(None),
+):
+    """
+    保存済みの evidences / hooks を使って、指定トーンのDMだけを再生成する
+    
+    リサーチ（検索）は行わず、from_stage（analyzer / copywriter）からグラフに入る。
+    指定しなかったトーンのドラフトは保存済みのものを残す。
+    ただし analyzer からの場合はフックが変わるので、古いフックで書いたドラフトを残さないよう保存済みの全トーンも書き直す。
+    target_role を変える場合は新しい生成として保存し、元の生成はそのまま残す。
+    """
+    priority = parse_priority(x_request_priority)
+    client_id = client_id_from_request(http_request)
+    async with admission.admit(client_id):
+        try:
+            # DB の読み書きはイベントループを止めないようスレッドで行う
+            generation = await asyncio.to_thread(get_generation, db, generation_id)
+            evidences = await asyncio.to_thread(load_evidences, db, generation)
+            stored_tones = [d["tone"] for d in generation.drafts or []]
+            tones = request.tones or stored_tones or None
+            if request.from_stage == "analyzer" and request.tones:
+                tones = list(dict.fromkeys([*stored_tones, *request.tones]))
+            target_role = request.target_role or generation.target_role
+            
+            result = await regenerate_dm_async(
+                target_url=generation.target_url,
+                target_role=target_role,
+                company_name=generation.company_name,
+                your_product_name=generation.product_name,
+                your_product_summary=generation.product_summary,
+                evidences=evidences,
+                hooks=generation.hooks or [],
+                preferred_tones=tones,
+                from_stage=request.from_stage,
+                priority=priority,
+                client_id=client_id,
+            )
+            
+            if target_role != generation.target_role:
+                generation = await asyncio.to_thread(
+                    save_generation,
+                    db,
+                    target_url=generation.target_url,
+                    target_role=target_role,
+                    company_name=generation.company_name,
+                    product_name=generation.product_name,
+                    product_summary=generation.product_summary,
+                    result=result,
+                )
+            else:
+                generation = await asyncio.to_thread(
+                    update_generation,
+                    db,
+                    generation,
+                    hooks=result["hooks"],
+                    drafts=merge_drafts(generation.drafts, result["drafts"]),
+                )
+            return await asyncio.to_thread(_generation_response, db, generation)
+            
+        except APIError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Internal server error: {str(e)}"
+            )
+
+
 @router.post("/drafts/save", response_model=SaveDraftResponse)
 async def save_draft(
     request: SaveDraftRequest,
@@ -180,8 +461,44 @@ async def save_draft(
     """
     DMドラフトを保存
     """
-    # TODO: DB保存実装
+    draft = create_draft(
+        db,
+        generation_id=request.generation_id,
+        tone=request.tone,
+        title=request.title,
+        body_markdown=request.body_markdown,
+        edited_body=request.edited_body,
+    )
     return SaveDraftResponse(
-        draft_id=1,
+        draft_id=draft.id,
         message="Draft saved successfully"
     )
+
+
+@router.get("/drafts/{draft_id}", response_model=DraftResponse)
+def get_saved_draft(
+    draft_id: int,
+    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    保存済みのDMドラフトを取得（ETag / If-None-Match に対応。スレッドプールで実行する）
+    """
+    try:
+        etag = _etag(*get_draft_version(db, draft_id))
+        if etag and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        draft = get_draft(db, draft_id)
+    except NotFoundError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    response = ORJSONResponse(DraftResponse(
+        draft_id=draft.id,
+        generation_id=draft.generation_id,
+        tone=draft.tone,
+        title=draft.title,
+        body_markdown=draft.body_markdown,
+        edited_body=draft.edited_body,
+        created_at=draft.created_at,
+        updated_at=draft.updated_at,
+    ).model_dump())
+    return set_etag(response, etag)
@@ -0,0 +1,69 @@
+"""
+生成結果・ドラフトのエクスポート用エンドポイント（CRM へのインポート等）
+"""
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.export import ExportFilters, ExportFormat, export_stream
+
+router = APIRouter(prefix="/api/export", tags=["Export"])
+
+_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def _export_response(
+    kind: Literal["generations", "drafts"],
+    fmt: ExportFormat,
+    filters: ExportFilters,
+    gzip: bool,
+) -> StreamingResponse:
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    if gzip:
+        filename += ".gz"
+    return StreamingResponse(
+        export_stream(kind, fmt, filters, gzip=gzip),
+        media_type="application/gzip" if gzip else _MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/generations")
+async def export_generations(
+    format: ExportFormat = Query("jsonl", description="csv / jsonl"),
+    since: Optional[datetime] = Query(None, description="作成日時がこれ以降（UTC）"),
+    until: Optional[datetime] = Query(None, description="作成日時がこれより前（UTC）"),
+    company_name: Optional[str] = Query(None),
+    product_name: Optional[str] = Query(None),
+    gzip: bool = Query(False, description="gzip 圧縮したファイルで返す"),
+):
+    """
+    生成結果（evidences / hooks / drafts を含む）を1件1行でエクスポート
+    
+    行数に関係なく一定のメモリで返す。CSV ではリストのセルを JSON 文字列にする。
+    """
+    filters = ExportFilters(since=since, until=until, company_name=company_name, product_name=product_name)
+    return _export_response("generations", format, filters, gzip)
+
+
+@router.get("/drafts")
+async def export_drafts(
+    format: ExportFormat = Query("csv", description="csv / jsonl"),
+    since: Optional[datetime] = Query(None, description="作成日時がこれ以降（UTC）"),
+    until: Optional[datetime] = Query(None, description="作成日時がこれより前（UTC）"),
+    company_name: Optional[str] = Query(None),
+    product_name: Optional[str] = Query(None),
+    gzip: bool = Query(False, description="gzip 圧縮したファイルで返す"),
+):
+    """
+    生成されたドラフトを1通1行でエクスポート
+    
+    ユーザーが編集して保存した本文があれば edited_body に入る。
+    """
+    filters = ExportFilters(since=since, until=until, company_name=company_name, product_name=product_name)
+    return _export_response("drafts", format, filters, gzip)
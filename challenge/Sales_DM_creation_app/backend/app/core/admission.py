@@ -0,0 +1,190 @@
+"""
+生成リクエストの流量制御（Admission Control）
+
+- 同時に実行する生成は admission_max_concurrent まで。超えた分は上限付きのキューで待つ
+- 1クライアントの実行中 + 待機中が admission_max_per_client を超えたら即座に 429
+- キューが満杯、または admission_queue_timeout_seconds 待っても順番が来なければ 503
+- どちらも Retry-After（平均処理時間とキューの長さからの見積もり）を返す
+
+過負荷時にリクエストを受け入れすぎてスレッドプールやプロバイダーのクォータを食い潰すより、
+早めに断って受け入れたリクエストのレイテンシを安定させる。
+制限はワーカープロセスごと（本番モードでは SERVER_WORKERS 倍が全体の上限になる）。
+"""
+from __future__ import annotations
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+import asyncio
+import math
+import time
+
+from fastapi import Request
+
+from app.core.config import settings
+from app.core.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT,
+)
+from app.core.security import ServiceUnavailableError, TooManyRequestsError
+
+# 処理時間の移動平均の初期値（秒）と平滑化係数
+_INITIAL_SERVICE_SECONDS = 30.0
+_SERVICE_TIME_ALPHA = 0.2
+
+
+def client_id_from_request(request: Request) -> str:
+    """
+    接続元アドレスでクライアントを識別する
+
+    X-Client-ID はクライアントが自由に付けられる（付け替えれば 429 もスケジューラーの重みも回避できる）ので、
+    認証済みのクライアントだけが到達するプロキシ・API ゲートウェイが付け直す構成
+    （admission_trust_client_id_header=True）の場合だけ使う。
+    """
+    if settings.admission_trust_client_id_header:
+        client_id = request.headers.get("x-client-id")
+        if client_id:
+            return client_id[:128]
+    return request.client.host if request.client else "unknown"
+
+
+class AdmissionController:
+    """イベントループのスレッドからのみ使う"""
+
+    def __init__(self, max_concurrent: int, max_per_client: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_client = max(1, max_per_client)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._running = 0
+        self._per_client: Dict[str, int] = {}  # 実行中 + 待機中
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_seconds = _INITIAL_SERVICE_SECONDS
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for w in self._waiters if not w.done())
+
+    def retry_after(self) -> int:
+        """今からキューに並んだ場合に順番が来るまでの見積もり（秒）"""
+        rounds = (self.queue_depth + 1) / self.max_concurrent
+        return max(1, math.ceil(self._service_seconds * rounds))
+
+    async def acquire(self, client_id: str) -> float:
+        """実行枠を確保する（待った秒数を返す）。確保できなければ 429 / 503 を送出"""
+        if self._per_client.get(client_id, 0) >= self.max_per_client:
+            ADMISSION_REJECTED.inc(reason="client_limit")
+            raise TooManyRequestsError(
+                f"Too many concurrent generations for this client (limit {self.max_per_client})",
+                retry_after=max(1, math.ceil(self._service_seconds)),
+            )
+
+        if self._running < self.max_concurrent and not self._waiters:
+            self._take(client_id)
+            ADMISSION_WAIT.observe(0.0)
+            return 0.0
+
+        if self.queue_depth >= self.max_queue:
+            ADMISSION_REJECTED.inc(reason="queue_full")
+            raise ServiceUnavailableError(
+                "Server is busy: generation queue is full", retry_after=self.retry_after()
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 枠を渡された直後にタイムアウト・キャンセルされた → 次の待機者に回す
+                self.release(client_id)
+            else:
+                self._forget_waiter(waiter, client_id)
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTED.inc(reason="queue_timeout")
+                raise ServiceUnavailableError(
+                    f"Server is busy: waited {self.queue_timeout:.0f}s for a generation slot",
+                    retry_after=self.retry_after(),
+                )
+            raise
+        waited = time.perf_counter() - start
+        ADMISSION_WAIT.observe(waited)
+        return waited
+
+    def release(self, client_id: str, service_seconds: float | None = None) -> None:
+        """実行枠を返す（待機者がいればそのまま引き継ぐ）"""
+        if service_seconds is not None:
+            self._service_seconds += _SERVICE_TIME_ALPHA * (service_seconds - self._service_seconds)
+        self._decrement_client(client_id)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # 実行中の数は変えずに枠を渡す
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self._running -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def admit(self, client_id: str) -> AsyncIterator[None]:
+        await self.acquire(client_id)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(client_id, time.perf_counter() - start)
+
+    def _take(self, client_id: str) -> None:
+        self._running += 1
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+        self._update_gauges()
+
+    def _forget_waiter(self, waiter: asyncio.Future, client_id: str) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._decrement_client(client_id)
+        self._update_gauges()
+
+    def _decrement_client(self, client_id: str) -> None:
+        remaining = self._per_client.get(client_id, 0) - 1
+        if remaining > 0:
+            self._per_client[client_id] = remaining
+        else:
+            self._per_client.pop(client_id, None)
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.set(self._running)
+        ADMISSION_QUEUE_DEPTH.set(self.queue_depth)
+
+
+class _NoAdmission:
+    """admission_enabled=False のときの何もしない実装"""
+
+    async def acquire(self, client_id: str) -> float:
+        return 0.0
+
+    def release(self, client_id: str, service_seconds: float | None = None) -> None:
+        pass
+
+    @asynccontextmanager
+    async def admit(self, client_id: str) -> AsyncIterator[None]:
+        yield
+
+
+admission = (
+    AdmissionController(
+        max_concurrent=settings.admission_max_concurrent,
+        max_per_client=settings.admission_max_per_client,
+        max_queue=settings.admission_max_queue,
+        queue_timeout=settings.admission_queue_timeout_seconds,
+    )
+    if settings.admission_enabled
+    else _NoAdmission()
+)
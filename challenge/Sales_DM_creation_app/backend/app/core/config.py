@@ -30,9 +30,126 @@ class Settings(BaseSettings):
     # LangChain Settings
     llm_model: str = "gpt-4o"
     llm_temperature: float = 0.4
+    llm_max_tokens: Optional[int] = None
+    # ノードごとの設定（None なら llm_* を使う）
+    # フック抽出は短いスニペットからの抽出なので、小さく速いモデルでも品質が落ちにくい
+    analyzer_llm_model: Optional[str] = None
+    analyzer_llm_temperature: Optional[float] = None
+    analyzer_llm_max_tokens: Optional[int] = None
+    copywriter_llm_model: Optional[str] = None
+    copywriter_llm_temperature: Optional[float] = None
+    copywriter_llm_max_tokens: Optional[int] = None
     tavily_max_results: int = 8
     tavily_search_depth: str = "advanced"
+    # 起動後にバックグラウンドで LangChain / LangGraph / Tavily を import しておく
+    prewarm_providers: bool = True
+
+    # Provider Backends
+    # "openai" / "tavily" が本番用。"fake" にするとネットワークを使わないスタンドインに差し替わる
+    llm_provider: str = "openai"
+    search_provider: str = "tavily"
+
+    # Fake Provider Settings（負荷試験・ローカル開発用）
+    fake_latency_distribution: str = "lognormal"  # "fixed" / "uniform" / "normal" / "lognormal"
+    fake_llm_latency_ms: float = 1500.0
+    fake_llm_latency_stddev_ms: float = 500.0
+    fake_llm_error_rate: float = 0.0
+    # モデルごとの平均レイテンシ（ここにないモデルは fake_llm_latency_ms。標準偏差は同じ比率で縮める）
+    fake_llm_model_latency_ms: dict[str, float] = {"gpt-4o-mini": 600.0, "gpt-4.1-nano": 400.0}
+    fake_search_latency_ms: float = 800.0
+    fake_search_latency_stddev_ms: float = 300.0
+    fake_search_error_rate: float = 0.0
+    fake_seed: Optional[int] = None
+
+    # Server（本番モード: python run.py --prod）
+    server_workers: int = 1
+    graceful_shutdown_seconds: int = 30
+    
+    # SSE Resume（Last-Event-ID による再接続）
+    run_log_max_events: int = 200  # 1回の生成で保持するイベント数の上限
+    run_log_ttl_seconds: int = 600  # 終了した生成のイベントログを保持する秒数
+    run_log_max_age_seconds: int = 1800  # 実行中の生成でもこれを超えたら破棄
+    stream_resume_grace_seconds: float = 30.0  # 切断後、再接続を待ってからキャンセルするまでの秒数
+    
+    # Shared State（ワーカープロセス間で共有するキャッシュ・single-flight・レートリミット）
+    shared_state_path: str = "./shared_state.db"
+    search_cache_ttl_seconds: int = 21600
+    single_flight_enabled: bool = True
+    single_flight_lease_seconds: int = 300
+    single_flight_result_ttl_seconds: int = 60
+    openai_requests_per_minute: int = 0  # 0 = 無制限（全ワーカー合計のクォータ）
+    tavily_requests_per_minute: int = 0
+    
+    # Admission Control（ワーカープロセスごとの同時生成数の上限）
+    admission_enabled: bool = True
+    admission_max_concurrent: int = 16  # 同時に実行する生成の上限
+    admission_max_per_client: int = 4  # クライアントごとの実行中 + 待機中の上限（超えたら 429）
+    admission_max_queue: int = 64  # 待機キューの長さ（満杯なら 503）
+    admission_queue_timeout_seconds: float = 30.0  # これ以上待たせる場合は 503
+    # X-Client-ID ヘッダーでクライアントを識別する（プロキシ・ゲートウェイが認証して付け直す構成でだけ有効にする。
+    # 無効なら接続元アドレス。プロキシの背後では uvicorn の --proxy-headers / --forwarded-allow-ips で実アドレスにする）
+    admission_trust_client_id_header: bool = False
+    worker_threads: int = 64  # asyncio.to_thread のスレッド数（admission_max_concurrent より大きくする）
+    
+    # Provider Scheduler（プロバイダー呼び出しの優先度クラス・クライアント間の公平キューイング）
+    scheduler_enabled: bool = True
+    scheduler_llm_slots: int = 8  # ワーカープロセスごとの LLM 同時呼び出し数
+    scheduler_search_slots: int = 4  # ワーカープロセスごとの検索の同時呼び出し数
+    scheduler_client_weights: dict[str, float] = {}  # クライアント（client_id_from_request）ごとの重み（既定 1.0）
     
+    # Multi-role generation（/api/dm/generate/multi）
+    multi_role_max_concurrency: int = 6  # 役職×トーンのコピーライティングの同時実行数
+    
+    # Campaigns（/api/campaigns。多数のターゲットへの一括生成。LLM 呼び出しはバッチ推論で行う）
+    campaign_max_targets: int = 10000
+    campaign_research_concurrency: int = 8  # リサーチ（検索）を同時に実行するターゲット数
+    campaign_lease_seconds: int = 300  # キャンペーンを実行するワーカーのリース（期限切れなら再起動時に引き継ぐ）
+    batch_provider: Optional[str] = None  # "openai" / "local"（None なら llm_provider が "fake" のとき local）
+    batch_poll_interval_seconds: float = 60.0
+    batch_status_max_failures: int = 30  # 状態の取得がこの回数続けて失敗したらフェーズ（キャンペーン）を失敗にする
+    batch_max_requests: int = 50000  # 1つの Batch に入れるリクエスト数の上限（OpenAI の上限）
+    batch_local_dir: str = "./batches"  # local（ファイルベースのスタンドイン）の入出力の置き場所
+    batch_local_latency_seconds: float = 5.0  # local の Batch が完了するまでの秒数
+    
+    # Site Crawler（company_name がないとき、Tavily の site: 検索の代わりにターゲットのサイトを直接読む）
+    crawler_enabled: Optional[bool] = None  # None なら search_provider が "fake" 以外のとき有効
+    crawler_timeout_seconds: float = 10.0  # 1サイト（トップページ + サブページ）全体の上限
+    crawler_request_timeout_seconds: float = 5.0
+    crawler_max_connections: int = 32  # プロセス全体の接続プール
+    crawler_per_host_concurrency: int = 2  # 同じホストへの同時リクエスト数
+    crawler_per_host_interval_seconds: float = 0.25  # 同じホストへのリクエスト開始間隔の下限
+    crawler_max_subpages: int = 4  # トップページからたどるニュース・プレスリリース・採用ページの数
+    crawler_max_page_bytes: int = 524288  # これ以上は読まずに打ち切る
+    crawler_min_results: int = 3  # クロール結果がこれより少なければ site: 検索も行う
+    crawler_respect_robots: bool = True
+    # 内部ネットワーク（プライベート・ループバック・リンクローカル等）と 80 / 443 以外のポートは取得しない。
+    # 社内の検証環境などを読む場合だけ、ホスト名・IP・CIDR をここに並べて許可する
+    crawler_allowed_hosts: list[str] = []
+    crawler_user_agent: str = "InsightDMBot/1.0"
+    
+    # Response Compression（Accept-Encoding: gzip のクライアントにだけ圧縮する。SSE・.gz のエクスポートは対象外）
+    gzip_enabled: bool = True
+    gzip_minimum_size: int = 1024  # これより小さいレスポンスは圧縮しない
+    gzip_compress_level: int = 6  # 9 にしても JSON はほとんど小さくならず、CPU だけ増える
+    
+    # Export（/api/export）
+    export_batch_size: int = 500  # サーバーサイドカーソルから一度に読む行数
+    export_chunk_bytes: int = 65536  # レスポンスに書き出す単位
+    
+    # Checkpointing（途中で失敗した生成を同じ run_id で再開する）
+    checkpoint_enabled: bool = True
+    checkpoint_path: str = "./checkpoints.db"
+    checkpoint_ttl_seconds: int = 86400  # 失敗・キャンセルした run のチェックポイントを残す秒数
+    
+    # Tracing / Profiling
+    trace_enabled: bool = True
+    trace_slow_threshold_ms: float = 30000.0  # これより遅い実行のスパンツリーを保存
+    trace_store_path: str = "./traces.jsonl"
+    trace_store_max_records: int = 1000
+    profiling_enabled: bool = False  # True のとき X-Profile ヘッダーで cProfile を取得できる
+    # /api/debug/traces を公開する（認証がないので開発環境・内部ネットワークだけで有効にする。DEBUG=true でも公開）
+    debug_endpoints_enabled: bool = False
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -11,6 +11,7 @@ async def api_exception_handler(request: Request, exc: APIError):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.message},
+        headers=exc.headers,
     )
 
 
@@ -0,0 +1,352 @@
+"""
+軽量なメトリクス計測（Prometheus テキスト形式で /metrics に公開）
+
+本番で常時オンにできるよう、計測1回あたりの処理は
+perf_counter() とロック付きの dict 更新だけに抑えている。
+"""
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.tracing import span
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [バケットごとの件数（最後は +Inf）, 合計, 件数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key: Tuple[str, ...], value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---- Pipeline nodes ----
+NODE_DURATION = REGISTRY.register(Histogram(
+    "dm_node_duration_seconds", "Duration of each LangGraph node", ["node"]
+))
+NODE_IN_PROGRESS = REGISTRY.register(Gauge(
+    "dm_node_in_progress", "Number of LangGraph nodes currently running", ["node"]
+))
+NODE_STEP_DURATION = REGISTRY.register(Histogram(
+    "dm_node_step_duration_seconds", "Duration of CPU-side steps inside a node", ["node", "step"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+))
+NODE_ERRORS = REGISTRY.register(Counter(
+    "dm_node_errors_total", "Number of LangGraph node failures", ["node", "error"]
+))
+
+# ---- External providers (Tavily / OpenAI) ----
+PROVIDER_DURATION = REGISTRY.register(Histogram(
+    "dm_provider_call_duration_seconds", "Duration of external provider calls", ["provider", "operation"]
+))
+PROVIDER_IN_PROGRESS = REGISTRY.register(Gauge(
+    "dm_provider_calls_in_progress", "Number of external provider calls in flight", ["provider"]
+))
+PROVIDER_ERRORS = REGISTRY.register(Counter(
+    "dm_provider_errors_total", "Number of failed external provider calls", ["provider", "operation"]
+))
+
+# ---- Database writes ----
+DB_WRITE_DURATION = REGISTRY.register(Histogram(
+    "dm_db_write_duration_seconds", "Duration of database write statements", ["statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+))
+DB_WRITE_ERRORS = REGISTRY.register(Counter(
+    "dm_db_write_errors_total", "Number of failed database write statements", ["statement"]
+))
+
+# ---- Shared state (cache / single-flight / rate limiting) ----
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "dm_cache_requests_total", "Cache lookups by result (hit / miss)", ["cache", "result"]
+))
+SINGLE_FLIGHT = REGISTRY.register(Counter(
+    "dm_single_flight_total", "Generations by single-flight role (leader / follower)", ["role"]
+))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    "dm_rate_limit_wait_seconds", "Time spent waiting for the shared provider quota", ["provider"]
+))
+
+# ---- Cancellation (client disconnects) ----
+CANCELLED_RUNS = REGISTRY.register(Counter(
+    "dm_cancelled_runs_total", "Pipelines cancelled after the client disconnected, by node", ["node"]
+))
+SAVED_PROVIDER_CALLS = REGISTRY.register(Counter(
+    "dm_cancelled_provider_calls_saved_total", "Provider calls skipped because the pipeline was cancelled", ["provider"]
+))
+
+# ---- Generation runs ----
+GENERATION_DURATION = REGISTRY.register(Histogram(
+    "dm_generation_duration_seconds", "End-to-end duration of generate_dm_async", ["status"]
+))
+GENERATIONS_IN_PROGRESS = REGISTRY.register(Gauge(
+    "dm_generations_in_progress", "Number of generations currently running"
+))
+
+# ---- Admission control ----
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "dm_admission_in_flight", "Generation requests currently admitted"
+))
+ADMISSION_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "dm_admission_queue_depth", "Generation requests waiting for admission"
+))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "dm_admission_wait_seconds", "Time admitted requests spent in the admission queue"
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "dm_admission_rejected_total", "Requests rejected by admission control", ["reason"]
+))
+
+# ---- Provider scheduler ----
+SCHEDULER_IN_USE = REGISTRY.register(Gauge(
+    "dm_scheduler_slots_in_use", "Provider call slots currently in use", ["provider"]
+))
+SCHEDULER_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "dm_scheduler_queue_depth", "Provider calls waiting for a slot", ["provider", "priority"]
+))
+SCHEDULER_WAIT = REGISTRY.register(Histogram(
+    "dm_scheduler_wait_seconds", "Time provider calls spent waiting for a slot", ["provider", "priority"]
+))
+
+
+# ---- Campaigns / batch inference ----
+BATCH_REQUESTS = REGISTRY.register(Counter(
+    "dm_batch_requests_total", "Batch inference requests by campaign phase and result", ["phase", "result"]
+))
+BATCH_DURATION = REGISTRY.register(Histogram(
+    "dm_batch_duration_seconds", "Time from batch submission until all batches of a phase finished", ["phase"],
+    buckets=(10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0, 14400.0, 43200.0, 86400.0),
+))
+CAMPAIGNS_IN_PROGRESS = REGISTRY.register(Gauge(
+    "dm_campaigns_in_progress", "Campaigns currently driven by this worker"
+))
+CRAWLER_PAGES = REGISTRY.register(Counter(
+    "dm_crawler_pages_total", "Pages requested by the site crawler by result", ["result"]
+))
+
+
+def render_metrics() -> str:
+    """Prometheus テキスト形式でメトリクスを出力"""
+    return REGISTRY.render()
+
+
+# ---- Instrumentation helpers ----
+def instrument_node(name: str, fn: Callable) -> Callable:
+    """LangGraphノード関数をラップしてレイテンシ・実行中数・エラーを記録（スパンも作成）"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        NODE_IN_PROGRESS.inc(node=name)
+        try:
+            with span(f"node:{name}"):
+                return fn(*args, **kwargs)
+        except Exception as e:
+            NODE_ERRORS.inc(node=name, error=type(e).__name__)
+            raise
+        finally:
+            NODE_IN_PROGRESS.dec(node=name)
+            NODE_DURATION.observe(time.perf_counter() - start, node=name)
+    return wrapper
+
+
+@contextmanager
+def provider_call(provider: str, operation: str, **attrs) -> Iterator:
+    """外部プロバイダー呼び出し1回分を計測（スパンを返すので結果の属性を追記できる）"""
+    start = time.perf_counter()
+    PROVIDER_IN_PROGRESS.inc(provider=provider)
+    try:
+        with span(f"{provider}:{operation}", **attrs) as current:
+            yield current
+    except Exception:
+        PROVIDER_ERRORS.inc(provider=provider, operation=operation)
+        raise
+    finally:
+        PROVIDER_IN_PROGRESS.dec(provider=provider)
+        PROVIDER_DURATION.observe(time.perf_counter() - start, provider=provider, operation=operation)
+
+
+@contextmanager
+def node_step(node: str, step: str, **attrs) -> Iterator:
+    """ノード内のCPU側サブステップを計測"""
+    start = time.perf_counter()
+    try:
+        with span(f"step:{step}", **attrs) as current:
+            yield current
+    finally:
+        NODE_STEP_DURATION.observe(time.perf_counter() - start, node=node, step=step)
+
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+
+def _statement_kind(statement: str) -> str | None:
+    kind = statement.lstrip()[:6].upper()
+    return kind if kind in _WRITE_STATEMENTS else None
+
+
+def instrument_engine(engine: Engine) -> None:
+    """SQLAlchemyエンジンの書き込み系ステートメントを計測"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _statement_kind(statement):
+            conn.info.setdefault("dm_write_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        kind = _statement_kind(statement)
+        if kind and conn.info.get("dm_write_start"):
+            start = conn.info["dm_write_start"].pop()
+            DB_WRITE_DURATION.observe(time.perf_counter() - start, statement=kind)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        kind = _statement_kind(context.statement or "")
+        if kind:
+            DB_WRITE_ERRORS.inc(statement=kind)
+            starts = context.connection.info.get("dm_write_start") if context.connection else None
+            if starts:
+                starts.pop()
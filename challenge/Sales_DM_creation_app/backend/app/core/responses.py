@@ -0,0 +1,78 @@
+"""
+orjson による JSON レスポンス・SSE イベントのエンコード
+
+生成結果はパイプラインの中で Pydantic の検証を通った後に dict にしてあるので、
+エンドポイントでは response_model の再検証・再ダンプを通さずに orjson で1回だけバイト列にする。
+日本語は \\uXXXX にエスケープせず UTF-8 のまま出力する（stdlib json の既定より小さくなる）。
+
+保存済みの生成結果・ドラフトは ETag（内容のハッシュ + 更新日時）を付けて返し、
+If-None-Match が一致すれば 304 を返す（JSON カラムを読まず、本文も送らない）。
+"""
+from datetime import datetime
+from typing import Any, Optional
+import hashlib
+
+import orjson
+from starlette.responses import JSONResponse, Response
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+# 保存済みのリソースはキャッシュしてよいが、使う前に毎回 ETag で再検証させる
+CACHE_CONTROL = "private, no-cache"
+
+
+def dumps(data: Any) -> bytes:
+    """JSON のバイト列にする（datetime は ISO 8601、dict のキーは文字列にする）"""
+    return orjson.dumps(data, option=_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    content をそのまま orjson でエンコードする JSONResponse
+
+    エンドポイントがこれを返すと FastAPI は response_model での検証・シリアライズを行わない
+    （response_model は OpenAPI のスキーマとしてだけ使われる）。
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def sse_event(event_id: str, data: Any) -> bytes:
+    """SSE のイベント1件（orjson の出力は改行を含まないので data 行は1行になる）"""
+    return b"id: " + event_id.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def content_hash(data: Any) -> str:
+    """内容の sha256（キーの順序に依存しないよう、キーを並べ替えてエンコードする）"""
+    return hashlib.sha256(orjson.dumps(data, option=_OPTIONS | orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def make_etag(content_hash: str, updated_at: Optional[datetime]) -> str:
+    """
+    弱い ETag（内容のハッシュ + 更新日時のミリ秒）
+
+    GZipMiddleware は ETag を変えずに gzip の表現も返すので、バイト単位の同一性を表す強い ETag にはしない
+    """
+    stamp = int(updated_at.timestamp() * 1000) if updated_at else 0
+    return f'W/"{content_hash[:32]}-{stamp:x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match がこの ETag に一致するか（If-None-Match は弱い比較なので W/ は無視する）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: Optional[str]) -> Response:
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
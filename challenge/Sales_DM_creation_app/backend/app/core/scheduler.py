@@ -0,0 +1,192 @@
+"""
+プロバイダー呼び出しのスケジューラー（優先度クラス + クライアント間の重み付き公平キューイング）
+
+- プロバイダー（llm / search）ごとに同時呼び出し数の枠（scheduler_*_slots）を持つ
+- 枠が空いたら interactive の待機者に必ず先に渡し、interactive が待っていないときだけ batch に渡す
+  （batch は空いている枠を使い切れるが、interactive の待ち時間は batch の量に左右されない）
+- 同じ優先度クラスの中ではクライアントごとに重み付き公平キューイング（start-time fair queuing）で
+  順番を決めるので、大量に投げるクライアントが他のクライアントの順番を奪わない
+
+グラフのノードはワーカースレッドで動くため、スレッド間の Condition で待つ。
+制限はワーカープロセスごと（全ワーカー合計のクォータは shared_store のレートリミットで守る）。
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Literal, Optional
+import heapq
+import itertools
+import threading
+import time
+
+from app.core.config import settings
+from app.core.metrics import SCHEDULER_IN_USE, SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT
+from app.core.security import RequestCancelledError, ValidationError
+
+Priority = Literal["interactive", "batch"]
+PRIORITIES: tuple = ("interactive", "batch")  # 先にあるクラスほど優先
+DEFAULT_PRIORITY: Priority = "interactive"
+
+# キャンセルを確認する間隔（秒）
+_CANCEL_POLL_SECONDS = 0.25
+
+
+def parse_priority(value: Optional[str]) -> Priority:
+    """X-Request-Priority ヘッダーの値を優先度クラスに変換（未指定なら interactive）"""
+    if not value:
+        return DEFAULT_PRIORITY
+    priority = value.strip().lower()
+    if priority not in PRIORITIES:
+        raise ValidationError(f"Unknown request priority: {value} (expected one of {', '.join(PRIORITIES)})")
+    return priority  # type: ignore[return-value]
+
+
+@dataclass(order=True)
+class _Ticket:
+    finish_tag: float
+    seq: int
+    start_tag: float = field(compare=False)
+    client_id: str = field(compare=False)
+    granted: bool = field(default=False, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class _ClassQueue:
+    """1つの優先度クラスの待機キュー（start-time fair queuing）"""
+
+    def __init__(self):
+        self.heap: List[_Ticket] = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}  # クライアントごとの直近の finish tag
+        self.waiting = 0
+
+    def push(self, ticket: _Ticket) -> None:
+        heapq.heappush(self.heap, ticket)
+        self.waiting += 1
+
+    def pop(self) -> Optional[_Ticket]:
+        while self.heap:
+            ticket = heapq.heappop(self.heap)
+            if ticket.cancelled:
+                continue
+            self.waiting -= 1
+            # 仮想時間はサービスを受け始めたリクエストの start tag まで進める
+            self.virtual_time = max(self.virtual_time, ticket.start_tag)
+            if not self.waiting:
+                # 待機者がいなくなったら履歴を捨てる（クライアント数に比例してメモリを使い続けない）
+                self.last_finish.clear()
+            return ticket
+        return None
+
+
+class ProviderScheduler:
+    """プロバイダーごとの呼び出し枠を優先度クラス・クライアント間で配分する"""
+
+    def __init__(self, slots: Dict[str, int], client_weights: Dict[str, float] | None = None):
+        self.slots = {provider: max(1, n) for provider, n in slots.items()}
+        self.client_weights = dict(client_weights or {})
+        self._lock = threading.Lock()
+        self._granted = threading.Condition(self._lock)
+        self._in_use: Dict[str, int] = {provider: 0 for provider in self.slots}
+        self._queues: Dict[str, Dict[str, _ClassQueue]] = {
+            provider: {priority: _ClassQueue() for priority in PRIORITIES} for provider in self.slots
+        }
+        self._seq = itertools.count()
+
+    def _weight(self, client_id: str) -> float:
+        return max(0.01, self.client_weights.get(client_id, 1.0))
+
+    @contextmanager
+    def slot(
+        self,
+        provider: str,
+        priority: Priority = DEFAULT_PRIORITY,
+        client_id: str = "",
+        cancel_event: threading.Event | None = None,
+    ) -> Iterator[float]:
+        """呼び出し枠を確保してから実行する（待った秒数を返す）"""
+        waited = self.acquire(provider, priority, client_id, cancel_event)
+        try:
+            yield waited
+        finally:
+            self.release(provider)
+
+    def acquire(
+        self,
+        provider: str,
+        priority: Priority = DEFAULT_PRIORITY,
+        client_id: str = "",
+        cancel_event: threading.Event | None = None,
+    ) -> float:
+        """
+        呼び出し枠が渡されるまで待つ
+
+        待っている間に cancel_event がセットされたらキューから外して RequestCancelledError を送出
+        """
+        if provider not in self.slots:
+            return 0.0
+        start = time.perf_counter()
+        with self._lock:
+            if self._in_use[provider] < self.slots[provider] and not self._has_waiters(provider):
+                self._in_use[provider] += 1
+                self._update_gauges(provider)
+                SCHEDULER_WAIT.observe(0.0, provider=provider, priority=priority)
+                return 0.0
+
+            queue = self._queues[provider][priority]
+            start_tag = max(queue.virtual_time, queue.last_finish.get(client_id, 0.0))
+            ticket = _Ticket(
+                finish_tag=start_tag + 1.0 / self._weight(client_id),
+                seq=next(self._seq),
+                start_tag=start_tag,
+                client_id=client_id,
+            )
+            queue.last_finish[client_id] = ticket.finish_tag
+            queue.push(ticket)
+            self._update_gauges(provider)
+
+            while not ticket.granted:
+                self._granted.wait(timeout=_CANCEL_POLL_SECONDS)
+                if not ticket.granted and cancel_event is not None and cancel_event.is_set():
+                    ticket.cancelled = True
+                    queue.waiting -= 1
+                    self._update_gauges(provider)
+                    raise RequestCancelledError(f"Generation cancelled while waiting for {provider}")
+
+        waited = time.perf_counter() - start
+        SCHEDULER_WAIT.observe(waited, provider=provider, priority=priority)
+        return waited
+
+    def release(self, provider: str) -> None:
+        """呼び出し枠を返す（待機者がいれば優先度順に引き継ぐ）"""
+        if provider not in self.slots:
+            return
+        with self._lock:
+            for priority in PRIORITIES:
+                ticket = self._queues[provider][priority].pop()
+                if ticket is not None:
+                    # 実行中の数は変えずに枠を渡す
+                    ticket.granted = True
+                    self._granted.notify_all()
+                    break
+            else:
+                self._in_use[provider] -= 1
+            self._update_gauges(provider)
+
+    def _has_waiters(self, provider: str) -> bool:
+        return any(q.waiting for q in self._queues[provider].values())
+
+    def _update_gauges(self, provider: str) -> None:
+        SCHEDULER_IN_USE.set(self._in_use[provider], provider=provider)
+        for priority, queue in self._queues[provider].items():
+            SCHEDULER_QUEUE_DEPTH.set(queue.waiting, provider=provider, priority=priority)
+
+
+scheduler = ProviderScheduler(
+    slots=(
+        {"llm": settings.scheduler_llm_slots, "search": settings.scheduler_search_slots}
+        if settings.scheduler_enabled
+        else {}
+    ),
+    client_weights=settings.scheduler_client_weights,
+)
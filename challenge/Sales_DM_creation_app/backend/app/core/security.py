@@ -4,9 +4,10 @@ from typing import Optional
 
 class APIError(Exception):
     """Base API exception"""
-    def __init__(self, message: str, status_code: int = 500):
+    def __init__(self, message: str, status_code: int = 500, headers: Optional[dict] = None):
         self.message = message
         self.status_code = status_code
+        self.headers = headers
         super().__init__(self.message)
 
 
@@ -22,7 +23,40 @@ class NotFoundError(APIError):
         super().__init__(message, status_code=status.HTTP_404_NOT_FOUND)
 
 
+class ConflictError(APIError):
+    """Resource is in use (e.g. the run is already running on another worker)"""
+    def __init__(self, message: str):
+        super().__init__(message, status_code=status.HTTP_409_CONFLICT)
+
+
 class ExternalServiceError(APIError):
     """External service error"""
     def __init__(self, message: str):
         super().__init__(message, status_code=status.HTTP_502_BAD_GATEWAY)
+
+
+class TooManyRequestsError(APIError):
+    """Per-client concurrency limit exceeded"""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(
+            message,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class ServiceUnavailableError(APIError):
+    """Server is overloaded (admission queue full or wait timed out)"""
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(
+            message,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class RequestCancelledError(APIError):
+    """Client disconnected and the pipeline was cancelled"""
+    def __init__(self, message: str):
+        # 499: Client Closed Request（nginx の慣例）
+        super().__init__(message, status_code=499)
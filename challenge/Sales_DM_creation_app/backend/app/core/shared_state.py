@@ -0,0 +1,188 @@
+"""
+ワーカープロセス間で共有する状態（SQLite）
+
+本番モードでは uvicorn が複数のワーカープロセスを起動するため、
+プロセス内の dict では次のものが共有できない。同じホスト上の全ワーカーから
+1つの SQLite ファイル（WALモード）を参照して共有する。
+
+- TTL付きキャッシュ（検索結果・生成結果）
+- single-flight 用のリース（同じリクエストを複数ワーカーで重複実行しない）
+- プロバイダー呼び出しのレートリミット（分あたりのクォータをワーカー合計で守る）
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import settings
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    followers INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT NOT NULL,
+    window_start INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (key, window_start)
+);
+"""
+
+
+class SharedStore:
+    """SQLiteファイルを使ったプロセス間共有ストア（スレッドごとに接続を持つ）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    # ---- TTL Cache ----
+    def cache_get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def cache_set(self, namespace: str, key: str, value: Any, ttl_seconds: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), time.time() + ttl_seconds),
+        )
+        self._maybe_purge()
+
+    def cache_delete(self, namespace: str, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    # ---- Leases (single-flight) ----
+    def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """リースを取得（期限切れのリースは奪取できる）。取得できたら True"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] >= now and row[0] != owner:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, expires_at, followers) "
+                "VALUES (?, ?, ?, COALESCE((SELECT followers FROM leases WHERE key = ?), 0))",
+                (key, owner, now + ttl_seconds, key),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_lease(self, key: str, owner: str) -> None:
+        self._conn().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def lease_owner(self, key: str) -> Optional[str]:
+        """有効なリースの所有者（なければ None）"""
+        row = self._conn().execute("SELECT owner, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def add_follower(self, key: str, delta: int) -> None:
+        self._conn().execute(
+            "UPDATE leases SET followers = MAX(followers + ?, 0) WHERE key = ?", (delta, key)
+        )
+
+    def follower_count(self, key: str) -> int:
+        row = self._conn().execute("SELECT followers FROM leases WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    # ---- Rate limiting ----
+    def try_acquire_rate(self, key: str, limit: int, window_seconds: int = 60) -> float:
+        """
+        固定ウィンドウ方式でクォータを1つ消費する
+
+        Returns:
+            0.0 なら取得成功。正の値なら次のウィンドウまでの待ち秒数
+        """
+        now = time.time()
+        window_start = int(now // window_seconds) * window_seconds
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT count FROM rate_limits WHERE key = ? AND window_start = ?",
+                (key, window_start),
+            ).fetchone()
+            count = row[0] if row else 0
+            if count >= limit:
+                conn.execute("COMMIT")
+                return max(window_start + window_seconds - now, 0.01)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_start, count) VALUES (?, ?, ?)",
+                (key, window_start, count + 1),
+            )
+            conn.execute("COMMIT")
+            return 0.0
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def wait_for_rate(self, key: str, limit: int, window_seconds: int = 60) -> float:
+        """クォータが空くまでブロックする（ワーカースレッドから呼ぶ）。待った秒数を返す"""
+        if limit <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self.try_acquire_rate(key, limit, window_seconds)
+            if wait == 0.0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    # ---- Maintenance ----
+    def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM rate_limits WHERE window_start < ?", (now - 3600,))
+
+
+shared_store = SharedStore(settings.shared_state_path)
@@ -0,0 +1,208 @@
+"""
+生成1回分のスパンツリー（ノード → プロバイダー呼び出し → サブステップ）の記録
+
+- スパンは contextvars で親子関係を辿る。asyncio.to_thread はコンテキストを
+  コピーするので、ワーカースレッド内のノードからも同じツリーに追加される
+- settings.trace_slow_threshold_ms を超えた実行（またはプロファイル指定の実行）だけを
+  JSONL のトレースストアに保存する
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows（ワーカー1つの開発モードのみを想定）
+    fcntl = None
+
+from app.core.config import settings
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "error")
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs: Dict[str, Any] = dict(attrs or {})
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List[Span] = []
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: Optional[float] = None) -> dict:
+        origin = self.start if origin is None else origin
+        data = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [c.to_dict(origin) for c in self.children]
+        return data
+
+
+class _NullSpan:
+    """トレース対象外のときに返すダミー（属性設定を無視する）"""
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("dm_current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span | _NullSpan]:
+    """現在のスパンの子としてスパンを記録（トレース中でなければ何もしない）"""
+    parent = _current_span.get()
+    if parent is None:
+        yield _NULL_SPAN
+        return
+
+    current = Span(name, attrs)
+    parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+@contextmanager
+def start_trace(name: str, **attrs: Any) -> Iterator[Span]:
+    """ルートスパンを開始（generate_dm_async 1回に1つ）"""
+    root = Span(name, attrs)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        root.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def build_trace_record(run_id: str, root: Span, profile: Optional[str] = None) -> dict:
+    record = {
+        "run_id": run_id,
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(root.duration_ms, 2),
+        "status": "error" if root.error else "success",
+        "spans": root.to_dict(),
+    }
+    if profile:
+        record["profile"] = profile
+    return record
+
+
+def should_persist(root: Span, profiled: bool) -> bool:
+    if not settings.trace_enabled:
+        return False
+    return profiled or root.duration_ms >= settings.trace_slow_threshold_ms
+
+
+class TraceStore:
+    """
+    JSONLファイルに遅い実行のトレースを保存するストア
+
+    本番モードでは複数のワーカーが同じファイルに書くので、追記・切り詰め・読み込みは
+    ロックファイル（{path}.lock）の flock で直列化する（切り詰めはファイルを置き換えるので、本体ではなく別ファイルをロックする）
+    """
+
+    def __init__(self, path: str, max_records: int):
+        self.path = path
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._appended = 0
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_all(self) -> List[dict]:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+    def append(self, record: dict) -> None:
+        with self._locked(exclusive=True):
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._appended += 1
+            # 一定件数ごとに古いレコードを切り詰めてファイルサイズを抑える
+            if self._appended >= max(1, self.max_records // 10):
+                self._appended = 0
+                records = self._read_all()
+                if len(records) > self.max_records:
+                    tmp_path = f"{self.path}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        for r in records[-self.max_records:]:
+                            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                    os.replace(tmp_path, self.path)
+
+    def slowest(self, limit: int = 20) -> List[dict]:
+        with self._locked(exclusive=False):
+            records = self._read_all()[-self.max_records:]
+        records.sort(key=lambda r: r.get("duration_ms", 0), reverse=True)
+        return records[:limit]
+
+    def get(self, run_id: str) -> Optional[dict]:
+        with self._locked(exclusive=False):
+            records = self._read_all()
+        for record in reversed(records):
+            if record.get("run_id") == run_id:
+                return record
+        return None
+
+
+trace_store = TraceStore(settings.trace_store_path, settings.trace_store_max_records)
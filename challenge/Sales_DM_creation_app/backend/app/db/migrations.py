@@ -0,0 +1,146 @@
+"""
+スキーマ・データのマイグレーション
+
+新しいテーブルは起動時の Base.metadata.create_all で作られるが、既存の行の移行
+（カラム追加・データの移し替え）はここで行う。適用済みのバージョンは schema_migrations に記録する。
+
+複数ワーカーが同時に起動した場合は、schema_migrations への挿入（主キー）が
+1つのワーカーだけ成功するので、同じマイグレーションが重複して実行されることはない。
+"""
+from typing import Any, Callable, List, Tuple
+import hashlib
+
+import orjson
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, null, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models.dm import DMDraft, DMGeneration
+from app.services.evidence import link_evidences, load_evidences
+
+_BATCH_SIZE = 500
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def _normalize_evidence(db: Session) -> None:
+    """dm_generations.evidences（JSON）を evidence / generation_evidences に移す"""
+    # 後のマイグレーションで追加するカラムがまだないので、モデル全体ではなく必要なカラムだけ読む
+    ids = db.execute(
+        select(DMGeneration.id).where(DMGeneration.evidences.is_not(None))
+    ).scalars().all()
+    for start in range(0, len(ids), _BATCH_SIZE):
+        batch_ids = ids[start:start + _BATCH_SIZE]
+        rows = db.execute(
+            select(DMGeneration.id, DMGeneration.evidences).where(DMGeneration.id.in_(batch_ids))
+        ).all()
+        for generation_id, evidences in rows:
+            link_evidences(db, generation_id, evidences or [])
+        # updated_at を自分自身で上書きして onupdate を止める（生成結果の内容は変わっていない）
+        db.execute(
+            update(DMGeneration)
+            .where(DMGeneration.id.in_(batch_ids))
+            .values(evidences=null(), updated_at=DMGeneration.updated_at)
+        )
+        db.flush()
+        # 行数が多くてもメモリを使い続けないよう、書き出した行はセッションから外す
+        db.expunge_all()
+
+
+def _add_column(db: Session, table: str, column: str, ddl_type: str) -> None:
+    """カラムがなければ追加する（新しく作った DB では create_all で作成済み）"""
+    columns = {c["name"] for c in inspect(db.connection()).get_columns(table)}
+    if column not in columns:
+        db.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _content_hash(data: Any) -> str:
+    """
+    0002 時点の content_hash の計算（app.core.responses.content_hash と同じ）
+
+    サービス層のハッシュ関数が後から変わってもこのマイグレーションの結果が変わらないよう、ここに固定しておく
+    """
+    return hashlib.sha256(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _add_content_hash(db: Session) -> None:
+    """dm_generations / dm_drafts に content_hash（ETag 用）を追加し、既存の行のハッシュを埋める"""
+    _add_column(db, "dm_generations", "content_hash", "VARCHAR(64)")
+    _add_column(db, "dm_drafts", "content_hash", "VARCHAR(64)")
+
+    # updated_at を自分自身で上書きして onupdate を止める（内容は変わっていないので更新日時を動かさない）
+    ids = db.execute(
+        select(DMGeneration.id).where(DMGeneration.content_hash.is_(None))
+    ).scalars().all()
+    for start in range(0, len(ids), _BATCH_SIZE):
+        rows = db.execute(
+            select(DMGeneration.id, DMGeneration.evidences, DMGeneration.hooks, DMGeneration.drafts)
+            .where(DMGeneration.id.in_(ids[start:start + _BATCH_SIZE]))
+        ).all()
+        for row in rows:
+            # load_evidences は id / evidences だけを使うので行をそのまま渡す
+            hash_ = _content_hash({
+                "evidences": load_evidences(db, row),
+                "hooks": row.hooks or [],
+                "drafts": row.drafts or [],
+            })
+            db.execute(
+                update(DMGeneration)
+                .where(DMGeneration.id == row.id)
+                .values(content_hash=hash_, updated_at=DMGeneration.updated_at)
+            )
+
+    rows = db.execute(
+        select(DMDraft.id, DMDraft.tone, DMDraft.title, DMDraft.body_markdown, DMDraft.edited_body)
+        .where(DMDraft.content_hash.is_(None))
+    ).all()
+    for row in rows:
+        db.execute(
+            update(DMDraft)
+            .where(DMDraft.id == row.id)
+            .values(
+                content_hash=_content_hash([row.tone, row.title, row.body_markdown, row.edited_body]),
+                updated_at=DMDraft.updated_at,
+            )
+        )
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Session], None]]] = [
+    ("0001_normalize_evidence", _normalize_evidence),
+    ("0002_add_content_hash", _add_content_hash),
+]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """未適用のマイグレーションを順に適用し、適用したバージョンを返す"""
+    _metadata.create_all(bind=engine)
+    applied: List[str] = []
+    for version, migrate in MIGRATIONS:
+        with Session(engine) as db:
+            done = db.execute(
+                select(schema_migrations.c.version).where(schema_migrations.c.version == version)
+            ).first()
+            if done:
+                continue
+            try:
+                # 先にバージョンを記録して書き込みロックを取り、同時に起動した他のワーカーを待たせる
+                db.execute(schema_migrations.insert().values(version=version))
+            except IntegrityError:
+                # 他のワーカーが適用済み
+                db.rollback()
+                print(f"Skipped migration {version}: applied by another worker")
+                continue
+            # マイグレーション自体の失敗は握りつぶさず起動を止める（途中までのスキーマに後続を適用しない）
+            migrate(db)
+            db.commit()
+            applied.append(version)
+            print(f"Applied migration {version}")
+    return applied
@@ -3,23 +3,52 @@ FastAPI application entry point
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+import asyncio
 
 from app.core.config import settings
 from app.core.security import APIError
 from app.core.exceptions import api_exception_handler, general_exception_handler
+from app.core.metrics import render_metrics
 from app.api.dm import router as dm_router
+from app.api.debug import router as debug_router
+from app.api.export import router as export_router
+from app.api.campaigns import router as campaigns_router
 from app.db.base import Base, engine
+from app.db.migrations import run_migrations
+from app.services.campaigns import resume_campaigns, stop_campaigns
+from app.services.crawler import close_crawler
+from app.models import dm as dm_models  # noqa: F401  テーブル定義を Base.metadata に登録する
 
 
 # Create tables on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    # グラフ実行（asyncio.to_thread）が既定のスレッド数（CPU数+4）で詰まらないようにする
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.worker_threads, thread_name_prefix="dm-worker")
+    )
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    # 前回のプロセスで終わっていなかったキャンペーンを続きから再開する
+    resume_task = asyncio.create_task(resume_campaigns())
+    # 重いプロバイダーモジュールは接続受付を妨げないようバックグラウンドで読み込む
+    prewarm_task = None
+    if settings.prewarm_providers:
+        from app.services.ai.agents import prewarm_providers
+        prewarm_task = asyncio.create_task(asyncio.to_thread(prewarm_providers))
     yield
     # Shutdown
-    pass
+    if prewarm_task and not prewarm_task.done():
+        prewarm_task.cancel()
+    if not resume_task.done():
+        resume_task.cancel()
+    await stop_campaigns()
+    await asyncio.to_thread(close_crawler)
 
 
 app = FastAPI(
@@ -37,8 +66,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 大きいレスポンス（生成結果・CSV エクスポート）を圧縮する
+# text/event-stream（SSE）と application/gzip（gzip=true のエクスポート）は GZipMiddleware の既定で対象外
+# （Starlette 1.5.0 以降。requirements.txt で下限を指定している）
+if settings.gzip_enabled:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.gzip_minimum_size,
+        compresslevel=settings.gzip_compress_level,
+    )
+
 # Include routers
 app.include_router(dm_router)
+# トレース（入力の URL・会社名・プロファイル結果を含む）は認証なしで読めるので、明示的に有効にしたときだけ公開する
+if settings.debug or settings.debug_endpoints_enabled:
+    app.include_router(debug_router)
+app.include_router(export_router)
+app.include_router(campaigns_router)
 
 # Exception handlers
 app.add_exception_handler(APIError, api_exception_handler)
@@ -55,6 +99,15 @@ async def health_check():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus形式のメトリクス"""
+    return PlainTextResponse(
+        render_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -15,15 +15,46 @@ class DMGeneration(Base):
     product_summary = Column(Text, nullable=False)
     
     # Generated content (JSON)
+    # evidences は正規化前の行のみ（新しい行は generation_evidences 経由で evidence を参照する）
     evidences = Column(JSON, nullable=True)
     hooks = Column(JSON, nullable=True)
     drafts = Column(JSON, nullable=True)
     
     # Metadata
+    # evidences / hooks / drafts の sha256（ETag に使うので、JSON を読まずに変更を判定できる）
+    content_hash = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+class Evidence(Base):
+    """
+    検索で得た Evidence（正規化URL + スニペットのハッシュで一意）
+    
+    同じ企業の同じ記事は複数の生成結果から参照されるため、1行だけ保存して共有する
+    """
+    __tablename__ = "evidence"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False, unique=True, index=True)
+    source = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    snippet = Column(Text, nullable=False)
+    url = Column(String, nullable=False)
+    
+    # Metadata
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class GenerationEvidence(Base):
+    """生成結果と Evidence の対応（position は hooks の related_evidence_indices が指す順序）"""
+    __tablename__ = "generation_evidences"
+    
+    generation_id = Column(Integer, ForeignKey("dm_generations.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    evidence_id = Column(Integer, ForeignKey("evidence.id"), nullable=False, index=True)
+
+
 class DMDraft(Base):
     """保存されたDMドラフトモデル"""
     __tablename__ = "dm_drafts"
@@ -37,5 +68,53 @@ class DMDraft(Base):
     edited_body = Column(Text, nullable=True)  # ユーザーが編集した内容
     
     # Metadata
+    content_hash = Column(String(64), nullable=True)  # tone / title / body_markdown / edited_body の sha256
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class DMCampaign(Base):
+    """
+    キャンペーン（多数のターゲットへの一括生成）
+    
+    リサーチ → 全ターゲット分のフック抽出 → 全ターゲット×トーン分の執筆の順に進み、
+    LLM 呼び出しはフェーズごとにバッチ推論へまとめて投入する。
+    status: pending / researching / analyzing / writing / completed / failed
+    """
+    __tablename__ = "dm_campaigns"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending", index=True)
+    product_name = Column(String, nullable=False)
+    product_summary = Column(Text, nullable=False)
+    preferred_tones = Column(JSON, nullable=False)
+    # フェーズごとに投入した batch_id（{"analyzer": [...], "copywriter": [...]}。再起動後はこれをポーリングし直す）
+    batch_ids = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    # Metadata
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class DMCampaignTarget(Base):
+    """
+    キャンペーンのターゲット1件と途中経過
+    
+    status: pending / researched / analyzed / completed / failed
+    （researched なら evidences、analyzed なら hooks まで入っている。completed で generation_id が付く）
+    """
+    __tablename__ = "dm_campaign_targets"
+    
+    campaign_id = Column(Integer, ForeignKey("dm_campaigns.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    target_url = Column(String, nullable=False)
+    target_role = Column(String, nullable=True)
+    company_name = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")
+    evidences = Column(JSON, nullable=True)
+    hooks = Column(JSON, nullable=True)
+    generation_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
@@ -1,4 +1,4 @@
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, HttpUrl, Field
 from datetime import datetime
 
@@ -37,17 +37,65 @@ class GenerateDMRequest(BaseModel):
         default=["polite", "casual", "problem_solver"],
         description="生成するトーンのリスト"
     )
+    run_id: Optional[str] = Field(
+        None,
+        pattern=r"^[A-Za-z0-9_-]{1,64}$",
+        description="失敗した生成の run_id を指定すると、最後に完了したステップから再開する"
+    )
+
+
+class GenerateMultiRoleDMRequest(BaseModel):
+    """同じ企業の複数の役職向けにDMをまとめて生成するリクエスト"""
+    target_url: HttpUrl = Field(..., description="ターゲット企業のURL")
+    target_roles: List[str] = Field(..., min_length=1, max_length=10, description="ターゲットの役職のリスト")
+    company_name: Optional[str] = Field(None, description="会社名")
+    your_product_name: str = Field(..., min_length=1, description="あなたの商材名")
+    your_product_summary: str = Field(..., min_length=1, description="商材の要約")
+    preferred_tones: Optional[List[ToneType]] = Field(
+        default=["polite", "casual", "problem_solver"],
+        description="生成するトーンのリスト"
+    )
+
+
+class RegenerateDMRequest(BaseModel):
+    """保存済みの生成結果から途中のステージに入って再生成するリクエスト"""
+    from_stage: Literal["analyzer", "copywriter"] = Field(
+        default="copywriter",
+        description="再開するステージ（copywriter: DMのみ書き直し / analyzer: フックから抽出し直し）"
+    )
+    tones: Optional[List[ToneType]] = Field(
+        None,
+        description="書き直すトーン（未指定なら保存済みドラフトの全トーン。analyzer からの場合は保存済みの全トーンも書き直す）"
+    )
+    target_role: Optional[str] = Field(
+        None,
+        description="別の役職向けに書き直す場合の役職（指定すると新しい生成として保存）"
+    )
 
 
 # Response Schemas
 class GenerateDMResponse(BaseModel):
     generation_id: Optional[int] = None
+    run_id: Optional[str] = None
     evidences: List[EvidenceItem]
     hooks: List[HookItem]
     drafts: List[DMDraft]
     created_at: datetime
 
 
+class RoleDrafts(BaseModel):
+    target_role: str
+    generation_id: Optional[int] = None
+    drafts: List[DMDraft]
+
+
+class GenerateMultiRoleDMResponse(BaseModel):
+    evidences: List[EvidenceItem]
+    hooks: List[HookItem]
+    results: List[RoleDrafts]
+    created_at: datetime
+
+
 class ProgressUpdate(BaseModel):
     """進捗更新用スキーマ（SSE用）"""
     stage: Literal["researching", "analyzing", "writing", "completed"]
@@ -66,3 +114,54 @@ class SaveDraftRequest(BaseModel):
 class SaveDraftResponse(BaseModel):
     draft_id: int
     message: str
+
+
+class DraftResponse(BaseModel):
+    draft_id: int
+    generation_id: Optional[int] = None
+    tone: ToneType
+    title: str
+    body_markdown: str
+    edited_body: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class CampaignTarget(BaseModel):
+    target_url: HttpUrl = Field(..., description="ターゲット企業のURL")
+    target_role: Optional[str] = Field(None, description="ターゲットの役職")
+    company_name: Optional[str] = Field(None, description="会社名")
+
+
+class CreateCampaignRequest(BaseModel):
+    """多数のターゲットへの一括生成（LLM 呼び出しはバッチ推論で行うので、完了まで数分〜最大24時間かかる）"""
+    name: Optional[str] = Field(None, max_length=200, description="キャンペーン名")
+    targets: List[CampaignTarget] = Field(..., min_length=1, description="ターゲットのリスト")
+    your_product_name: str = Field(..., min_length=1, description="あなたの商材名")
+    your_product_summary: str = Field(..., min_length=1, description="商材の要約")
+    preferred_tones: Optional[List[ToneType]] = Field(
+        default=["polite", "casual", "problem_solver"],
+        description="生成するトーンのリスト"
+    )
+
+
+class CampaignTargetStatus(BaseModel):
+    position: int
+    target_url: str
+    target_role: Optional[str] = None
+    company_name: Optional[str] = None
+    status: str
+    generation_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class CampaignResponse(BaseModel):
+    campaign_id: int
+    name: Optional[str] = None
+    status: str
+    counts: Dict[str, int] = Field(description="ターゲットのステータスごとの件数")
+    batch_ids: Dict[str, List[str]] = Field(default_factory=dict)
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    targets: Optional[List[CampaignTargetStatus]] = None
@@ -9,17 +9,20 @@ LangGraph-based AI Agents for DM Generation Pipeline
 - 不適切コンテンツのフィルタリング
 """
 from __future__ import annotations
-from typing import List, TypedDict, Callable, Optional, Tuple
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List, Literal, TypedDict, Callable, Optional, Tuple
 import asyncio
+import cProfile
+import hashlib
+import io
+import pstats
 import re
+import threading
+import time
+import uuid
 from urllib.parse import urlparse
 from datetime import datetime
 
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langgraph.graph import StateGraph, END
-
 from app.core.config import settings
 from app.schemas.dm import (
     EvidenceItem,
@@ -28,7 +31,29 @@ from app.schemas.dm import (
     ToneType,
     ProgressUpdate,
 )
-from app.core.security import ExternalServiceError
+from app.core.security import APIError, ExternalServiceError, RequestCancelledError, ValidationError
+from app.core.metrics import (
+    instrument_node,
+    provider_call,
+    node_step,
+    CACHE_REQUESTS,
+    RATE_LIMIT_WAIT,
+    CANCELLED_RUNS,
+    SAVED_PROVIDER_CALLS,
+    GENERATION_DURATION,
+    GENERATIONS_IN_PROGRESS,
+)
+from app.core.scheduler import DEFAULT_PRIORITY, Priority, scheduler
+from app.core.shared_state import shared_store
+from app.services.single_flight import single_flight, request_key
+from app.services.generations import persist_generation
+from app.services.ai.batch import BatchRequest
+from app.services.crawler import crawler_enabled, get_crawler
+from app.services.ai.checkpoints import get_checkpointer, mark_run, forget_run
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+from app.core.tracing import Span, span, start_trace, should_persist, build_trace_record, trace_store
 
 
 # ---- 不適切コンテンツフィルタリング ----
@@ -131,8 +156,8 @@ def _extract_product_keywords(product_name: str, product_summary: str) -> List[s
         if category.lower() in combined_text:
             keywords.extend(related_keywords)
     
-    # 重複を削除
-    return list(set(keywords))
+    # 重複を削除（順序を保つ: 検索クエリがプロセス間で同一になり、共有キャッシュが効く）
+    return list(dict.fromkeys(keywords))
 
 
 # ---- LangGraph State ----
@@ -152,17 +177,38 @@ class DMState(TypedDict):
     evidences: List[EvidenceItem]
     hooks: List[HookItem]
     drafts: List[DMDraft]
-    
-    # Progress tracking
-    progress_callback: Optional[Callable[[ProgressUpdate], None]]
+
+
+# state はノードごとにチェックポイントへ保存されるため、シリアライズできない実行時オブジェクトは
+# config["configurable"] で渡す
+#   - progress_callback: 進捗通知（Callable[[ProgressUpdate], None]）
+#   - cancel_event: クライアント切断時にセットされる threading.Event（ノード間・プロバイダー呼び出し間で確認）
+#   - priority / client_id: プロバイダー呼び出しのスケジューリングに使う優先度クラスとクライアント
+def _progress_callback(config: RunnableConfig | None) -> Optional[Callable[[ProgressUpdate], None]]:
+    return (config or {}).get("configurable", {}).get("progress_callback")
+
+
+def _cancel_event(config: RunnableConfig | None) -> Optional[threading.Event]:
+    return (config or {}).get("configurable", {}).get("cancel_event")
+
+
+def _priority(config: RunnableConfig | None) -> Tuple[Priority, str]:
+    configurable = (config or {}).get("configurable", {})
+    return configurable.get("priority", DEFAULT_PRIORITY), configurable.get("client_id", "")
 
 
 # ---- Initialize Tools & LLM ----
 def _get_tavily_tool(max_results: int = 5):
     """Tavily検索ツールを初期化"""
+    if settings.search_provider == "fake":
+        from app.services.ai.fakes import FakeSearchTool
+        return FakeSearchTool(max_results=max_results)
+    
     if not settings.tavily_api_key:
         raise ExternalServiceError("Tavily API key is not configured")
     
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    
     # 環境変数を設定（TavilySearchResultsが環境変数から読み込む場合に備えて）
     import os
     os.environ["TAVILY_API_KEY"] = settings.tavily_api_key
@@ -175,18 +221,114 @@ def _get_tavily_tool(max_results: int = 5):
     )
 
 
-def _get_llm():
-    """LLMを初期化"""
+LLMNode = Literal["analyzer", "copywriter"]
+
+
+def _llm_settings(node: LLMNode) -> Tuple[str, float, Optional[int]]:
+    """ノードごとのモデル・temperature・max_tokens（未設定の項目は llm_* を使う）"""
+    model = getattr(settings, f"{node}_llm_model")
+    temperature = getattr(settings, f"{node}_llm_temperature")
+    max_tokens = getattr(settings, f"{node}_llm_max_tokens")
+    return (
+        model or settings.llm_model,
+        settings.llm_temperature if temperature is None else temperature,
+        settings.llm_max_tokens if max_tokens is None else max_tokens,
+    )
+
+
+def _get_llm(node: LLMNode):
+    """ノード用のLLMを初期化"""
+    model, temperature, max_tokens = _llm_settings(node)
+    if settings.llm_provider == "fake":
+        from app.services.ai.fakes import FakeChatModel
+        return FakeChatModel(model=model, temperature=temperature, max_tokens=max_tokens)
+    
     if not settings.openai_api_key:
         raise ExternalServiceError("OpenAI API key is not configured")
     
+    from langchain_openai import ChatOpenAI
+    
     return ChatOpenAI(
-        model=settings.llm_model,
-        temperature=settings.llm_temperature,
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
         openai_api_key=settings.openai_api_key,
     )
 
 
+# ---- キャッシュ・レートリミット（ワーカー間で共有） ----
+def _throttle(provider: str) -> None:
+    """共有クォータが空くまで待つ（settings の *_requests_per_minute が 0 なら無制限）"""
+    limit = (
+        settings.openai_requests_per_minute
+        if provider == "llm"
+        else settings.tavily_requests_per_minute
+    )
+    if limit <= 0:
+        return
+    waited = shared_store.wait_for_rate(f"provider:{provider}", limit)
+    RATE_LIMIT_WAIT.observe(waited, provider=provider)
+
+
+@contextmanager
+def _provider_slot(provider: str, config: RunnableConfig | None) -> Iterator[None]:
+    """
+    スケジューラーで呼び出し枠を確保し、共有クォータが空くのを待ってから呼び出す
+    
+    枠を先に確保するので、クォータの順番待ちも優先度クラス・クライアント間の公平性に従う
+    """
+    priority, client_id = _priority(config)
+    with scheduler.slot(provider, priority, client_id, _cancel_event(config)):
+        _throttle(provider)
+        yield
+
+
+def _cached_search(tavily, query: str, config: RunnableConfig | None = None) -> List[dict]:
+    """検索結果を共有キャッシュ経由で取得（同じクエリはTTL内なら再検索しない）"""
+    cache_key = hashlib.sha256(
+        f"{settings.search_provider}|{settings.tavily_search_depth}|{getattr(tavily, 'max_results', '')}|{query}".encode("utf-8")
+    ).hexdigest()
+    cached = shared_store.cache_get("search", cache_key)
+    if cached is not None:
+        CACHE_REQUESTS.inc(cache="search", result="hit")
+        return cached
+    CACHE_REQUESTS.inc(cache="search", result="miss")
+    
+    with _provider_slot("search", config), provider_call("search", "tavily", query=query) as call:
+        raw_results = tavily.invoke({"query": query})
+        call.set(results=len(raw_results or []))
+    
+    if raw_results and isinstance(raw_results, list):
+        shared_store.cache_set("search", cache_key, raw_results, settings.search_cache_ttl_seconds)
+    return raw_results
+
+
+def _crawl_site(target_url: str) -> List[dict]:
+    """
+    ターゲットのサイトを直接読む（共有キャッシュ経由。同じサイトは検索と同じ TTL の間は読み直さない）
+
+    失敗した場合は空のリストを返し、呼び出し元は site: 検索にフォールバックする
+    """
+    cache_key = hashlib.sha256(f"crawl|{target_url}".encode("utf-8")).hexdigest()
+    cached = shared_store.cache_get("crawl", cache_key)
+    if cached is not None:
+        CACHE_REQUESTS.inc(cache="crawl", result="hit")
+        return cached
+    CACHE_REQUESTS.inc(cache="crawl", result="miss")
+    
+    try:
+        with provider_call("crawler", "crawl", url=target_url) as call:
+            results = get_crawler().crawl(target_url)
+            call.set(results=len(results))
+    except Exception as e:
+        print(f"Site crawl failed: {target_url}, error: {e}")
+        return []
+    
+    if results:
+        shared_store.cache_set("crawl", cache_key, results, settings.search_cache_ttl_seconds)
+    return results
+
+
 # ---- 検索結果のスコアリング ----
 def _score_evidence(evidence_text: str, product_keywords: List[str], language: str) -> int:
     """検索結果と商材との関連度をスコアリング"""
@@ -216,8 +358,252 @@ def _score_evidence(evidence_text: str, product_keywords: List[str], language: s
     return score
 
 
+# ---- 検索結果の重複排除・フィルタリング・スコアリング ----
+def _rank_search_results(
+    all_results: List[dict],
+    product_keywords: List[str],
+    language: str,
+    limit: int = 8,
+) -> List[dict]:
+    """検索結果を重複排除・不適切コンテンツ除外し、スコア上位を返す"""
+    # ---- 重複排除 ----
+    seen_urls = set()
+    unique_results = []
+    for item in all_results:
+        url = item.get("url", "")
+        if url not in seen_urls:
+            seen_urls.add(url)
+            unique_results.append(item)
+    
+    # ---- フィルタリング（不適切コンテンツ除外） ----
+    filtered_results = []
+    for item in unique_results:
+        title = item.get("title", "")
+        content = item.get("content", "")
+        url = item.get("url", "")
+        
+        if not _is_inappropriate_content(f"{title} {content}", url):
+            filtered_results.append(item)
+    
+    # ---- スコアリング ----
+    scored_results = []
+    for item in filtered_results:
+        title = item.get("title", "")
+        content = item.get("content", "")
+        score = _score_evidence(f"{title} {content}", product_keywords, language)
+        scored_results.append((score, item))
+    
+    # スコア順にソート（高い順）
+    scored_results.sort(key=lambda x: x[0], reverse=True)
+    
+    # 上位 limit 件を採用
+    return [item for score, item in scored_results[:limit]]
+
+
+# ---- キャンセル確認 ----
+def _tone_count(state: DMState) -> int:
+    return len(state.get("preferred_tones") or ["polite", "casual", "problem_solver"])
+
+
+def _check_cancelled(
+    config: RunnableConfig | None,
+    node: str,
+    saved_search: int = 0,
+    saved_llm: int = 0,
+) -> None:
+    """
+    キャンセルされていれば RequestCancelledError を送出
+    
+    saved_search / saved_llm はここで止めることで呼ばずに済むプロバイダー呼び出し数
+    """
+    cancel_event = _cancel_event(config)
+    if cancel_event is None or not cancel_event.is_set():
+        return
+    CANCELLED_RUNS.inc(node=node)
+    if saved_search:
+        SAVED_PROVIDER_CALLS.inc(saved_search, provider="search")
+    if saved_llm:
+        SAVED_PROVIDER_CALLS.inc(saved_llm, provider="llm")
+    raise RequestCancelledError(f"Generation cancelled before {node}: client disconnected")
+
+
+# ---- プロンプト組み立て ----
+ANALYZER_SYSTEM_PROMPT = (
+    "You are a B2B SaaS sales strategist specializing in personalized outbound messaging.\n"
+    "Based on the evidence below, extract exactly 3 highly relevant hooks for a personalized cold DM.\n"
+    "Each hook should:\n"
+    "- Focus on a specific initiative, achievement, challenge, or recent development\n"
+    "- Be grounded in concrete evidence\n"
+    "- Be compelling as an opening line in a cold DM\n"
+    "- Relate to business outcomes or pain points\n\n"
+    "Return JSON with this exact schema:\n"
+    "{\n"
+    '  "hooks": [\n'
+    "    {\n"
+    '      "id": 0,\n'
+    '      "title": "Short hook title (max 50 chars)",\n'
+    '      "reason": "Why this hook is compelling (2-3 sentences)",\n'
+    '      "related_evidence_indices": [0, 2]\n'
+    "    }\n"
+    "  ]\n"
+    "}\n"
+)
+
+COPYWRITER_SYSTEM_PROMPT = (
+    "You are a top-tier B2B SaaS outbound sales copywriter in Japanese.\n"
+    "Based on the hooks and evidence, craft highly personalized cold DMs.\n"
+    "Output each DM in **Markdown** format with:\n"
+    "- A compelling subject line as a Markdown heading (e.g., `## 件名案`)\n"
+    "- Body with natural paragraphs and bullet points where appropriate\n"
+    "- Natural Japanese that sounds professional, not translated\n"
+    "- Reference specific evidence/hooks to show personalization\n"
+    "- Include a clear call-to-action\n"
+)
+
+HOOKS_SCHEMA = {
+    "title": "HooksResponse",
+    "type": "object",
+    "properties": {
+        "hooks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "title": {"type": "string"},
+                    "reason": {"type": "string"},
+                    "related_evidence_indices": {
+                        "type": "array",
+                        "items": {"type": "integer"},
+                    },
+                },
+                "required": [
+                    "id",
+                    "title",
+                    "reason",
+                    "related_evidence_indices",
+                ],
+            },
+        }
+    },
+    "required": ["hooks"],
+}
+
+TONE_LABELS = {
+    "polite": "礼儀正しい・丁寧なトーン",
+    "casual": "カジュアル・親しみやすいトーン",
+    "problem_solver": "課題解決型・ビジネス重視のトーン",
+}
+
+
+def _build_analyzer_prompts(evidences: List[EvidenceItem]) -> Tuple[str, str]:
+    """フック抽出の (system, user) プロンプト"""
+    evidence_text = "\n\n".join(
+        [
+            f"[{i}] {e.title}\n{e.snippet}\nURL: {e.url}"
+            for i, e in enumerate(evidences)
+        ]
+    )
+    return ANALYZER_SYSTEM_PROMPT, f"EVIDENCE:\n{evidence_text}"
+
+
+def _build_copywriter_prompts(state: DMState) -> Tuple[str, str]:
+    """DM執筆の (system, user) プロンプト（トーンによらず共通）"""
+    hooks_text = "\n\n".join(
+        [
+            f"[Hook {h.id}] {h.title}\n理由: {h.reason}"
+            for h in state["hooks"]
+        ]
+    )
+    
+    evidence_brief = "\n\n".join(
+        [
+            f"[{i}] {e.title}\n{e.snippet[:200]}..."
+            for i, e in enumerate(state["evidences"])
+        ]
+    )
+    
+    user_prompt = f"""
+ターゲット情報:
+- URL: {state['target_url']}
+- 役職: {state.get('target_role') or '不明'}
+- 会社名: {state.get('company_name') or '不明'}
+
+あなたの商材情報:
+- 商材名: {state['your_product_name']}
+- 要約: {state['your_product_summary']}
+
+利用可能なフック:
+{hooks_text}
+
+参考 Evidence（要約）:
+{evidence_brief}
+
+上記の情報を基に、指定されたトーンで1通のDMを作成してください。
+相手の最近の動きや課題にしっかり紐づけ、パーソナライズされた内容にしてください。
+"""
+    return COPYWRITER_SYSTEM_PROMPT, user_prompt
+
+
+def _build_tone_prompt(tone: ToneType) -> str:
+    return f"トーン: {TONE_LABELS[tone]}（内部ラベル: {tone}）として DM を 1 通生成してください。"
+
+
+def parse_hooks(result: dict) -> List[HookItem]:
+    """フック抽出の構造化出力（HOOKS_SCHEMA）を HookItem にする"""
+    hooks: List[HookItem] = []
+    for i, h in enumerate(result.get("hooks", [])):
+        hooks.append(
+            HookItem(
+                id=int(h.get("id", i)),
+                title=h["title"],
+                reason=h["reason"],
+                related_evidence_indices=h.get("related_evidence_indices", []),
+            )
+        )
+    return hooks
+
+
+# ---- バッチ推論（キャンペーン）用のリクエスト ----
+# 同期実行のノードと同じプロンプト・モデル設定で、Batch API に投入する1件分を組み立てる
+def analyzer_batch_request(custom_id: str, evidences: List[EvidenceItem]) -> BatchRequest:
+    model, temperature, max_tokens = _llm_settings("analyzer")
+    system_prompt, user_prompt = _build_analyzer_prompts(evidences)
+    return BatchRequest(
+        custom_id=custom_id,
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        schema_name=HOOKS_SCHEMA["title"],
+        schema=HOOKS_SCHEMA,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+
+
+def copywriter_batch_request(custom_id: str, state: DMState, tone: ToneType) -> BatchRequest:
+    """state には target_url / target_role / company_name / 商材 / evidences / hooks があればよい"""
+    model, temperature, max_tokens = _llm_settings("copywriter")
+    system_prompt, user_prompt = _build_copywriter_prompts(state)
+    return BatchRequest(
+        custom_id=custom_id,
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+            {"role": "user", "content": _build_tone_prompt(tone)},
+        ],
+        schema_name="DMDraft",
+        schema=DMDraft.model_json_schema(),
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+
+
 # ---- Agent Nodes ----
-def researcher_node(state: DMState) -> DMState:
+def researcher_node(state: DMState, config: RunnableConfig) -> DMState:
     """
     Researcher Agent: Tavilyを使って企業の最新情報を収集
     
@@ -227,7 +613,7 @@ def researcher_node(state: DMState) -> DMState:
     - 複数観点での検索（基本情報、商材関連、採用情報）
     - 検索結果のスコアリングとフィルタリング
     """
-    callback = state.get("progress_callback")
+    callback = _progress_callback(config)
     if callback:
         callback(ProgressUpdate(
             stage="researching",
@@ -294,11 +680,30 @@ def researcher_node(state: DMState) -> DMState:
             if company_name else f"site:{target_url} careers"
         )
     
-    # ---- 検索実行 ----
+    # ---- 会社名がなければ、まずターゲットのサイトを直接読む（十分な結果があれば site: 検索は行わない） ----
     all_results = []
+    if not company_name and crawler_enabled():
+        _check_cancelled(config, "researcher", saved_search=len(queries), saved_llm=1 + _tone_count(state))
+        if callback:
+            callback(ProgressUpdate(
+                stage="researching",
+                message="企業サイトを読み込み中...",
+                progress=15
+            ))
+        all_results = _crawl_site(target_url)
+        if len(all_results) >= settings.crawler_min_results:
+            queries = []
+    
+    # ---- 検索実行 ----
     total_queries = len(queries)
     
     for idx, query in enumerate(queries):
+        _check_cancelled(
+            config,
+            "researcher",
+            saved_search=total_queries - idx,
+            saved_llm=1 + _tone_count(state),
+        )
         if callback:
             progress = 10 + int((idx + 1) / total_queries * 20)
             search_type = ["基本情報", "商材関連", "採用情報"][idx] if language == "ja" else ["Basic Info", "Product Related", "Hiring"][idx]
@@ -309,9 +714,12 @@ def researcher_node(state: DMState) -> DMState:
             ))
         
         try:
-            raw_results = tavily.invoke({"query": query})
+            raw_results = _cached_search(tavily, query, config)
             if raw_results:
                 all_results.extend(raw_results)
+        except RequestCancelledError:
+            # 呼び出し枠を待っている間にキャンセルされた
+            raise
         except Exception as e:
             # 個別の検索失敗は無視して続行
             print(f"Search query failed: {query}, error: {e}")
@@ -320,25 +728,6 @@ def researcher_node(state: DMState) -> DMState:
     if not all_results:
         raise ExternalServiceError("All search queries failed. Please try again.")
     
-    # ---- 重複排除 ----
-    seen_urls = set()
-    unique_results = []
-    for item in all_results:
-        url = item.get("url", "")
-        if url not in seen_urls:
-            seen_urls.add(url)
-            unique_results.append(item)
-    
-    # ---- フィルタリング（不適切コンテンツ除外） ----
-    filtered_results = []
-    for item in unique_results:
-        title = item.get("title", "")
-        content = item.get("content", "")
-        url = item.get("url", "")
-        
-        if not _is_inappropriate_content(f"{title} {content}", url):
-            filtered_results.append(item)
-    
     if callback:
         callback(ProgressUpdate(
             stage="researching",
@@ -346,19 +735,9 @@ def researcher_node(state: DMState) -> DMState:
             progress=35
         ))
     
-    # ---- スコアリング ----
-    scored_results = []
-    for item in filtered_results:
-        title = item.get("title", "")
-        content = item.get("content", "")
-        score = _score_evidence(f"{title} {content}", product_keywords, language)
-        scored_results.append((score, item))
-    
-    # スコア順にソート（高い順）
-    scored_results.sort(key=lambda x: x[0], reverse=True)
-    
-    # 上位8件を採用
-    top_results = [item for score, item in scored_results[:8]]
+    with node_step("researcher", "rank", candidates=len(all_results)) as step:
+        top_results = _rank_search_results(all_results, product_keywords, language)
+        step.set(selected=len(top_results))
     
     # ---- EvidenceItemにマッピング ----
     evidences: List[EvidenceItem] = []
@@ -384,11 +763,15 @@ def researcher_node(state: DMState) -> DMState:
     return state
 
 
-def analyzer_node(state: DMState) -> DMState:
+def analyzer_node(state: DMState, config: RunnableConfig) -> DMState:
     """
     Analyzer Agent: 収集データから「刺さるポイント」を3つ特定
     """
-    callback = state.get("progress_callback")
+    from langchain_core.messages import HumanMessage, SystemMessage
+    
+    _check_cancelled(config, "analyzer", saved_llm=1 + _tone_count(state))
+    
+    callback = _progress_callback(config)
     if callback:
         callback(ProgressUpdate(
             stage="analyzing",
@@ -396,90 +779,29 @@ def analyzer_node(state: DMState) -> DMState:
             progress=50
         ))
     
-    llm = _get_llm()
+    llm = _get_llm("analyzer")
     
     if not state.get("evidences"):
         raise ValueError("No evidences found. Research step must be completed first.")
     
-    evidence_text = "\n\n".join(
-        [
-            f"[{i}] {e.title}\n{e.snippet}\nURL: {e.url}"
-            for i, e in enumerate(state["evidences"])
-        ]
-    )
-    
-    system_prompt = (
-        "You are a B2B SaaS sales strategist specializing in personalized outbound messaging.\n"
-        "Based on the evidence below, extract exactly 3 highly relevant hooks for a personalized cold DM.\n"
-        "Each hook should:\n"
-        "- Focus on a specific initiative, achievement, challenge, or recent development\n"
-        "- Be grounded in concrete evidence\n"
-        "- Be compelling as an opening line in a cold DM\n"
-        "- Relate to business outcomes or pain points\n\n"
-        "Return JSON with this exact schema:\n"
-        "{\n"
-        '  "hooks": [\n'
-        "    {\n"
-        '      "id": 0,\n'
-        '      "title": "Short hook title (max 50 chars)",\n'
-        '      "reason": "Why this hook is compelling (2-3 sentences)",\n'
-        '      "related_evidence_indices": [0, 2]\n'
-        "    }\n"
-        "  ]\n"
-        "}\n"
-    )
-    
-    user_prompt = f"EVIDENCE:\n{evidence_text}"
+    system_prompt, user_prompt = _build_analyzer_prompts(state["evidences"])
     
     try:
-        structured_llm = llm.with_structured_output(
-            schema={
-                "title": "HooksResponse",
-                "type": "object",
-                "properties": {
-                    "hooks": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "id": {"type": "integer"},
-                                "title": {"type": "string"},
-                                "reason": {"type": "string"},
-                                "related_evidence_indices": {
-                                    "type": "array",
-                                    "items": {"type": "integer"},
-                                },
-                            },
-                            "required": [
-                                "id",
-                                "title",
-                                "reason",
-                                "related_evidence_indices",
-                            ],
-                        },
-                    }
-                },
-                "required": ["hooks"],
-            }
-        )
-        
-        result = structured_llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt),
-        ])
+        structured_llm = llm.with_structured_output(schema=HOOKS_SCHEMA)
         
-        hooks_raw = result.get("hooks", [])
-        hooks: List[HookItem] = []
-        for i, h in enumerate(hooks_raw):
-            hooks.append(
-                HookItem(
-                    id=int(h.get("id", i)),
-                    title=h["title"],
-                    reason=h["reason"],
-                    related_evidence_indices=h.get("related_evidence_indices", []),
-                )
-            )
+        with _provider_slot("llm", config), provider_call(
+            "llm",
+            "analyzer",
+            model=llm.model_name,
+            prompt_chars=len(system_prompt) + len(user_prompt),
+            configured_max_retries=getattr(llm, "max_retries", None),
+        ):
+            result = structured_llm.invoke([
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=user_prompt),
+            ])
         
+        hooks = parse_hooks(result)
         state["hooks"] = hooks
         
         if callback:
@@ -491,17 +813,24 @@ def analyzer_node(state: DMState) -> DMState:
         
         return state
         
+    except RequestCancelledError:
+        raise
     except Exception as e:
         raise ExternalServiceError(f"Hook extraction failed: {str(e)}")
 
 
-def copywriter_node(state: DMState) -> DMState:
+def copywriter_node(state: DMState, config: RunnableConfig) -> DMState:
     """
     Copywriter Agent: 指定されたトーンでDMを執筆
+    
+    1回の呼び出しで未執筆のトーンを1通だけ書く（残りがあれば _next_after_copywriter で再度呼ばれる）。
+    ドラフト1通ごとにチェックポイントが保存されるので、途中で失敗しても書き終えた分から再開できる。
     """
-    callback = state.get("progress_callback")
+    from langchain_core.messages import HumanMessage, SystemMessage
+    
+    callback = _progress_callback(config)
     
-    llm = _get_llm()
+    llm = _get_llm("copywriter")
     
     tones: List[ToneType] = (
         state["preferred_tones"]
@@ -509,88 +838,48 @@ def copywriter_node(state: DMState) -> DMState:
         else ["polite", "casual", "problem_solver"]
     )
     
-    tone_labels = {
-        "polite": "礼儀正しい・丁寧なトーン",
-        "casual": "カジュアル・親しみやすいトーン",
-        "problem_solver": "課題解決型・ビジネス重視のトーン",
-    }
-    
-    hooks_text = "\n\n".join(
-        [
-            f"[Hook {h.id}] {h.title}\n理由: {h.reason}"
-            for h in state["hooks"]
-        ]
-    )
-    
-    evidence_brief = "\n\n".join(
-        [
-            f"[{i}] {e.title}\n{e.snippet[:200]}..."
-            for i, e in enumerate(state["evidences"])
-        ]
-    )
+    system_prompt, user_prompt = _build_copywriter_prompts(state)
     
-    system_prompt = (
-        "You are a top-tier B2B SaaS outbound sales copywriter in Japanese.\n"
-        "Based on the hooks and evidence, craft highly personalized cold DMs.\n"
-        "Output each DM in **Markdown** format with:\n"
-        "- A compelling subject line as a Markdown heading (e.g., `## 件名案`)\n"
-        "- Body with natural paragraphs and bullet points where appropriate\n"
-        "- Natural Japanese that sounds professional, not translated\n"
-        "- Reference specific evidence/hooks to show personalization\n"
-        "- Include a clear call-to-action\n"
-    )
+    drafts: List[DMDraft] = list(state.get("drafts") or [])
+    total_tones = len(tones)
+    idx = len(drafts)
+    tone = tones[idx]
     
-    user_prompt = f"""
-ターゲット情報:
-- URL: {state['target_url']}
-- 役職: {state.get('target_role') or '不明'}
-- 会社名: {state.get('company_name') or '不明'}
-
-あなたの商材情報:
-- 商材名: {state['your_product_name']}
-- 要約: {state['your_product_summary']}
-
-利用可能なフック:
-{hooks_text}
-
-参考 Evidence（要約）:
-{evidence_brief}
-
-上記の情報を基に、指定されたトーンで1通のDMを作成してください。
-相手の最近の動きや課題にしっかり紐づけ、パーソナライズされた内容にしてください。
-"""
+    _check_cancelled(config, "copywriter", saved_llm=total_tones - idx)
+    if callback:
+        progress = 70 + int((idx + 1) / total_tones * 25)
+        callback(ProgressUpdate(
+            stage="writing",
+            message=f"{TONE_LABELS[tone]}でDMを生成中... ({idx + 1}/{total_tones})",
+            progress=progress
+        ))
     
-    drafts: List[DMDraft] = []
-    total_tones = len(tones)
+    tone_prompt = _build_tone_prompt(tone)
     
-    for idx, tone in enumerate(tones):
-        if callback:
-            progress = 70 + int((idx + 1) / total_tones * 25)
-            callback(ProgressUpdate(
-                stage="writing",
-                message=f"{tone_labels[tone]}でDMを生成中... ({idx + 1}/{total_tones})",
-                progress=progress
-            ))
-        
-        tone_prompt = (
-            f"トーン: {tone_labels[tone]}（内部ラベル: {tone}）として DM を 1 通生成してください。"
-        )
-        
-        try:
-            structured_llm = llm.with_structured_output(DMDraft)
+    try:
+        structured_llm = llm.with_structured_output(DMDraft)
+        with _provider_slot("llm", config), provider_call(
+            "llm",
+            f"copywriter:{tone}",
+            model=llm.model_name,
+            prompt_chars=len(system_prompt) + len(user_prompt) + len(tone_prompt),
+            configured_max_retries=getattr(llm, "max_retries", None),
+        ):
             draft: DMDraft = structured_llm.invoke([
                 SystemMessage(content=system_prompt),
                 HumanMessage(content=user_prompt),
                 HumanMessage(content=tone_prompt),
             ])
-            draft.tone = tone  # 念のため上書き
-            drafts.append(draft)
-        except Exception as e:
-            raise ExternalServiceError(f"DM generation failed for tone {tone}: {str(e)}")
+        draft.tone = tone  # 念のため上書き
+        drafts.append(draft)
+    except RequestCancelledError:
+        raise
+    except Exception as e:
+        raise ExternalServiceError(f"DM generation failed for tone {tone}: {str(e)}")
     
     state["drafts"] = drafts
     
-    if callback:
+    if callback and len(drafts) == total_tones:
         callback(ProgressUpdate(
             stage="completed",
             message=f"{len(drafts)}通のDMを生成しました",
@@ -600,24 +889,136 @@ def copywriter_node(state: DMState) -> DMState:
     return state
 
 
+def _next_after_copywriter(state: DMState) -> str:
+    """未執筆のトーンが残っていればコピーライターをもう一度実行"""
+    return "copywriter" if len(state.get("drafts") or []) < _tone_count(state) else _END
+
+
 # ---- Graph Builder ----
-def build_dm_graph():
-    """LangGraphパイプラインを構築"""
+_END = "__end__"  # langgraph.graph.END（langgraph は遅延 import するので値を直接持つ）
+_PIPELINE = (
+    ("researcher", researcher_node),
+    ("analyzer", analyzer_node),
+    ("copywriter", copywriter_node),
+)
+
+PipelineStage = Literal["researcher", "analyzer", "copywriter"]
+
+
+def build_dm_graph(
+    entry_point: PipelineStage = "researcher",
+    checkpointer=None,
+    until: PipelineStage = "copywriter",
+):
+    """
+    LangGraphパイプラインを構築
+    
+    entry_point を "analyzer" / "copywriter" にすると、それより前のノードを含まないグラフになる
+    （保存済みの evidences / hooks を state に入れて途中から再生成する場合に使う）。
+    until を指定するとそのノードで終了する（複数役職向けにリサーチ・分析だけを共有する場合に使う）。
+    checkpointer を渡すとステップごとに state を保存する。
+    """
+    from langgraph.graph import StateGraph, END
+    
+    stages = [name for name, _ in _PIPELINE]
+    for stage in (entry_point, until):
+        if stage not in stages:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+    pipeline = _PIPELINE[stages.index(entry_point):stages.index(until) + 1]
+    if not pipeline:
+        raise ValueError(f"Pipeline stage {until} comes before {entry_point}")
+    
     graph = StateGraph(DMState)
     
-    graph.add_node("researcher", researcher_node)
-    graph.add_node("analyzer", analyzer_node)
-    graph.add_node("copywriter", copywriter_node)
+    for name, node in pipeline:
+        graph.add_node(name, instrument_node(name, node))
+    
+    graph.set_entry_point(entry_point)
+    for (name, _), (next_name, _) in zip(pipeline, pipeline[1:]):
+        graph.add_edge(name, next_name)
+    if until == "copywriter":
+        graph.add_conditional_edges("copywriter", _next_after_copywriter, ["copywriter", END])
+    else:
+        graph.add_edge(until, END)
     
-    graph.set_entry_point("researcher")
-    graph.add_edge("researcher", "analyzer")
-    graph.add_edge("analyzer", "copywriter")
-    graph.add_edge("copywriter", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+# ---- Lazy Import / Pre-warm ----
+# LangChain / LangGraph / Tavily は import に数秒かかるため、モジュール読み込み時ではなく
+# 初回利用時に import する。/health や DB系エンドポイントはこれらを必要としない。
+_HEAVY_MODULES = (
+    "langchain_core.messages",
+    "langgraph.graph",
+    "langgraph.checkpoint.sqlite",
+    "langchain_openai",
+    "langchain_community.tools.tavily_search",
+)
+
+
+def prewarm_providers() -> None:
+    """
+    重いプロバイダーモジュールを事前に import する
+
+    サーバーが接続を受け付け始めた後にバックグラウンドスレッドから呼び出し、
+    最初の生成リクエストで import 待ちが発生しないようにする。
+    """
+    import importlib
     
-    return graph.compile()
+    start = time.perf_counter()
+    for module_name in _HEAVY_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"Pre-warm import failed: {module_name}, error: {e}")
+    build_dm_graph()
+    print(f"Provider modules pre-warmed in {time.perf_counter() - start:.2f}s")
 
 
 # ---- Service Function ----
+def _format_profile(profiler: cProfile.Profile, limit: int = 40) -> str:
+    """cProfile の結果を累積時間順のテキストに整形"""
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+async def _persist_trace(run_id: str, root, profiler: cProfile.Profile | None) -> None:
+    """トレースをストアに保存（保存に失敗しても生成結果には影響させない）"""
+    try:
+        profile_text = _format_profile(profiler) if profiler else None
+        record = build_trace_record(run_id, root, profile=profile_text)
+        await asyncio.to_thread(trace_store.append, record)
+    except Exception as e:
+        print(f"Failed to persist trace {run_id}: {e}")
+
+
+@asynccontextmanager
+async def _track_generation(
+    name: str,
+    run_id: str,
+    profiler: cProfile.Profile | None = None,
+    **attrs,
+) -> AsyncIterator[Span]:
+    """生成1回分のメトリクスとトレース（ルートスパンを返す。遅い実行はトレースストアに保存する）"""
+    start = time.perf_counter()
+    status = "error"
+    root = None
+    GENERATIONS_IN_PROGRESS.inc()
+    try:
+        with start_trace(name, **attrs) as root:
+            yield root
+        status = "success"
+    except RequestCancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        GENERATIONS_IN_PROGRESS.dec()
+        GENERATION_DURATION.observe(time.perf_counter() - start, status=status)
+        if root is not None and should_persist(root, profiled=profiler is not None):
+            await _persist_trace(run_id, root, profiler)
+
+
 async def generate_dm_async(
     target_url: str,
     target_role: str | None,
@@ -626,6 +1027,10 @@ async def generate_dm_async(
     your_product_summary: str,
     preferred_tones: List[ToneType] | None = None,
     progress_callback: Callable[[ProgressUpdate], None] | None = None,
+    run_id: str | None = None,
+    profile: bool = False,
+    priority: Priority = DEFAULT_PRIORITY,
+    client_id: str = "",
 ) -> dict:
     """
     DM生成を非同期で実行
@@ -633,8 +1038,300 @@ async def generate_dm_async(
     改善点:
     - URLと会社名から言語・地域を自動判定
     - 商材情報からキーワードを自動抽出
+    - 実行ごとにスパンツリーを記録し、遅い実行はトレースストアに保存
+    - profile=True のときは cProfile の結果もトレースに含める
+    - 同一内容のリクエストが実行中なら（他ワーカーも含めて）その結果を共有する
+    - 生成結果は DMGeneration として保存し、戻り値の generation_id で返す
+    - 戻り値の run_id は実際にパイプラインを実行した run（single-flight で合流した場合はリーダーの run_id）。
+      チェックポイントは結果を保存してから削除するので、保存に失敗してもこの run_id で再試行すれば再実行せずに済む
+    - 呼び出し元のタスクがキャンセルされたら（クライアント切断）、結果を待つフォロワーが
+      いない限りノード間・プロバイダー呼び出し間でパイプラインを止める
+    - プロバイダー呼び出しは priority（interactive / batch）と client_id でスケジューリングする
+      （single-flight で合流した場合は先に始めたリクエストの優先度で実行される）
+    """
+    run_id = run_id or uuid.uuid4().hex
+    cancel_event = threading.Event()
+    
+    async def _run() -> dict:
+        try:
+            result = await _run_generation(
+                target_url=target_url,
+                target_role=target_role,
+                company_name=company_name,
+                your_product_name=your_product_name,
+                your_product_summary=your_product_summary,
+                preferred_tones=preferred_tones,
+                progress_callback=progress_callback,
+                run_id=run_id,
+                profile=profile,
+                cancel_event=cancel_event,
+                priority=priority,
+                client_id=client_id,
+                keep_checkpoint=True,
+            )
+            # single-flight で結果を共有する呼び出し元が同じ generation_id を受け取れるよう、ここで保存する
+            result["generation_id"] = await asyncio.to_thread(
+                persist_generation,
+                target_url=str(target_url),
+                target_role=target_role,
+                company_name=company_name,
+                product_name=your_product_name,
+                product_summary=your_product_summary,
+                result=result,
+            )
+        except APIError as e:
+            # 再試行で再開できるよう、実際に実行した run_id を返す（single-flight のフォロワーにも共有される）
+            e.headers = {**(e.headers or {}), "X-Run-ID": run_id}
+            raise
+        # 保存に失敗したときはチェックポイントを残し、同じ run_id での再試行で再実行せずに保存し直せるようにする
+        if result["generation_id"] is not None:
+            await asyncio.to_thread(forget_run, run_id)
+        result["run_id"] = run_id
+        return result
+    
+    # プロファイル指定の実行は計測対象そのものなので共有しない
+    if not settings.single_flight_enabled or profile:
+        try:
+            return await _run()
+        except asyncio.CancelledError:
+            # to_thread のスレッドは止まらないので、次の確認ポイントで止めてもらう
+            cancel_event.set()
+            raise
+    
+    def _on_follow():
+        if progress_callback:
+            progress_callback(ProgressUpdate(
+                stage="researching",
+                message="同じ内容の生成が実行中のため、その結果を待っています...",
+                progress=5
+            ))
+    
+    key = request_key(
+        target_url=str(target_url),
+        target_role=target_role,
+        company_name=company_name,
+        your_product_name=your_product_name,
+        your_product_summary=your_product_summary,
+        preferred_tones=preferred_tones or ["polite", "casual", "problem_solver"],
+    )
+    return await single_flight.run(key, _run, on_follow=_on_follow, on_abandon=cancel_event.set)
+
+
+async def regenerate_dm_async(
+    target_url: str,
+    target_role: str | None,
+    company_name: str | None,
+    your_product_name: str,
+    your_product_summary: str,
+    evidences: List[dict],
+    hooks: List[dict],
+    preferred_tones: List[ToneType] | None = None,
+    from_stage: PipelineStage = "copywriter",
+    progress_callback: Callable[[ProgressUpdate], None] | None = None,
+    run_id: str | None = None,
+    priority: Priority = DEFAULT_PRIORITY,
+    client_id: str = "",
+) -> dict:
     """
-    graph = build_dm_graph()
+    保存済みの evidences / hooks からパイプラインの途中に入って再生成する
+    
+    - from_stage="copywriter": 保存済みの hooks で指定トーンのDMだけを書き直す（LLM呼び出しはトーン数分）
+    - from_stage="analyzer": hooks から抽出し直す（検索は行わない）
+    """
+    if from_stage not in ("analyzer", "copywriter"):
+        raise ValidationError(f"Cannot regenerate from stage: {from_stage}")
+    if not evidences:
+        raise ValidationError("Stored generation has no evidences to regenerate from")
+    if from_stage == "copywriter" and not hooks:
+        raise ValidationError("Stored generation has no hooks; regenerate from the analyzer stage")
+    
+    cancel_event = threading.Event()
+    try:
+        return await _run_generation(
+            target_url=target_url,
+            target_role=target_role,
+            company_name=company_name,
+            your_product_name=your_product_name,
+            your_product_summary=your_product_summary,
+            preferred_tones=preferred_tones,
+            progress_callback=progress_callback,
+            run_id=run_id or uuid.uuid4().hex,
+            profile=False,
+            cancel_event=cancel_event,
+            entry_point=from_stage,
+            evidences=[EvidenceItem(**e) for e in evidences],
+            hooks=[HookItem(**h) for h in hooks] if from_stage == "copywriter" else [],
+            priority=priority,
+            client_id=client_id,
+        )
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+
+
+async def generate_multi_role_dm_async(
+    target_url: str,
+    target_roles: List[str],
+    company_name: str | None,
+    your_product_name: str,
+    your_product_summary: str,
+    preferred_tones: List[ToneType] | None = None,
+    priority: Priority = DEFAULT_PRIORITY,
+    client_id: str = "",
+) -> dict:
+    """
+    同じ企業の複数の役職向けDMをまとめて生成
+    
+    リサーチと分析は役職に依存しないので1回だけ実行し、コピーライティングだけを
+    役職×トーンごとに並行実行する（同時実行数は multi_role_max_concurrency まで）。
+    役職ごとに1件の DMGeneration として保存する。
+    メトリクス・トレースは全体で1回の生成として記録し、リサーチ・分析と役職×トーンごとの執筆は子スパンにする。
+    """
+    tones: List[ToneType] = preferred_tones or ["polite", "casual", "problem_solver"]
+    roles = list(dict.fromkeys(target_roles))
+    cancel_event = threading.Event()
+    common = dict(
+        target_url=target_url,
+        company_name=company_name,
+        your_product_name=your_product_name,
+        your_product_summary=your_product_summary,
+        progress_callback=None,
+        run_id=uuid.uuid4().hex,
+        profile=False,
+        cancel_event=cancel_event,
+        priority=priority,
+        client_id=client_id,
+        nested=True,
+    )
+    
+    try:
+        async with _track_generation(
+            "generate_multi_role",
+            common["run_id"],
+            target_url=str(target_url),
+            company_name=company_name,
+            roles=roles,
+            tones=tones,
+        ):
+            with span("shared", until="analyzer"):
+                shared = await _run_generation(
+                    target_role=None,
+                    preferred_tones=tones,
+                    until="analyzer",
+                    **common,
+                )
+            evidences = [EvidenceItem(**e) for e in shared["evidences"]]
+            hooks = [HookItem(**h) for h in shared["hooks"]]
+            semaphore = asyncio.Semaphore(max(1, settings.multi_role_max_concurrency))
+            
+            async def _write(role: str, tone: ToneType) -> dict:
+                async with semaphore:
+                    with span("write", role=role, tone=tone):
+                        result = await _run_generation(
+                            target_role=role,
+                            preferred_tones=[tone],
+                            entry_point="copywriter",
+                            evidences=evidences,
+                            hooks=hooks,
+                            **common,
+                        )
+                return result["drafts"][0]
+            
+            drafts = await asyncio.gather(*(_write(role, tone) for role in roles for tone in tones))
+    except BaseException:
+        # 失敗・キャンセル時は実行中の他の役職・トーンも次の確認ポイントで止める
+        cancel_event.set()
+        raise
+    
+    results = []
+    for i, role in enumerate(roles):
+        role_drafts = list(drafts[i * len(tones):(i + 1) * len(tones)])
+        generation_id = await asyncio.to_thread(
+            persist_generation,
+            target_url=str(target_url),
+            target_role=role,
+            company_name=company_name,
+            product_name=your_product_name,
+            product_summary=your_product_summary,
+            result={"evidences": shared["evidences"], "hooks": shared["hooks"], "drafts": role_drafts},
+        )
+        results.append({"target_role": role, "generation_id": generation_id, "drafts": role_drafts})
+    
+    return {
+        "evidences": shared["evidences"],
+        "hooks": shared["hooks"],
+        "results": results,
+    }
+
+
+async def research_async(
+    target_url: str,
+    target_role: str | None,
+    company_name: str | None,
+    your_product_name: str,
+    your_product_summary: str,
+    priority: Priority = DEFAULT_PRIORITY,
+    client_id: str = "",
+) -> List[dict]:
+    """
+    リサーチだけを実行して evidences を返す
+    
+    キャンペーンでは検索だけを同期で行い、LLM 呼び出しはバッチ推論にまとめる。
+    """
+    cancel_event = threading.Event()
+    try:
+        result = await _run_generation(
+            target_url=target_url,
+            target_role=target_role,
+            company_name=company_name,
+            your_product_name=your_product_name,
+            your_product_summary=your_product_summary,
+            preferred_tones=None,
+            progress_callback=None,
+            run_id=uuid.uuid4().hex,
+            profile=False,
+            cancel_event=cancel_event,
+            until="researcher",
+            priority=priority,
+            client_id=client_id,
+        )
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+    return result["evidences"]
+
+
+async def _run_generation(
+    target_url: str,
+    target_role: str | None,
+    company_name: str | None,
+    your_product_name: str,
+    your_product_summary: str,
+    preferred_tones: List[ToneType] | None,
+    progress_callback: Callable[[ProgressUpdate], None] | None,
+    run_id: str,
+    profile: bool,
+    cancel_event: threading.Event,
+    entry_point: PipelineStage = "researcher",
+    evidences: List[EvidenceItem] | None = None,
+    hooks: List[HookItem] | None = None,
+    until: PipelineStage = "copywriter",
+    priority: Priority = DEFAULT_PRIORITY,
+    client_id: str = "",
+    keep_checkpoint: bool = False,
+    nested: bool = False,
+) -> dict:
+    """
+    パイプライン1回分の実行（メトリクス・トレース付き）
+    
+    run_id をチェックポイントの thread_id に使う。同じ run_id のチェックポイントが残っていれば
+    （前回が途中で失敗・キャンセルされた）、最後に完了したステップから再開する。
+    keep_checkpoint=True のときは完了後もチェックポイントを残す（呼び出し元が結果を保存してから forget_run する）。
+    nested=True のときは呼び出し元が記録している生成の一部として実行する
+    （メトリクス・トレースは呼び出し元のものに含め、チェックポイントも取らない）。
+    """
+    checkpointer = None if nested else get_checkpointer()
+    graph = build_dm_graph(entry_point, checkpointer=checkpointer, until=until)
     
     # 言語・地域を判定
     region, language = _detect_region(str(target_url), company_name)
@@ -642,15 +1339,6 @@ async def generate_dm_async(
     # 商材からキーワードを抽出
     product_keywords = _extract_product_keywords(your_product_name, your_product_summary)
     
-    # 進捗コールバックで判定結果を通知
-    if progress_callback:
-        region_label = "日本企業" if region == "japan" else "グローバル企業"
-        progress_callback(ProgressUpdate(
-            stage="researching",
-            message=f"{region_label}として検索を開始します...",
-            progress=5
-        ))
-    
     initial_state: DMState = {
         "target_url": str(target_url),
         "target_role": target_role,
@@ -663,14 +1351,84 @@ async def generate_dm_async(
         "language": language,
         "product_keywords": product_keywords,
         # 結果格納用
-        "evidences": [],
-        "hooks": [],
+        "evidences": evidences or [],
+        "hooks": hooks or [],
         "drafts": [],
-        "progress_callback": progress_callback,
+    }
+    config = {
+        "configurable": {
+            "thread_id": run_id,
+            "progress_callback": progress_callback,
+            "cancel_event": cancel_event,
+            "priority": priority,
+            "client_id": client_id,
+        },
+        # コピーライターはトーンごとに1ステップ
+        "recursion_limit": 10 + len(initial_state["preferred_tones"]),
     }
     
+    # cProfile はスレッド単位なので、グラフを実行するワーカースレッド内で有効化する
+    profiler = cProfile.Profile() if profile else None
+    
+    def _run_graph():
+        snapshot = graph.get_state(config) if checkpointer else None
+        if snapshot is not None and snapshot.values:
+            # 同じ run_id で別の宛先・商材を渡されたら、前回の結果（別人向けの文面）を返さない
+            for key in ("target_url", "target_role", "company_name",
+                        "your_product_name", "your_product_summary", "preferred_tones"):
+                if snapshot.values.get(key) != initial_state[key]:
+                    raise ValidationError(f"run_id {run_id} belongs to a different request")
+            if not snapshot.next:
+                # 前回の実行は完了済み（結果の保存前に落ちた等）
+                return snapshot.values
+            if progress_callback:
+                progress_callback(ProgressUpdate(
+                    stage="researching",
+                    message=f"前回の続き（{snapshot.next[0]}）から再開します...",
+                    progress=5
+                ))
+            return graph.invoke(None, config)
+        
+        # 進捗コールバックで判定結果を通知
+        if progress_callback and entry_point == "researcher":
+            region_label = "日本企業" if region == "japan" else "グローバル企業"
+            progress_callback(ProgressUpdate(
+                stage="researching",
+                message=f"{region_label}として検索を開始します...",
+                progress=5
+            ))
+        if checkpointer:
+            mark_run(run_id)
+        return graph.invoke(initial_state, config)
+    
+    def _invoke_graph():
+        if profiler:
+            profiler.enable()
+        try:
+            final_state = _run_graph()
+        finally:
+            if profiler:
+                profiler.disable()
+        # 完了した run のチェックポイントは不要（失敗した run は再試行用に残す）
+        if checkpointer and not keep_checkpoint:
+            forget_run(run_id)
+        return final_state
+    
     # 非同期実行（実際にはLangGraphは同期的だが、将来の拡張のため）
-    final_state = await asyncio.to_thread(graph.invoke, initial_state)
+    if nested:
+        final_state = await asyncio.to_thread(_invoke_graph)
+    else:
+        async with _track_generation(
+            "generate_dm",
+            run_id,
+            profiler,
+            target_url=str(target_url),
+            company_name=company_name,
+            tones=initial_state["preferred_tones"],
+            entry_point=entry_point,
+            until=until,
+        ):
+            final_state = await asyncio.to_thread(_invoke_graph)
     
     return {
         "evidences": [e.model_dump() for e in final_state["evidences"]],
@@ -0,0 +1,307 @@
+"""
+バッチ推論プロバイダー（OpenAI Batch API 形式）
+
+キャンペーン（多数のターゲットへの一括生成）では LLM を1件ずつ同期で呼ぶ代わりに、
+全ターゲット分のリクエストをまとめて投入し、完了をポーリングして結果を受け取る。
+完了まで時間がかかる（最大 24 時間）代わりに、同期 API のレートリミットとは別枠で大量に処理できる。
+
+- OpenAIBatchProvider: /v1/chat/completions の JSONL を Files API でアップロードして Batch を作る
+- LocalBatchProvider:  ファイルベースのスタンドイン（batch_local_dir に同じ形式の入出力ファイルを書く。
+                       投入から batch_local_latency_seconds 経過後の最初のポーリングで fakes の応答を書き出す）
+
+settings.batch_provider で選ぶ（未設定なら llm_provider が "fake" のときスタンドイン）。
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+import io
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.security import ExternalServiceError
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# これ以上状態が変わらない Batch のステータス（OpenAI の Batch オブジェクトと同じ値）
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+@dataclass
+class BatchRequest:
+    """Batch に投入するチャット補完1件（custom_id で結果と対応付ける）"""
+    custom_id: str
+    model: str
+    messages: List[dict]
+    schema_name: str
+    schema: dict
+    temperature: float
+    max_tokens: Optional[int] = None
+
+    def to_line(self) -> dict:
+        """Batch API の入力ファイルの1行"""
+        body = {
+            "model": self.model,
+            "messages": self.messages,
+            "temperature": self.temperature,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": self.schema_name, "schema": self.schema},
+            },
+        }
+        if self.max_tokens:
+            body["max_tokens"] = self.max_tokens
+        return {"custom_id": self.custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+@dataclass
+class BatchStatus:
+    batch_id: str
+    status: str
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)  # Batch 全体の失敗理由（入力ファイルの検証エラー等）
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+@dataclass
+class BatchResult:
+    """1件分の結果（content は構造化出力をパースした dict。失敗した場合は error）"""
+    custom_id: str
+    content: Optional[dict] = None
+    error: Optional[str] = None
+
+
+def parse_output_line(line: dict) -> BatchResult:
+    """Batch API の出力ファイル・エラーファイルの1行を BatchResult にする"""
+    custom_id = line.get("custom_id", "")
+    if line.get("error"):
+        return BatchResult(custom_id, error=line["error"].get("message") or str(line["error"]))
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    if response.get("status_code") != 200:
+        message = (body.get("error") or {}).get("message") or f"status {response.get('status_code')}"
+        return BatchResult(custom_id, error=message)
+    try:
+        choice = body["choices"][0]
+        if choice.get("finish_reason") == "length":
+            return BatchResult(custom_id, error="Output truncated by max_tokens")
+        return BatchResult(custom_id, content=json.loads(choice["message"]["content"]))
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return BatchResult(custom_id, error=f"Unparseable batch output: {e}")
+
+
+def _jsonl(lines: Iterator[dict]) -> bytes:
+    return b"".join(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n" for line in lines)
+
+
+class BatchProvider(ABC):
+    """バッチ推論プロバイダーのインターフェース"""
+
+    @abstractmethod
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        """リクエストを投入して batch_id を返す"""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> BatchStatus:
+        """Batch の進捗"""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        """終了した Batch の結果（失敗したリクエストも error 付きで返す）"""
+
+
+class OpenAIBatchProvider(BatchProvider):
+    """OpenAI Batch API"""
+
+    def __init__(self):
+        if not settings.openai_api_key:
+            raise ExternalServiceError("OpenAI API key is not configured")
+        from openai import OpenAI
+
+        self._client = OpenAI(api_key=settings.openai_api_key)
+
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        data = _jsonl(r.to_line() for r in requests)
+        try:
+            input_file = self._client.files.create(file=("batch.jsonl", io.BytesIO(data)), purpose="batch")
+            batch = self._client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window="24h",
+                metadata=metadata,
+            )
+        except Exception as e:
+            raise ExternalServiceError(f"Batch submission failed: {e}")
+        return batch.id
+
+    def status(self, batch_id: str) -> BatchStatus:
+        batch = self._client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        errors = [e.message or e.code or "" for e in (batch.errors.data or [])] if batch.errors else []
+        return BatchStatus(
+            batch_id=batch.id,
+            status=batch.status,
+            total=counts.total if counts else 0,
+            completed=counts.completed if counts else 0,
+            failed=counts.failed if counts else 0,
+            errors=errors,
+        )
+
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        batch = self._client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self._client.files.content(file_id).text.splitlines():
+                if line.strip():
+                    yield parse_output_line(json.loads(line))
+
+
+class LocalBatchProvider(BatchProvider):
+    """
+    ファイルベースのスタンドイン（テスト・オフライン用）
+
+    <batch_local_dir>/<batch_id>/ に input.jsonl・batch.json・output.jsonl を書く。
+    出力は OpenAI の出力ファイルと同じ形式で、各リクエストは fake_llm_error_rate の割合で失敗する。
+    """
+
+    def __init__(self, directory: Optional[str] = None, latency_seconds: Optional[float] = None):
+        self.directory = directory or settings.batch_local_dir
+        self.latency_seconds = (
+            settings.batch_local_latency_seconds if latency_seconds is None else latency_seconds
+        )
+        self._lock = threading.Lock()
+        self._rng = random.Random(settings.fake_seed)
+
+    def _path(self, batch_id: str, name: str) -> str:
+        if os.sep in batch_id or not batch_id.startswith("batch_local_"):
+            raise ValueError(f"Invalid local batch id: {batch_id}")
+        return os.path.join(self.directory, batch_id, name)
+
+    def _write(self, path: str, data: bytes) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_meta(self, batch_id: str) -> dict:
+        try:
+            with open(self._path(batch_id, "batch.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ExternalServiceError(f"Batch not found: {batch_id}")
+
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(self.directory, batch_id), exist_ok=True)
+        self._write(self._path(batch_id, "input.jsonl"), _jsonl(r.to_line() for r in requests))
+        meta = {
+            "id": batch_id,
+            "status": "in_progress",
+            "created_at": time.time(),
+            "total": len(requests),
+            "completed": 0,
+            "failed": 0,
+            "metadata": metadata,
+        }
+        self._write(self._path(batch_id, "batch.json"), json.dumps(meta).encode("utf-8"))
+        return batch_id
+
+    def _respond(self, line: dict) -> dict:
+        """入力1行に対する出力1行（OpenAI の出力ファイルと同じ形）"""
+        from app.services.ai.fakes import fake_structured_output
+
+        body = line["body"]
+        request_id = f"req_{uuid.uuid4().hex}"
+        if self._rng.random() < settings.fake_llm_error_rate:
+            return {
+                "id": request_id,
+                "custom_id": line["custom_id"],
+                "response": {
+                    "status_code": 429,
+                    "body": {"error": {"message": "simulated failure (429 Too Many Requests)"}},
+                },
+                "error": None,
+            }
+        prompt = "\n".join(m["content"] for m in body["messages"])
+        schema_name = body["response_format"]["json_schema"]["name"]
+        content = fake_structured_output(schema_name, prompt)
+        return {
+            "id": request_id,
+            "custom_id": line["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "object": "chat.completion",
+                    "model": body["model"],
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)},
+                        "finish_reason": "stop",
+                    }],
+                },
+            },
+            "error": None,
+        }
+
+    def _process(self, batch_id: str, meta: dict) -> dict:
+        outputs = []
+        with open(self._path(batch_id, "input.jsonl"), encoding="utf-8") as f:
+            for raw in f:
+                if raw.strip():
+                    outputs.append(self._respond(json.loads(raw)))
+        self._write(self._path(batch_id, "output.jsonl"), _jsonl(iter(outputs)))
+        failed = sum(1 for o in outputs if o["response"]["status_code"] != 200)
+        meta.update(status="completed", completed=len(outputs) - failed, failed=failed, completed_at=time.time())
+        self._write(self._path(batch_id, "batch.json"), json.dumps(meta).encode("utf-8"))
+        return meta
+
+    def status(self, batch_id: str) -> BatchStatus:
+        with self._lock:
+            meta = self._read_meta(batch_id)
+            if meta["status"] == "in_progress" and time.time() - meta["created_at"] >= self.latency_seconds:
+                meta = self._process(batch_id, meta)
+        return BatchStatus(
+            batch_id=batch_id,
+            status=meta["status"],
+            total=meta["total"],
+            completed=meta["completed"],
+            failed=meta["failed"],
+        )
+
+    def results(self, batch_id: str) -> Iterator[BatchResult]:
+        try:
+            with open(self._path(batch_id, "output.jsonl"), encoding="utf-8") as f:
+                for raw in f:
+                    if raw.strip():
+                        yield parse_output_line(json.loads(raw))
+        except FileNotFoundError:
+            return
+
+
+_provider: Optional[BatchProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_batch_provider() -> BatchProvider:
+    """設定に応じたバッチ推論プロバイダー（プロセスで1つ）"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            name = settings.batch_provider or ("local" if settings.llm_provider == "fake" else "openai")
+            if name == "local":
+                _provider = LocalBatchProvider()
+            elif name == "openai":
+                _provider = OpenAIBatchProvider()
+            else:
+                raise ValueError(f"Unknown batch provider: {name}")
+        return _provider
@@ -0,0 +1,96 @@
+"""
+LangGraph のチェックポイント（SQLite）
+
+各ノードの完了後（コピーライターはドラフト1通ごと）に DMState を保存し、
+同じ run_id（= thread_id）で再実行したときに最後に完了したステップから再開できるようにする。
+
+- 成功した run のチェックポイントは結果をDBに保存した後に削除する
+- 失敗・キャンセルした run は checkpoint_ttl_seconds の間だけ残す（再試行用）
+- langgraph-checkpoint-sqlite は import が重いので初回利用時に読み込む
+"""
+from __future__ import annotations
+from typing import Optional
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import settings
+
+_lock = threading.Lock()
+_checkpointer = None
+_conn: Optional[sqlite3.Connection] = None
+_last_purge = 0.0
+
+_RUNS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint_runs (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def get_checkpointer():
+    """プロセス内で共有する SqliteSaver（checkpoint_enabled=False なら None）"""
+    global _checkpointer, _conn
+    if not settings.checkpoint_enabled:
+        return None
+    with _lock:
+        if _checkpointer is None:
+            from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+            from langgraph.checkpoint.sqlite import SqliteSaver
+            from app.schemas.dm import DMDraft, EvidenceItem, HookItem
+
+            directory = os.path.dirname(settings.checkpoint_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _conn = sqlite3.connect(settings.checkpoint_path, check_same_thread=False, timeout=10)
+            _conn.execute(_RUNS_SCHEMA)
+            _conn.commit()
+            # state に入るのはスキーマのモデルだけなので、復元できる型をそれに限定する
+            serde = JsonPlusSerializer(allowed_msgpack_modules=[EvidenceItem, HookItem, DMDraft])
+            _checkpointer = SqliteSaver(_conn, serde=serde)
+            _checkpointer.setup()
+    return _checkpointer
+
+
+def mark_run(thread_id: str) -> None:
+    """チェックポイントを持つ run として記録（TTLでの削除対象にする）"""
+    checkpointer = get_checkpointer()
+    if checkpointer is None:
+        return
+    with checkpointer.lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO checkpoint_runs (thread_id, updated_at) VALUES (?, ?)",
+            (thread_id, time.time()),
+        )
+        _conn.commit()
+    _maybe_purge()
+
+
+def forget_run(thread_id: str) -> None:
+    """run のチェックポイントを削除（成功して結果を保存した後）"""
+    checkpointer = get_checkpointer()
+    if checkpointer is None:
+        return
+    checkpointer.delete_thread(thread_id)
+    with checkpointer.lock:
+        _conn.execute("DELETE FROM checkpoint_runs WHERE thread_id = ?", (thread_id,))
+        _conn.commit()
+
+
+def _maybe_purge() -> None:
+    """TTLを過ぎた run のチェックポイントを削除"""
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < 60:
+        return
+    _last_purge = now
+    checkpointer = get_checkpointer()
+    with checkpointer.lock:
+        rows = _conn.execute(
+            "SELECT thread_id FROM checkpoint_runs WHERE updated_at < ?",
+            (now - settings.checkpoint_ttl_seconds,),
+        ).fetchall()
+    for (thread_id,) in rows:
+        forget_run(thread_id)
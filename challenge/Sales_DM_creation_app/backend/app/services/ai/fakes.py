@@ -0,0 +1,240 @@
+"""
+オフライン用のプロバイダースタンドイン
+
+OpenAI / Tavily を呼ばずにパイプライン全体を動かすための偽バックエンド。
+settings.llm_provider / settings.search_provider を "fake" にすると
+agents.py の _get_llm() / _get_tavily_tool() がこちらを返す。
+
+- 本物と同じ形の構造化出力を返す（HooksResponse の dict / DMDraft）
+- レイテンシ分布とエラー率を Settings から設定できる（LLM はモデルごとに平均レイテンシを変えられる）
+- ネットワークには一切アクセスしない
+- バッチ推論のスタンドイン（batch.LocalBatchProvider）も同じ応答を返す
+"""
+from __future__ import annotations
+from typing import Any, List
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+from app.core.config import settings
+from app.schemas.dm import DMDraft
+
+
+class FakeProviderError(Exception):
+    """スタンドインが意図的に発生させる障害（429 / タイムアウト相当）"""
+
+
+class _LatencyModel:
+    """設定された分布に従ってスリープし、エラー率に従って失敗させる"""
+
+    def __init__(self, mean_ms: float, stddev_ms: float, error_rate: float):
+        self.mean_ms = max(0.0, mean_ms)
+        self.stddev_ms = max(0.0, stddev_ms)
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self.distribution = settings.fake_latency_distribution
+        self._rng = random.Random(settings.fake_seed)
+        self._lock = threading.Lock()
+
+    def _sample_ms(self) -> float:
+        mean, stddev = self.mean_ms, self.stddev_ms
+        if mean == 0 or self.distribution == "fixed" or stddev == 0:
+            return mean
+        with self._lock:
+            if self.distribution == "uniform":
+                return self._rng.uniform(max(0.0, mean - stddev), mean + stddev)
+            if self.distribution == "normal":
+                return max(0.0, self._rng.gauss(mean, stddev))
+            # lognormal: 平均・標準偏差が設定値になるようにパラメータを変換
+            sigma2 = math.log(1 + (stddev / mean) ** 2)
+            mu = math.log(mean) - sigma2 / 2
+            return self._rng.lognormvariate(mu, math.sqrt(sigma2))
+
+    def _should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def simulate(self, provider: str) -> None:
+        time.sleep(self._sample_ms() / 1000)
+        if self._should_fail():
+            raise FakeProviderError(f"{provider}: simulated failure (429 Too Many Requests)")
+
+
+_latency_models: dict = {}
+_latency_models_lock = threading.Lock()
+
+
+def _get_latency_model(provider: str, mean_ms: float, stddev_ms: float, error_rate: float) -> _LatencyModel:
+    """
+    プロバイダーごとのレイテンシモデルを共有する
+
+    fake_seed を固定したときに、インスタンスを作り直しても乱数列が先に進むようにするため。
+    """
+    key = (provider, mean_ms, stddev_ms, error_rate, settings.fake_latency_distribution, settings.fake_seed)
+    with _latency_models_lock:
+        if key not in _latency_models:
+            _latency_models[key] = _LatencyModel(mean_ms, stddev_ms, error_rate)
+        return _latency_models[key]
+
+
+def _has_japanese(text: str) -> bool:
+    return bool(re.search(r'[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF]', text))
+
+
+def _stable_rng(*parts: str) -> random.Random:
+    """入力に対して決定的な内容を返すための乱数生成器"""
+    digest = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+    return random.Random(int(digest[:16], 16) ^ (settings.fake_seed or 0))
+
+
+# ---- Fake Search ----
+_JA_TOPICS = [
+    ("新サービスの提供を開始", "業務効率化とDX推進の一環として、新サービスの導入を発表した。"),
+    ("シリーズBで資金調達を実施", "成長投資として営業・カスタマーサポート体制の強化を進める。"),
+    ("大手企業との業務提携を発表", "提携によりデータ活用と顧客対応の改善に取り組む方針だ。"),
+    ("カスタマーサクセス部門の採用を強化", "問い合わせ対応の増加に伴い、人材募集と体制強化を検討している。"),
+    ("中期経営計画を発表", "デジタル変革と生産性改善を重点課題として掲げている。"),
+    ("セキュリティ認証を取得", "情報漏洩対策とアクセス管理の強化を進めている。"),
+]
+
+_EN_TOPICS = [
+    ("launches new platform", "The company announced a new platform to improve efficiency across its customer operations."),
+    ("raises Series B funding", "The funding will be invested in growth, sales and customer support expansion."),
+    ("announces strategic partnership", "The partnership aims to implement digital workflows and improve data quality."),
+    ("is hiring across customer success", "Open roles suggest the team faces challenges scaling customer service."),
+    ("publishes annual growth report", "Leadership highlighted digital transformation and efficiency as key priorities."),
+    ("achieves SOC 2 compliance", "The milestone strengthens its cybersecurity and data protection posture."),
+]
+
+
+class FakeSearchTool:
+    """TavilySearchResults と同じ invoke インターフェースを持つ検索スタンドイン"""
+
+    def __init__(self, max_results: int = 5):
+        self.max_results = max_results
+        self._latency = _get_latency_model(
+            "search",
+            settings.fake_search_latency_ms,
+            settings.fake_search_latency_stddev_ms,
+            settings.fake_search_error_rate,
+        )
+
+    def invoke(self, tool_input: dict) -> List[dict]:
+        query = tool_input.get("query", "") if isinstance(tool_input, dict) else str(tool_input)
+        self._latency.simulate("search")
+
+        rng = _stable_rng("search", query)
+        japanese = _has_japanese(query)
+        topics = _JA_TOPICS if japanese else _EN_TOPICS
+        subject = query.split(" ")[0] if query else "Example"
+        if subject.startswith("site:"):
+            subject = urlparse(subject[len("site:"):]).netloc or subject[len("site:"):]
+
+        results = []
+        for i, (headline, body) in enumerate(rng.sample(topics, k=min(self.max_results, len(topics)))):
+            slug = hashlib.md5(f"{query}|{i}".encode("utf-8")).hexdigest()[:10]
+            title = f"{subject}、{headline}" if japanese else f"{subject} {headline}"
+            # 実際の検索結果に近い長さになるよう本文を繰り返す
+            content = " ".join([f"{title}。{body}" if japanese else f"{title}. {body}"] * rng.randint(2, 4))
+            results.append({
+                "title": title,
+                "url": f"https://news.example.com/{slug}",
+                "content": content,
+                "score": round(rng.uniform(0.5, 0.99), 3),
+            })
+        return results
+
+
+# ---- Fake LLM ----
+def fake_hooks(prompt: str) -> dict:
+    """フック抽出（HooksResponse）の応答"""
+    evidences = re.findall(r"^\[(\d+)\] (.+)$", prompt, flags=re.MULTILINE)
+    if not evidences:
+        evidences = [("0", "Recent company update")]
+    rng = _stable_rng("hooks", prompt)
+    hooks = []
+    for i in range(3):
+        index, title = evidences[i % len(evidences)]
+        related = sorted({int(index), int(rng.choice(evidences)[0])})
+        hooks.append({
+            "id": i,
+            "title": title[:50],
+            "reason": (
+                f"{title} shows a concrete initiative the prospect is investing in. "
+                "It connects directly to measurable business outcomes and gives a natural opening."
+            ),
+            "related_evidence_indices": related,
+        })
+    return {"hooks": hooks}
+
+
+def fake_draft(prompt: str) -> DMDraft:
+    """DM執筆（DMDraft）の応答"""
+    tone_match = re.search(r"内部ラベル: (\w+)", prompt)
+    tone = tone_match.group(1) if tone_match else "polite"
+    product_match = re.search(r"商材名: (.+)", prompt)
+    product = product_match.group(1).strip() if product_match else "弊社サービス"
+    hook_titles = re.findall(r"^\[Hook \d+\] (.+)$", prompt, flags=re.MULTILINE) or ["最近の取り組み"]
+
+    title = f"{hook_titles[0][:30]}について、{product}のご提案"
+    bullets = "\n".join(f"- {h}" for h in hook_titles[:3])
+    body = (
+        f"## {title}\n\n"
+        "突然のご連絡失礼いたします。\n\n"
+        f"貴社の「{hook_titles[0]}」に関する取り組みを拝見し、ご連絡いたしました。\n\n"
+        f"{bullets}\n\n"
+        f"これらの取り組みに対して、{product}がお役に立てると考えております。\n\n"
+        "15分ほどオンラインでお話しできるお時間をいただけないでしょうか。"
+    )
+    return DMDraft(tone=tone, title=title, body_markdown=body)
+
+
+def fake_structured_output(schema_name: str, prompt: str) -> dict:
+    """構造化出力のスキーマ名（HooksResponse / DMDraft）に応じた応答（バッチのスタンドイン用）"""
+    if schema_name == "HooksResponse":
+        return fake_hooks(prompt)
+    if schema_name == "DMDraft":
+        return fake_draft(prompt).model_dump()
+    raise NotImplementedError(f"Fake batch does not support schema: {schema_name}")
+
+
+class _FakeStructuredModel:
+    def __init__(self, model: "FakeChatModel", schema: Any):
+        self._model = model
+        self._schema = schema
+
+    def invoke(self, messages: List[Any]) -> Any:
+        self._model._latency.simulate("llm")
+        prompt = "\n".join(str(getattr(m, "content", m)) for m in messages)
+
+        if isinstance(self._schema, type) and issubclass(self._schema, DMDraft):
+            return fake_draft(prompt)
+        if isinstance(self._schema, dict) and self._schema.get("title") == "HooksResponse":
+            return fake_hooks(prompt)
+        raise NotImplementedError(f"FakeChatModel does not support schema: {self._schema!r}")
+
+
+class FakeChatModel:
+    """ChatOpenAI の with_structured_output().invoke() 部分だけを模倣するスタンドイン"""
+
+    def __init__(self, model: str = "fake-llm", temperature: float = 0.0, max_tokens: int | None = None):
+        self.model_name = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # モデルごとのレイテンシ（小さいモデルほど速い）を fake_llm_model_latency_ms で再現する
+        mean_ms = settings.fake_llm_model_latency_ms.get(model, settings.fake_llm_latency_ms)
+        scale = mean_ms / settings.fake_llm_latency_ms if settings.fake_llm_latency_ms else 1.0
+        self._latency = _get_latency_model(
+            "llm",
+            mean_ms,
+            settings.fake_llm_latency_stddev_ms * scale,
+            settings.fake_llm_error_rate,
+        )
+
+    def with_structured_output(self, schema: Any) -> _FakeStructuredModel:
+        return _FakeStructuredModel(self, schema)
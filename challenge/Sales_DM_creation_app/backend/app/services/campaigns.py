@@ -0,0 +1,470 @@
+"""
+キャンペーン（多数のターゲットへの一括生成）の作成・実行
+
+1. researching: ターゲットごとにリサーチ（検索）だけを実行する（priority="batch" で interactive の枠を奪わない）
+2. analyzing:   リサーチが済んだ全ターゲットのフック抽出をまとめてバッチ推論に投入し、完了をポーリングする
+3. writing:     全ターゲット×トーンの執筆をまとめて投入し、結果を DMDraft に組み立てて DMGeneration として保存する
+
+途中経過はターゲットの行（dm_campaign_targets）に保存するので、ワーカーが再起動しても
+起動時の resume_campaigns で続きから再開する（投入済みの Batch は投入し直さずにポーリングする）。
+同じキャンペーンを複数のワーカーが実行しないよう、共有ストアのリースを持っている間だけ実行する。
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import BATCH_DURATION, BATCH_REQUESTS, CAMPAIGNS_IN_PROGRESS
+from app.core.security import ExternalServiceError, NotFoundError, ValidationError
+from app.core.shared_state import shared_store
+from app.db.base import SessionLocal
+from app.models.dm import DMCampaign, DMCampaignTarget
+from app.schemas.dm import DMDraft, EvidenceItem, HookItem
+from app.services.ai.agents import analyzer_batch_request, copywriter_batch_request, parse_hooks, research_async
+from app.services.ai.batch import BatchRequest, BatchResult, BatchStatus, get_batch_provider
+from app.services.generations import save_generation
+
+TERMINAL_STATUSES = ("completed", "failed")
+# フェーズ: (キャンペーンの status, 対象のターゲットの status, 成功したターゲットの status)
+_PHASES = {
+    "analyzer": ("analyzing", "researched", "analyzed"),
+    "copywriter": ("writing", "analyzed", "completed"),
+}
+
+_TARGET_COLUMNS = (
+    DMCampaignTarget.position,
+    DMCampaignTarget.target_url,
+    DMCampaignTarget.target_role,
+    DMCampaignTarget.company_name,
+    DMCampaignTarget.status,
+    DMCampaignTarget.generation_id,
+    DMCampaignTarget.error,
+)
+
+
+# ---- 作成・参照 ----
+def create_campaign(
+    db: Session,
+    name: Optional[str],
+    product_name: str,
+    product_summary: str,
+    preferred_tones: Optional[List[str]],
+    targets: List[dict],
+) -> DMCampaign:
+    if len(targets) > settings.campaign_max_targets:
+        raise ValidationError(f"Too many targets: {len(targets)} (max {settings.campaign_max_targets})")
+    campaign = DMCampaign(
+        name=name,
+        status="pending",
+        product_name=product_name,
+        product_summary=product_summary,
+        preferred_tones=preferred_tones or ["polite", "casual", "problem_solver"],
+        batch_ids={},
+    )
+    db.add(campaign)
+    db.flush()
+    db.add_all([
+        DMCampaignTarget(
+            campaign_id=campaign.id,
+            position=i,
+            target_url=t["target_url"],
+            target_role=t.get("target_role"),
+            company_name=t.get("company_name"),
+            status="pending",
+        )
+        for i, t in enumerate(targets)
+    ])
+    db.commit()
+    db.refresh(campaign)
+    return campaign
+
+
+def get_campaign(db: Session, campaign_id: int) -> DMCampaign:
+    campaign = db.get(DMCampaign, campaign_id)
+    if campaign is None:
+        raise NotFoundError(f"Campaign not found: {campaign_id}")
+    return campaign
+
+
+def target_counts(db: Session, campaign_id: int) -> Dict[str, int]:
+    """ターゲットのステータスごとの件数"""
+    rows = db.execute(
+        select(DMCampaignTarget.status, func.count())
+        .where(DMCampaignTarget.campaign_id == campaign_id)
+        .group_by(DMCampaignTarget.status)
+    )
+    return {status: count for status, count in rows}
+
+
+def list_targets(db: Session, campaign_id: int) -> List[dict]:
+    """ターゲットの一覧（途中経過の evidences / hooks は読まない）"""
+    rows = db.execute(
+        select(*_TARGET_COLUMNS)
+        .where(DMCampaignTarget.campaign_id == campaign_id)
+        .order_by(DMCampaignTarget.position)
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+# ---- 実行中のキャンペーン（このワーカーで実行しているもの） ----
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def start_campaign(campaign_id: int) -> None:
+    """このワーカーでキャンペーンの実行を始める（実行中なら何もしない）"""
+    task = _tasks.get(campaign_id)
+    if task is not None and not task.done():
+        return
+    task = asyncio.create_task(run_campaign(campaign_id))
+    _tasks[campaign_id] = task
+    task.add_done_callback(lambda t: _tasks.pop(campaign_id, None) if _tasks.get(campaign_id) is t else None)
+
+
+def _unfinished_campaign_ids() -> List[int]:
+    with SessionLocal() as db:
+        return list(db.execute(
+            select(DMCampaign.id).where(DMCampaign.status.not_in(TERMINAL_STATUSES)).order_by(DMCampaign.id)
+        ).scalars())
+
+
+async def resume_campaigns() -> None:
+    """起動時に、終わっていないキャンペーンを再開する（他のワーカーがリースを持っていれば何もしない）"""
+    for campaign_id in await asyncio.to_thread(_unfinished_campaign_ids):
+        start_campaign(campaign_id)
+
+
+async def stop_campaigns() -> None:
+    """シャットダウン時に実行中のキャンペーンを止める（途中経過は残るので次の起動で再開する）"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _keep_lease(key: str, token: str, task: asyncio.Task) -> None:
+    """リースを更新し続ける（他のワーカーに奪われたら実行を止める）"""
+    while True:
+        await asyncio.sleep(settings.campaign_lease_seconds / 3)
+        renewed = await asyncio.to_thread(shared_store.acquire_lease, key, token, settings.campaign_lease_seconds)
+        if not renewed:
+            task.cancel()
+            return
+
+
+async def run_campaign(campaign_id: int) -> None:
+    key = f"campaign:{campaign_id}"
+    token = uuid.uuid4().hex
+    if not await asyncio.to_thread(shared_store.acquire_lease, key, token, settings.campaign_lease_seconds):
+        return
+    keeper = asyncio.create_task(_keep_lease(key, token, asyncio.current_task()))
+    CAMPAIGNS_IN_PROGRESS.inc()
+    try:
+        if await asyncio.to_thread(_campaign_status, campaign_id) in TERMINAL_STATUSES:
+            return
+        await _research(campaign_id)
+        for phase in _PHASES:
+            await _batch_phase(campaign_id, phase)
+        await asyncio.to_thread(_finish, campaign_id, "completed", None)
+    except asyncio.CancelledError:
+        # シャットダウン・リースの喪失。状態はそのまま残し、次に実行するワーカーが続きから再開する
+        raise
+    except Exception as e:
+        print(f"Campaign failed: {campaign_id}, error: {e}")
+        await asyncio.to_thread(_finish, campaign_id, "failed", str(e))
+    finally:
+        keeper.cancel()
+        CAMPAIGNS_IN_PROGRESS.dec()
+        await asyncio.to_thread(shared_store.release_lease, key, token)
+
+
+# ---- DB 操作（ワーカースレッドから呼ぶ） ----
+def _campaign_status(campaign_id: int) -> Optional[str]:
+    with SessionLocal() as db:
+        return db.execute(select(DMCampaign.status).where(DMCampaign.id == campaign_id)).scalar_one_or_none()
+
+
+def _set_status(campaign_id: int, status: str) -> None:
+    with SessionLocal() as db:
+        get_campaign(db, campaign_id).status = status
+        db.commit()
+
+
+def _finish(campaign_id: int, status: str, error: Optional[str]) -> None:
+    with SessionLocal() as db:
+        campaign = get_campaign(db, campaign_id)
+        campaign.status = status
+        campaign.error = error
+        campaign.completed_at = func.now()
+        db.commit()
+
+
+def _update_target(campaign_id: int, position: int, **values) -> None:
+    with SessionLocal() as db:
+        target = db.get(DMCampaignTarget, (campaign_id, position))
+        for name, value in values.items():
+            setattr(target, name, value)
+        db.commit()
+
+
+def _pending_research(campaign_id: int) -> Tuple[DMCampaign, List[Tuple[int, str, Optional[str], Optional[str]]]]:
+    with SessionLocal() as db:
+        campaign = get_campaign(db, campaign_id)
+        db.expunge(campaign)
+        rows = db.execute(
+            select(
+                DMCampaignTarget.position,
+                DMCampaignTarget.target_url,
+                DMCampaignTarget.target_role,
+                DMCampaignTarget.company_name,
+            )
+            .where(DMCampaignTarget.campaign_id == campaign_id, DMCampaignTarget.status == "pending")
+            .order_by(DMCampaignTarget.position)
+        ).all()
+        return campaign, [tuple(row) for row in rows]
+
+
+def _fail(target: DMCampaignTarget, error: str) -> None:
+    target.status = "failed"
+    target.error = error
+
+
+# ---- 1. リサーチ ----
+async def _research(campaign_id: int) -> None:
+    campaign, pending = await asyncio.to_thread(_pending_research, campaign_id)
+    if not pending:
+        return
+    await asyncio.to_thread(_set_status, campaign_id, "researching")
+    semaphore = asyncio.Semaphore(max(1, settings.campaign_research_concurrency))
+
+    async def _one(position: int, target_url: str, target_role: Optional[str], company_name: Optional[str]):
+        async with semaphore:
+            try:
+                evidences = await research_async(
+                    target_url=target_url,
+                    target_role=target_role,
+                    company_name=company_name,
+                    your_product_name=campaign.product_name,
+                    your_product_summary=campaign.product_summary,
+                    priority="batch",
+                    client_id=f"campaign:{campaign_id}",
+                )
+            except Exception as e:
+                await asyncio.to_thread(
+                    _update_target, campaign_id, position, status="failed", error=f"Research failed: {e}"
+                )
+                return
+            if not evidences:
+                await asyncio.to_thread(
+                    _update_target, campaign_id, position, status="failed", error="No relevant evidence found"
+                )
+                return
+            await asyncio.to_thread(
+                _update_target, campaign_id, position, status="researched", evidences=evidences
+            )
+
+    await asyncio.gather(*(_one(*target) for target in pending))
+
+
+# ---- 2・3. バッチ推論（フック抽出・執筆） ----
+def _build_requests(campaign: DMCampaign, phase: str, targets: List[DMCampaignTarget]) -> List[BatchRequest]:
+    requests: List[BatchRequest] = []
+    for target in targets:
+        evidences = [EvidenceItem(**e) for e in target.evidences or []]
+        if phase == "analyzer":
+            requests.append(analyzer_batch_request(f"analyzer:{target.position}", evidences))
+            continue
+        state = {
+            "target_url": target.target_url,
+            "target_role": target.target_role,
+            "company_name": target.company_name,
+            "your_product_name": campaign.product_name,
+            "your_product_summary": campaign.product_summary,
+            "evidences": evidences,
+            "hooks": [HookItem(**h) for h in target.hooks or []],
+        }
+        for tone in campaign.preferred_tones:
+            requests.append(copywriter_batch_request(f"copywriter:{target.position}:{tone}", state, tone))
+    return requests
+
+
+def _phase_targets(db: Session, campaign_id: int, status: str) -> List[DMCampaignTarget]:
+    return list(db.execute(
+        select(DMCampaignTarget)
+        .where(DMCampaignTarget.campaign_id == campaign_id, DMCampaignTarget.status == status)
+        .order_by(DMCampaignTarget.position)
+    ).scalars())
+
+
+def _prepare_phase(campaign_id: int, phase: str) -> Tuple[List[str], List[BatchRequest]]:
+    """
+    投入済みの batch_id（再開時）と、フェーズの全リクエストを返す
+
+    リクエストは batch_max_requests 件ずつ順に投入するので、投入済みの batch_id の数だけ先頭のチャンクは投入済み。
+    対象のターゲットが残っていなければ ([], [])
+    """
+    campaign_status, source, _ = _PHASES[phase]
+    with SessionLocal() as db:
+        campaign = get_campaign(db, campaign_id)
+        targets = _phase_targets(db, campaign_id, source)
+        if not targets:
+            return [], []
+        submitted = list((campaign.batch_ids or {}).get(phase) or [])
+        requests = _build_requests(campaign, phase, targets)
+        campaign.status = campaign_status
+        db.commit()
+        return submitted, requests
+
+
+def _save_batch_ids(campaign_id: int, phase: str, batch_ids: List[str]) -> None:
+    with SessionLocal() as db:
+        campaign = get_campaign(db, campaign_id)
+        # JSON カラムは中身の変更を検知しないので新しい dict を代入する
+        campaign.batch_ids = {**(campaign.batch_ids or {}), phase: batch_ids}
+        db.commit()
+
+
+def _apply_analyzer(targets: Dict[int, DMCampaignTarget], results: List[BatchResult]) -> None:
+    for result in results:
+        target = targets.get(int(result.custom_id.split(":")[1]))
+        if target is None:
+            continue
+        if result.error:
+            BATCH_REQUESTS.inc(phase="analyzer", result="error")
+            _fail(target, f"Hook extraction failed: {result.error}")
+            continue
+        try:
+            hooks = parse_hooks(result.content)
+        except Exception as e:
+            BATCH_REQUESTS.inc(phase="analyzer", result="error")
+            _fail(target, f"Hook extraction failed: {e}")
+            continue
+        BATCH_REQUESTS.inc(phase="analyzer", result="success")
+        target.hooks = [h.model_dump() for h in hooks]
+        target.status = "analyzed"
+
+
+def _apply_copywriter(
+    db: Session,
+    campaign: DMCampaign,
+    targets: Dict[int, DMCampaignTarget],
+    results: List[BatchResult],
+) -> None:
+    drafts: Dict[int, Dict[str, dict]] = defaultdict(dict)
+    errors: Dict[int, List[str]] = defaultdict(list)
+    for result in results:
+        _, position, tone = result.custom_id.split(":")
+        position = int(position)
+        if position not in targets:
+            continue
+        try:
+            if result.error:
+                raise ValueError(result.error)
+            draft = DMDraft(**result.content)
+            draft.tone = tone  # 念のため上書き
+            drafts[position][tone] = draft.model_dump()
+            BATCH_REQUESTS.inc(phase="copywriter", result="success")
+        except Exception as e:
+            BATCH_REQUESTS.inc(phase="copywriter", result="error")
+            errors[position].append(f"{tone}: {e}")
+
+    for position, target in targets.items():
+        if errors.get(position):
+            _fail(target, "DM generation failed for " + "; ".join(errors[position]))
+            continue
+        if any(tone not in drafts[position] for tone in campaign.preferred_tones):
+            continue
+        generation = save_generation(
+            db,
+            target_url=target.target_url,
+            target_role=target.target_role,
+            company_name=target.company_name,
+            product_name=campaign.product_name,
+            product_summary=campaign.product_summary,
+            result={
+                "evidences": target.evidences,
+                "hooks": target.hooks,
+                "drafts": [drafts[position][tone] for tone in campaign.preferred_tones],
+            },
+        )
+        # 生成結果として保存したので途中経過は消す
+        target.generation_id = generation.id
+        target.status = "completed"
+        target.evidences = None
+        target.hooks = None
+
+
+def _apply_results(campaign_id: int, phase: str, results: List[BatchResult], batch_error: Optional[str]) -> None:
+    """結果をターゲットに反映する（結果がなかったターゲットは失敗にする）"""
+    _, source, _ = _PHASES[phase]
+    # save_generation がターゲットごとにコミットするので、読み込んだ行を毎回読み直さないようにする
+    with SessionLocal(expire_on_commit=False) as db:
+        campaign = get_campaign(db, campaign_id)
+        targets = {t.position: t for t in _phase_targets(db, campaign_id, source)}
+        if phase == "analyzer":
+            _apply_analyzer(targets, results)
+        else:
+            _apply_copywriter(db, campaign, targets, results)
+        for target in targets.values():
+            if target.status == source:
+                _fail(target, batch_error or "No result returned by the batch")
+        db.commit()
+
+
+def _status_error(status: BatchStatus) -> Optional[str]:
+    if status.status == "completed":
+        return None
+    reason = f"Batch {status.batch_id} {status.status}"
+    return f"{reason}: {'; '.join(status.errors)}" if status.errors else reason
+
+
+async def _batch_phase(campaign_id: int, phase: str) -> None:
+    batch_ids, requests = await asyncio.to_thread(_prepare_phase, campaign_id, phase)
+    provider = get_batch_provider()
+    # 投入したらすぐに batch_id を保存する（途中で落ちても、再開時は残りのチャンクだけを投入する）
+    chunk = settings.batch_max_requests
+    for start in range(len(batch_ids) * chunk, len(requests), chunk):
+        batch_ids.append(await asyncio.to_thread(
+            provider.submit,
+            requests[start:start + chunk],
+            {"campaign_id": str(campaign_id), "phase": phase},
+        ))
+        await asyncio.to_thread(_save_batch_ids, campaign_id, phase, list(batch_ids))
+    if not batch_ids:
+        return
+
+    started = time.monotonic()
+    statuses: Dict[str, BatchStatus] = {}
+    failures: Dict[str, int] = defaultdict(int)
+    while True:
+        for batch_id in batch_ids:
+            if batch_id in statuses and statuses[batch_id].done:
+                continue
+            try:
+                statuses[batch_id] = await asyncio.to_thread(provider.status, batch_id)
+                failures[batch_id] = 0
+            except Exception as e:
+                # 一時的な障害で Batch を諦めない（次のポーリングで再試行する）。続けて失敗し続けたらフェーズを失敗にする
+                failures[batch_id] += 1
+                print(
+                    f"Batch status check failed ({failures[batch_id]}/{settings.batch_status_max_failures}): "
+                    f"{batch_id}, error: {e}"
+                )
+                if failures[batch_id] >= settings.batch_status_max_failures:
+                    raise ExternalServiceError(
+                        f"Batch {batch_id} status check failed {failures[batch_id]} times in a row: {e}"
+                    )
+        if len(statuses) == len(batch_ids) and all(s.done for s in statuses.values()):
+            break
+        await asyncio.sleep(settings.batch_poll_interval_seconds)
+    BATCH_DURATION.observe(time.monotonic() - started, phase=phase)
+
+    results: List[BatchResult] = []
+    for batch_id in batch_ids:
+        results.extend(await asyncio.to_thread(lambda: list(provider.results(batch_id))))
+    errors = [e for e in (_status_error(s) for s in statuses.values()) if e]
+    await asyncio.to_thread(_apply_results, campaign_id, phase, results, "; ".join(errors) or None)
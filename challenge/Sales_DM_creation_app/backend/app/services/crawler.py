@@ -0,0 +1,548 @@
+"""
+ターゲット企業のサイトを直接読むリサーチソース
+
+company_name がない場合、Tavily の site: 検索（advanced で1往復数秒）を何度も呼ぶ代わりに、
+ターゲットのトップページと、そこからリンクされたニュース・プレスリリース・採用ページを直接取得する。
+
+- httpx.AsyncClient を1つだけ作り、専用のイベントループ（バックグラウンドスレッド）で使い回す（接続プール）。
+  グラフのノードはワーカースレッドで同期的に動くので、crawl() はこのループにコルーチンを投げて結果を待つ
+- 同じホストへの同時リクエスト数とリクエスト間隔の下限を守り、robots.txt も尊重する
+- target_url はクライアントが指定するので、http / https の 80 / 443 番ポートで、名前解決した IP が
+  グローバルアドレスの場合だけ取得する（SSRF 対策）。接続先は検証した IP に固定し、リダイレクトもホップごとに検証する
+- HTML は受信しながら HTMLParser に流し込み、見出し（h1〜h3）ごとのセクションに分けてテキストを取り出す。
+  文字コードは Content-Type の charset、なければ先頭の <meta charset> / <meta http-equiv> で判定する（Shift_JIS / EUC-JP のサイト向け）
+- 結果は検索結果と同じ形（title / url / content）で返すので、検索結果と同じフィルタ・スコアリングを通る
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+import asyncio
+import codecs
+import ipaddress
+import re
+import socket
+import threading
+import time
+
+from app.core.config import settings
+from app.core.metrics import CRAWLER_PAGES
+
+# サブページの種類と、リンクのパス・アンカーテキストで探すキーワード
+_CATEGORIES: Dict[str, Tuple[str, ...]] = {
+    "news": ("news", "topics", "information", "お知らせ", "ニュース", "新着"),
+    "press": ("press", "release", "releases", "newsroom", "プレスリリース", "報道"),
+    "careers": ("careers", "career", "recruit", "recruitment", "jobs", "採用", "求人"),
+}
+# トップページにリンクが見つからなかった場合に試すパス
+_FALLBACK_PATHS = {"news": "/news", "press": "/press", "careers": "/careers"}
+
+# 本文として読まないタグ（リンクは読む）
+_SKIP_TAGS = {"script", "style", "noscript", "svg", "template", "nav", "header", "footer", "form"}
+_HEADING_TAGS = {"h1", "h2", "h3"}
+# テキストの区切りになるタグ（前後の単語がつながらないよう空白を入れる）
+_BLOCK_TAGS = {"p", "div", "li", "br", "section", "article", "td", "dd", "dt", "h4", "h5", "h6", "time"}
+
+_MIN_SECTION_CHARS = 40
+_MAX_ITEMS_PER_PAGE = 5
+_MAX_CONTENT_CHARS = 2000
+_ROBOTS_TTL_SECONDS = 3600
+_MAX_TRACKED_HOSTS = 1024
+_MAX_REDIRECTS = 3
+_ALLOWED_PORTS = (80, 443)
+# <meta charset> を探す範囲（HTML の仕様では先頭 1024 バイト以内に書く）
+_SNIFF_BYTES = 1024
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_:.\-]+)""", re.IGNORECASE)
+# Shift_JIS を名乗るページの多くは Windows の拡張文字（①・髙 など）を含むので、上位互換の cp932 で読む
+_CHARSET_ALIASES = {"shift_jis": "cp932", "x-sjis": "cp932", "windows-31j": "cp932"}
+
+
+def crawler_enabled() -> bool:
+    """settings.crawler_enabled が未設定なら、検索がスタンドイン（オフライン）のときは無効"""
+    if settings.crawler_enabled is not None:
+        return settings.crawler_enabled
+    return settings.search_provider != "fake"
+
+
+class UnsafeURLError(ValueError):
+    """取得してはいけない URL（許可していないスキーム・ポート、内部ネットワークのアドレス）"""
+
+
+# ---- 接続先の検証 ----
+def _allowlisted(host: str) -> bool:
+    """settings.crawler_allowed_hosts（ホスト名・IP・CIDR）に含まれるか"""
+    host = host.lower()
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        ip = None
+    for entry in settings.crawler_allowed_hosts:
+        if entry.lower() == host:
+            return True
+        if ip is not None:
+            try:
+                if ip in ipaddress.ip_network(entry, strict=False):
+                    return True
+            except ValueError:
+                continue
+    return False
+
+
+def _is_public(ip: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+    """グローバルユニキャストアドレスか（プライベート・ループバック・リンクローカル・予約済み・マルチキャストは除く）"""
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not (ip.is_multicast or ip.is_reserved or ip.is_link_local or ip.is_loopback)
+
+
+async def resolve_safe(url: str) -> str:
+    """
+    URL を検証して接続先の IP を返す（取得してはいけない URL なら UnsafeURLError）
+
+    名前解決した IP がすべてグローバルアドレスで、ポートが 80 / 443 の場合だけ許可する。
+    crawler_allowed_hosts に含まれるホスト（またはすべての IP が含まれる場合）はこの制限を受けない。
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise UnsafeURLError(f"Unsupported scheme: {parts.scheme}")
+    if parts.username is not None or parts.password is not None:
+        raise UnsafeURLError("Credentials in URL are not allowed")
+    host = parts.hostname
+    if not host:
+        raise UnsafeURLError("Missing host")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeURLError("Invalid port")
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise UnsafeURLError(f"Cannot resolve {host}: {e}")
+    ips = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not ips:
+        raise UnsafeURLError(f"Cannot resolve {host}")
+
+    if _allowlisted(host) or all(_allowlisted(str(ip)) for ip in ips):
+        return str(ips[0])
+    if port not in _ALLOWED_PORTS:
+        raise UnsafeURLError(f"Port {port} is not allowed")
+    blocked = [str(ip) for ip in ips if not _is_public(ip)]
+    if blocked:
+        raise UnsafeURLError(f"{host} resolves to a non-public address: {', '.join(blocked)}")
+    return str(ips[0])
+
+
+def _pinned_url(url: str, ip: str) -> str:
+    """ホストを検証済みの IP に置き換えた URL（接続時の名前解決で別の IP に向けられないようにする）"""
+    parts = urlsplit(url)
+    host = f"[{ip}]" if ":" in ip else ip
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    return urlunsplit((parts.scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def _host_header(url: str) -> str:
+    parts = urlsplit(url)
+    host = f"[{parts.hostname}]" if ":" in (parts.hostname or "") else parts.hostname
+    return f"{host}:{parts.port}" if parts.port else host
+
+
+# ---- HTML の解析 ----
+def _codec(charset: Optional[str]) -> Optional[str]:
+    """charset 名を Python のコーデック名にする（不明なら None）"""
+    if not charset:
+        return None
+    charset = charset.strip().lower()
+    try:
+        return codecs.lookup(_CHARSET_ALIASES.get(charset, charset)).name
+    except LookupError:
+        return None
+
+
+def _sniff_charset(head: bytes) -> Optional[str]:
+    """HTML の先頭の <meta charset="..."> / <meta http-equiv="Content-Type" content="...; charset=..."> から文字コードを取り出す"""
+    match = _META_CHARSET.search(head[:_SNIFF_BYTES])
+    return _codec(match.group(1).decode("ascii")) if match else None
+
+
+class _PageParser(HTMLParser):
+    """タイトル・メタディスクリプション・見出しごとのテキスト・リンクを取り出す（feed は分割して呼べる）"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.description = ""
+        self.sections: List[Tuple[str, Optional[str], str]] = []  # (見出し, id, テキスト)
+        self.links: List[Tuple[str, str]] = []  # (href, アンカーテキスト)
+        self._skip_depth = 0
+        self._in_title = False
+        self._heading: Optional[List[str]] = None
+        self._heading_id: Optional[str] = None
+        self._link: Optional[Tuple[str, List[str]]] = None
+        self._section: Tuple[str, Optional[str]] = ("", None)
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "a" and attrs.get("href"):
+            self._link = (attrs["href"], [])
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            name = (attrs.get("name") or attrs.get("property") or "").lower()
+            if name in ("description", "og:description") and not self.description:
+                self.description = _clean(attrs.get("content") or "")
+        elif tag in _HEADING_TAGS and not self._skip_depth:
+            self._heading = []
+            self._heading_id = attrs.get("id")
+        elif tag in _BLOCK_TAGS:
+            self._text.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._link is not None:
+            self.links.append((self._link[0], _clean("".join(self._link[1]))))
+            self._link = None
+            self._text.append(" ")
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _HEADING_TAGS and self._heading is not None:
+            self._flush()
+            self._section = (_clean("".join(self._heading)), self._heading_id)
+            self._heading = None
+        elif tag in _BLOCK_TAGS:
+            self._text.append(" ")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._link is not None:
+            self._link[1].append(data)
+        if self._skip_depth:
+            return
+        if self._heading is not None:
+            self._heading.append(data)
+        else:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        self.title = _clean(self.title)
+
+    def _flush(self):
+        text = _clean("".join(self._text))
+        if text:
+            self.sections.append((*self._section, text))
+        self._text = []
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+# ---- サブページの選択 ----
+def _site(host: str) -> str:
+    host = host.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _same_site(url: str, base: str) -> bool:
+    return _site(urlsplit(url).netloc) == _site(urlsplit(base).netloc)
+
+
+def _without_fragment(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path or "/", parts.query, ""))
+
+
+def _matches(keywords: Tuple[str, ...], path: str, text: str) -> bool:
+    tokens = set(re.split(r"[/\-_.]+", path.lower())) | set(re.findall(r"[a-z]+", text.lower()))
+    return any(k in tokens if k.isascii() else k in text for k in keywords)
+
+
+def pick_subpages(base_url: str, links: List[Tuple[str, str]], limit: int) -> List[str]:
+    """トップページのリンクから、ニュース・プレスリリース・採用ページを種類ごとに1つずつ選ぶ"""
+    home = _without_fragment(base_url)
+    candidates = []
+    for href, text in links:
+        url = _without_fragment(urljoin(base_url, href))
+        if urlsplit(url).scheme in ("http", "https") and _same_site(url, base_url) and url != home:
+            candidates.append((url, urlsplit(url).path, text))
+
+    picked: List[str] = []
+    for category, keywords in _CATEGORIES.items():
+        url = next((u for u, path, text in candidates if u not in picked and _matches(keywords, path, text)), None)
+        if url is None:
+            url = _without_fragment(urljoin(base_url, _FALLBACK_PATHS[category]))
+        if url not in picked and url != home:
+            picked.append(url)
+    return picked[:limit]
+
+
+@dataclass
+class Page:
+    url: str
+    title: str
+    description: str
+    sections: List[Tuple[str, Optional[str], str]] = field(default_factory=list)
+    links: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def page_items(page: Page) -> List[dict]:
+    """ページを検索結果と同じ形の dict にする（見出しごとに1件。URL はセクションのアンカー付き）"""
+    items = []
+    for i, (heading, anchor, text) in enumerate(page.sections):
+        if len(text) < _MIN_SECTION_CHARS:
+            continue
+        items.append({
+            "title": heading or page.title or page.url,
+            # 同じページの別のセクションが URL での重複排除で落ちないよう、アンカーを付ける
+            "url": f"{page.url}#{anchor or f'section-{i}'}",
+            "content": text[:_MAX_CONTENT_CHARS],
+            "source": "company_site",
+        })
+        if len(items) >= _MAX_ITEMS_PER_PAGE:
+            break
+    if not items and page.description:
+        items.append({
+            "title": page.title or page.url,
+            "url": page.url,
+            "content": page.description,
+            "source": "company_site",
+        })
+    return items
+
+
+# ---- クローラー ----
+class _HostLimiter:
+    """ホストごとの同時リクエスト数とリクエスト開始間隔の下限"""
+
+    def __init__(self, concurrency: int, interval: float):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._interval = interval
+        self._next_at = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self._semaphore:
+            # ループは1スレッドなので、ここまでの間に他のタスクが割り込むことはない
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self._interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield
+
+
+class SiteCrawler:
+    """ターゲットのサイトを読むクローラー（プロセスで1つ。専用のイベントループで動く）"""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="site-crawler", daemon=True)
+        self._thread.start()
+        self._client = asyncio.run_coroutine_threadsafe(self._create_client(), self._loop).result()
+        self._hosts: "OrderedDict[str, _HostLimiter]" = OrderedDict()
+        self._robots: Dict[str, Tuple[float, Optional[RobotFileParser]]] = {}
+
+    async def _create_client(self):
+        import httpx
+
+        return httpx.AsyncClient(
+            timeout=settings.crawler_request_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.crawler_max_connections,
+                max_keepalive_connections=settings.crawler_max_connections,
+            ),
+            headers={"User-Agent": settings.crawler_user_agent, "Accept": "text/html,application/xhtml+xml"},
+        )
+
+    def crawl(self, target_url: str, timeout: Optional[float] = None) -> List[dict]:
+        """ターゲットのサイトを読み、検索結果と同じ形の dict のリストを返す（ワーカースレッドから呼ぶ）"""
+        future = asyncio.run_coroutine_threadsafe(self._crawl(target_url), self._loop)
+        try:
+            return future.result(settings.crawler_timeout_seconds if timeout is None else timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _crawl(self, target_url: str) -> List[dict]:
+        home = await self._fetch(target_url)
+        if home is None:
+            return []
+        subpages = pick_subpages(home.url, home.links, settings.crawler_max_subpages)
+        pages = [home] + [p for p in await asyncio.gather(*(self._fetch(url) for url in subpages)) if p]
+
+        items: List[dict] = []
+        seen = set()
+        for page in pages:
+            if page.url in seen:
+                continue  # リダイレクトで同じページに着いた
+            seen.add(page.url)
+            items.extend(page_items(page))
+        return items
+
+    def _limiter(self, host: str) -> _HostLimiter:
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = _HostLimiter(settings.crawler_per_host_concurrency, settings.crawler_per_host_interval_seconds)
+            self._hosts[host] = limiter
+            if len(self._hosts) > _MAX_TRACKED_HOSTS:
+                self._hosts.popitem(last=False)
+        self._hosts.move_to_end(host)
+        return limiter
+
+    async def _allowed(self, url: str) -> bool:
+        if not settings.crawler_respect_robots:
+            return True
+        parts = urlsplit(url)
+        expires, robots = self._robots.get(parts.netloc, (0.0, None))
+        if expires < time.monotonic():
+            robots = await self._fetch_robots(f"{parts.scheme}://{parts.netloc}/robots.txt")
+            self._robots[parts.netloc] = (time.monotonic() + _ROBOTS_TTL_SECONDS, robots)
+        return robots is None or robots.can_fetch(settings.crawler_user_agent, url)
+
+    async def _fetch_robots(self, url: str) -> Optional[RobotFileParser]:
+        """robots.txt（取得できなければ None = 制限なし）"""
+        try:
+            async with self._open(url, check_robots=False) as (_, response):
+                if response is None or response.status_code != 200:
+                    return None
+                text = (await response.aread()).decode(response.encoding or "utf-8", errors="replace")
+        except Exception:
+            return None
+        robots = RobotFileParser()
+        robots.parse(text.splitlines())
+        return robots
+
+    @asynccontextmanager
+    async def _open(self, url: str, check_robots: bool = True) -> AsyncIterator[Tuple[Optional[str], object]]:
+        """
+        URL を開き、(最終的な URL, ストリーミングのレスポンス) を返す（たどれなければ (None, None)）
+
+        ホップごとに接続先を検証して IP に固定し、ホストの枠（同時リクエスト数・間隔）も取り直す。
+        リダイレクトは同じサイトの中だけたどり、リダイレクト先も robots.txt で確認する
+        """
+        for hop in range(_MAX_REDIRECTS + 1):
+            if hop and check_robots and not await self._allowed(url):
+                break
+            ip = await resolve_safe(url)
+            hostname = urlsplit(url).hostname or ""
+            request = self._client.build_request(
+                "GET",
+                _pinned_url(url, ip),
+                headers={"Host": _host_header(url)},
+                # TLS の SNI・証明書の検証は元のホスト名で行う
+                extensions={} if _is_ip(hostname) else {"sni_hostname": hostname},
+            )
+            async with self._limiter(urlsplit(url).netloc).slot():
+                response = await self._client.send(request, stream=True)
+                try:
+                    if response.is_redirect:
+                        next_url = _without_fragment(urljoin(url, response.headers.get("location", "")))
+                        if not _same_site(next_url, url):
+                            break
+                        url = next_url
+                        continue
+                    yield url, response
+                    return
+                finally:
+                    await response.aclose()
+        yield None, None
+
+    async def _fetch(self, url: str) -> Optional[Page]:
+        if not await self._allowed(url):
+            CRAWLER_PAGES.inc(result="disallowed")
+            return None
+        parser = _PageParser()
+        try:
+            final_url = await self._receive(url, parser)
+        except asyncio.CancelledError:
+            raise
+        except UnsafeURLError as e:
+            CRAWLER_PAGES.inc(result="blocked")
+            print(f"Crawl blocked: {url}, reason: {e}")
+            return None
+        except Exception as e:
+            CRAWLER_PAGES.inc(result="error")
+            print(f"Crawl failed: {url}, error: {e}")
+            return None
+        if final_url is None:
+            CRAWLER_PAGES.inc(result="skipped")
+            return None
+        parser.close()
+        CRAWLER_PAGES.inc(result="success")
+        return Page(
+            url=final_url,
+            title=parser.title,
+            description=parser.description,
+            sections=parser.sections,
+            links=parser.links,
+        )
+
+    async def _receive(self, url: str, parser: _PageParser) -> Optional[str]:
+        """
+        ページを受信しながら解析し、最終的な URL を返す（HTML 以外・エラーなら None）
+
+        リダイレクトは同じサイトの中だけたどる（別サイトのページは取得しない）
+        """
+        async with self._open(url) as (final_url, response):
+            if response is None:
+                return None
+            if response.status_code != 200 or "html" not in response.headers.get("content-type", ""):
+                return None
+            # 受信したチャンクから順に解析し、大きすぎるページは途中で打ち切る
+            decoder = None
+            received = 0
+            async for chunk in response.aiter_bytes():
+                if decoder is None:
+                    # ヘッダーに charset がなければ、最初のチャンクの <meta> から判定する
+                    encoding = _codec(response.charset_encoding) or _sniff_charset(chunk) or "utf-8"
+                    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                parser.feed(decoder.decode(chunk))
+                received += len(chunk)
+                if received >= settings.crawler_max_page_bytes:
+                    break
+            return final_url
+
+
+_crawler: Optional[SiteCrawler] = None
+_crawler_lock = threading.Lock()
+
+
+def get_crawler() -> SiteCrawler:
+    """クローラー（プロセスで1つ）"""
+    global _crawler
+    with _crawler_lock:
+        if _crawler is None:
+            _crawler = SiteCrawler()
+        return _crawler
+
+
+def close_crawler() -> None:
+    """シャットダウン時に接続プールを閉じる（作っていなければ何もしない）"""
+    global _crawler
+    with _crawler_lock:
+        if _crawler is not None:
+            _crawler.close()
+            _crawler = None
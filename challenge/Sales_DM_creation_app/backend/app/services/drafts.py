@@ -0,0 +1,55 @@
+"""
+保存されたDMドラフト（DMDraft）の保存・読み込み
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.responses import content_hash
+from app.core.security import NotFoundError
+from app.models.dm import DMDraft
+
+
+def draft_content_hash(tone: str, title: str, body_markdown: str, edited_body: Optional[str]) -> str:
+    return content_hash([tone, title, body_markdown, edited_body])
+
+
+def create_draft(
+    db: Session,
+    generation_id: Optional[int],
+    tone: str,
+    title: str,
+    body_markdown: str,
+    edited_body: Optional[str],
+) -> DMDraft:
+    draft = DMDraft(
+        generation_id=generation_id,
+        tone=tone,
+        title=title,
+        body_markdown=body_markdown,
+        edited_body=edited_body,
+        content_hash=draft_content_hash(tone, title, body_markdown, edited_body),
+    )
+    db.add(draft)
+    db.commit()
+    db.refresh(draft)
+    return draft
+
+
+def get_draft(db: Session, draft_id: int) -> DMDraft:
+    draft = db.get(DMDraft, draft_id)
+    if draft is None:
+        raise NotFoundError(f"Draft not found: {draft_id}")
+    return draft
+
+
+def get_draft_version(db: Session, draft_id: int) -> Tuple[Optional[str], Optional[datetime]]:
+    """ETag 用の (content_hash, 最終更新日時)。本文は読まない"""
+    row = db.execute(
+        select(DMDraft.content_hash, DMDraft.updated_at, DMDraft.created_at).where(DMDraft.id == draft_id)
+    ).first()
+    if row is None:
+        raise NotFoundError(f"Draft not found: {draft_id}")
+    return row.content_hash, row.updated_at or row.created_at
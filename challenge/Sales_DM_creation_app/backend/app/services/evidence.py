@@ -0,0 +1,137 @@
+"""
+Evidence の正規化保存
+
+同じ記事（正規化したURL + スニペット）は evidence テーブルに1行だけ保存し、
+生成結果からは generation_evidences 経由で ID で参照する。
+"""
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.dm import DMGeneration, Evidence, GenerationEvidence
+
+# 同じ記事でも付いたり付かなかったりするトラッキング用クエリパラメータ
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+
+def canonicalize_url(url: str) -> str:
+    """スキーム・ホストの小文字化、フラグメント・トラッキングパラメータ・末尾スラッシュの除去"""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    ))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def evidence_hash(url: str, snippet: str) -> str:
+    """evidence の一意キー（正規化URL + 空白を詰めたスニペットの sha256）"""
+    normalized_snippet = " ".join(snippet.split())
+    payload = f"{canonicalize_url(url)}\n{normalized_snippet}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def upsert_evidences(db: Session, evidences: List[dict]) -> List[int]:
+    """
+    evidence を保存して、渡した順に evidence.id を返す（既存の行は再利用）
+
+    新しい evidence はまとめて1つのセーブポイントで挿入する。別ワーカーが同じ evidence を
+    同時に挿入して一意制約違反になった場合だけ、1件ずつ挿入し直す
+    """
+    hashes = [evidence_hash(e["url"], e["snippet"]) for e in evidences]
+    ids: Dict[str, int] = {}
+    if hashes:
+        rows = db.execute(
+            select(Evidence.content_hash, Evidence.id).where(Evidence.content_hash.in_(set(hashes)))
+        )
+        ids = {content_hash: evidence_id for content_hash, evidence_id in rows}
+
+    missing = {h: e for h, e in zip(hashes, evidences) if h not in ids}
+    if missing:
+        try:
+            new_rows = [_new_evidence(h, e) for h, e in missing.items()]
+            with db.begin_nested():
+                db.add_all(new_rows)
+            ids.update({row.content_hash: row.id for row in new_rows})
+        except IntegrityError:
+            for content_hash, e in missing.items():
+                ids[content_hash] = _insert_one(db, content_hash, e)
+
+    return [ids[h] for h in hashes]
+
+
+def _new_evidence(content_hash: str, e: dict) -> Evidence:
+    return Evidence(
+        content_hash=content_hash,
+        source=e.get("source", "web"),
+        title=e["title"],
+        snippet=e["snippet"],
+        url=e["url"],
+    )
+
+
+def _insert_one(db: Session, content_hash: str, e: dict) -> int:
+    existing = db.execute(select(Evidence.id).where(Evidence.content_hash == content_hash)).scalar()
+    if existing is not None:
+        return existing
+    evidence = _new_evidence(content_hash, e)
+    try:
+        with db.begin_nested():
+            db.add(evidence)
+        return evidence.id
+    except IntegrityError:
+        return db.execute(select(Evidence.id).where(Evidence.content_hash == content_hash)).scalar_one()
+
+
+def link_evidences(db: Session, generation_id: int, evidences: List[dict]) -> None:
+    """生成結果に evidence を順序付きで紐づける（commit は呼び出し元）"""
+    evidence_ids = upsert_evidences(db, evidences)
+    if evidence_ids:
+        db.execute(insert(GenerationEvidence), [
+            {"generation_id": generation_id, "position": position, "evidence_id": evidence_id}
+            for position, evidence_id in enumerate(evidence_ids)
+        ])
+
+
+def load_evidences(db: Session, generation: DMGeneration) -> List[dict]:
+    """生成結果の evidence を順序通りに返す（正規化前の行は JSON カラムから）"""
+    rows = db.execute(
+        select(Evidence)
+        .join(GenerationEvidence, GenerationEvidence.evidence_id == Evidence.id)
+        .where(GenerationEvidence.generation_id == generation.id)
+        .order_by(GenerationEvidence.position)
+    ).scalars().all()
+    if not rows:
+        return generation.evidences or []
+    return [_as_dict(e) for e in rows]
+
+
+def load_evidences_many(db: Session, generation_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """
+    複数の生成結果の evidence を1クエリでまとめて取得（エクスポート用）
+
+    ORM オブジェクトを作らずに列だけ読む。正規化前の行は含まれないので、呼び出し元で JSON カラムを使う
+    """
+    rows = db.execute(
+        select(
+            GenerationEvidence.generation_id, Evidence.source, Evidence.title, Evidence.snippet, Evidence.url
+        )
+        .join(Evidence, GenerationEvidence.evidence_id == Evidence.id)
+        .where(GenerationEvidence.generation_id.in_(list(generation_ids)))
+        .order_by(GenerationEvidence.generation_id, GenerationEvidence.position)
+    )
+    by_generation: Dict[int, List[dict]] = {}
+    for generation_id, source, title, snippet, url in rows:
+        by_generation.setdefault(generation_id, []).append(
+            {"source": source, "title": title, "snippet": snippet, "url": url}
+        )
+    return by_generation
+
+
+def _as_dict(e: Evidence) -> dict:
+    return {"source": e.source, "title": e.title, "snippet": e.snippet, "url": e.url}
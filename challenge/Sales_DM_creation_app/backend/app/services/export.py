@@ -0,0 +1,214 @@
+"""
+生成結果・ドラフトのエクスポート（CSV / JSONL をストリーミングで書き出す）
+
+- DMGeneration はサーバーサイドカーソル（yield_per）で export_batch_size 行ずつ読み、
+  evidence・保存済みドラフトはその単位でまとめて取得する（行ごとのクエリは発行しない）
+- ORM オブジェクトではなく列だけを読むので、セッションに行が溜まらない
+- 出力は export_chunk_bytes ごとにまとめて返し、gzip 指定時は zlib で逐次圧縮する
+
+行数に関係なく、メモリに載るのは1バッチ分の行と1チャンク分の出力だけ。
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.dm import DMDraft, DMGeneration
+from app.services.evidence import load_evidences_many
+
+ExportFormat = Literal["csv", "jsonl"]
+
+GENERATION_FIELDS = [
+    "generation_id", "created_at", "updated_at", "target_url", "target_role",
+    "company_name", "product_name", "product_summary", "evidences", "hooks", "drafts",
+]
+DRAFT_FIELDS = [
+    "generation_id", "created_at", "target_url", "target_role", "company_name",
+    "product_name", "tone", "title", "body_markdown", "edited_body",
+]
+
+_GENERATION_COLUMNS = (
+    DMGeneration.id,
+    DMGeneration.created_at,
+    DMGeneration.updated_at,
+    DMGeneration.target_url,
+    DMGeneration.target_role,
+    DMGeneration.company_name,
+    DMGeneration.product_name,
+    DMGeneration.product_summary,
+    DMGeneration.evidences,
+    DMGeneration.hooks,
+    DMGeneration.drafts,
+)
+
+
+@dataclass
+class ExportFilters:
+    since: Optional[datetime] = None  # created_at >= since
+    until: Optional[datetime] = None  # created_at < until
+    company_name: Optional[str] = None
+    product_name: Optional[str] = None
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """タイムゾーン付きの日時は UTC に揃える（保存値は UTC、タイムゾーンなしは UTC とみなす）"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _generation_batches(db: Session, filters: ExportFilters) -> Iterator[list]:
+    """フィルタに合う DMGeneration の行を id 順に export_batch_size 行ずつ返す"""
+    stmt = select(*_GENERATION_COLUMNS).order_by(DMGeneration.id)
+    if filters.since:
+        stmt = stmt.where(DMGeneration.created_at >= _utc_naive(filters.since))
+    if filters.until:
+        stmt = stmt.where(DMGeneration.created_at < _utc_naive(filters.until))
+    if filters.company_name:
+        stmt = stmt.where(DMGeneration.company_name == filters.company_name)
+    if filters.product_name:
+        stmt = stmt.where(DMGeneration.product_name == filters.product_name)
+    result = db.execute(stmt.execution_options(yield_per=settings.export_batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def _saved_drafts(db: Session, generation_ids: List[int]) -> Dict[Tuple[int, str], Optional[str]]:
+    """生成結果ごと・トーンごとに最後に保存されたドラフトの編集後の本文"""
+    rows = db.execute(
+        select(DMDraft.generation_id, DMDraft.tone, DMDraft.edited_body)
+        .where(DMDraft.generation_id.in_(generation_ids))
+        .order_by(DMDraft.id)
+    )
+    return {(generation_id, tone): edited_body for generation_id, tone, edited_body in rows}
+
+
+def iter_generations(filters: ExportFilters) -> Iterator[dict]:
+    """生成結果を1件ずつ返す（専用セッションで読むのでレスポンスのストリーミング中に使える）"""
+    db = SessionLocal()
+    try:
+        for batch in _generation_batches(db, filters):
+            evidences = load_evidences_many(db, [row.id for row in batch])
+            for row in batch:
+                yield {
+                    "generation_id": row.id,
+                    "created_at": _iso(row.created_at),
+                    "updated_at": _iso(row.updated_at),
+                    "target_url": row.target_url,
+                    "target_role": row.target_role,
+                    "company_name": row.company_name,
+                    "product_name": row.product_name,
+                    "product_summary": row.product_summary,
+                    # 正規化前の行は JSON カラムから
+                    "evidences": evidences.get(row.id) or row.evidences or [],
+                    "hooks": row.hooks or [],
+                    "drafts": row.drafts or [],
+                }
+    finally:
+        db.close()
+
+
+def iter_drafts(filters: ExportFilters) -> Iterator[dict]:
+    """生成されたドラフトを1通ずつ返す（ユーザーが編集して保存した本文があれば edited_body に入れる）"""
+    db = SessionLocal()
+    try:
+        for batch in _generation_batches(db, filters):
+            saved = _saved_drafts(db, [row.id for row in batch])
+            for row in batch:
+                for draft in row.drafts or []:
+                    yield {
+                        "generation_id": row.id,
+                        "created_at": _iso(row.created_at),
+                        "target_url": row.target_url,
+                        "target_role": row.target_role,
+                        "company_name": row.company_name,
+                        "product_name": row.product_name,
+                        "tone": draft.get("tone"),
+                        "title": draft.get("title"),
+                        "body_markdown": draft.get("body_markdown"),
+                        "edited_body": saved.get((row.id, draft.get("tone"))),
+                    }
+    finally:
+        db.close()
+
+
+def encode_jsonl(records: Iterable[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def encode_csv(records: Iterable[dict], fieldnames: List[str]) -> Iterator[str]:
+    """CSV に変換（リスト・辞書のセルは JSON 文字列にする）"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        writer.writerow({
+            k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+            for k, v in record.items()
+        })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def chunked(lines: Iterable[str], gzip: bool = False, chunk_bytes: Optional[int] = None) -> Iterator[bytes]:
+    """行を chunk_bytes ごとのバイト列にまとめる（gzip=True なら gzip 形式で逐次圧縮）"""
+    chunk_bytes = chunk_bytes or settings.export_chunk_bytes
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+    pending: List[bytes] = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size < chunk_bytes:
+            continue
+        chunk = b"".join(pending)
+        pending.clear()
+        size = 0
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+
+    tail = b"".join(pending)
+    if compressor:
+        tail = compressor.compress(tail) + compressor.flush()
+    if tail:
+        yield tail
+
+
+_KINDS: Dict[str, Tuple[Callable[[ExportFilters], Iterator[dict]], List[str]]] = {
+    "generations": (iter_generations, GENERATION_FIELDS),
+    "drafts": (iter_drafts, DRAFT_FIELDS),
+}
+
+
+def export_stream(
+    kind: Literal["generations", "drafts"],
+    fmt: ExportFormat,
+    filters: ExportFilters,
+    gzip: bool = False,
+) -> Iterator[bytes]:
+    """エクスポートの本文をチャンクごとに返す（同期イテレーター。StreamingResponse がスレッドで回す）"""
+    iter_records, fieldnames = _KINDS[kind]
+    records = iter_records(filters)
+    lines = encode_csv(records, fieldnames) if fmt == "csv" else encode_jsonl(records)
+    return chunked(lines, gzip=gzip)
@@ -0,0 +1,109 @@
+"""
+DM生成結果（DMGeneration）の保存・読み込み
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.responses import content_hash
+from app.core.security import NotFoundError
+from app.db.base import SessionLocal
+from app.models.dm import DMGeneration
+from app.services.evidence import link_evidences, load_evidences
+
+
+def generation_content_hash(evidences: List[dict], hooks: List[dict], drafts: List[dict]) -> str:
+    """保存内容（レスポンスの evidences / hooks / drafts）のハッシュ"""
+    return content_hash({"evidences": evidences, "hooks": hooks, "drafts": drafts})
+
+
+def save_generation(
+    db: Session,
+    target_url: str,
+    target_role: Optional[str],
+    company_name: Optional[str],
+    product_name: str,
+    product_summary: str,
+    result: dict,
+) -> DMGeneration:
+    """生成結果を新しい DMGeneration として保存（evidence は正規化して共有の行を参照する）"""
+    generation = DMGeneration(
+        target_url=target_url,
+        target_role=target_role,
+        company_name=company_name,
+        product_name=product_name,
+        product_summary=product_summary,
+        hooks=result["hooks"],
+        drafts=result["drafts"],
+        content_hash=generation_content_hash(result["evidences"], result["hooks"], result["drafts"]),
+    )
+    db.add(generation)
+    db.flush()
+    link_evidences(db, generation.id, result["evidences"])
+    db.commit()
+    db.refresh(generation)
+    return generation
+
+
+def persist_generation(**kwargs) -> Optional[int]:
+    """
+    専用セッションで保存して ID を返す（ワーカースレッドから呼ぶ）
+
+    保存に失敗しても生成結果は返したいので、例外はログに出して None を返す
+    """
+    db = SessionLocal()
+    try:
+        return save_generation(db, **kwargs).id
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to save generation: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def get_generation(db: Session, generation_id: int) -> DMGeneration:
+    generation = db.get(DMGeneration, generation_id)
+    if generation is None:
+        raise NotFoundError(f"Generation not found: {generation_id}")
+    return generation
+
+
+def get_generation_version(db: Session, generation_id: int) -> Tuple[Optional[str], Optional[datetime]]:
+    """ETag 用の (content_hash, 最終更新日時)。JSON カラムは読まない"""
+    row = db.execute(
+        select(DMGeneration.content_hash, DMGeneration.updated_at, DMGeneration.created_at)
+        .where(DMGeneration.id == generation_id)
+    ).first()
+    if row is None:
+        raise NotFoundError(f"Generation not found: {generation_id}")
+    return row.content_hash, row.updated_at or row.created_at
+
+
+def update_generation(
+    db: Session,
+    generation: DMGeneration,
+    hooks: List[dict],
+    drafts: List[dict],
+) -> DMGeneration:
+    """再生成した hooks / drafts で保存済みの生成結果を更新"""
+    generation.hooks = hooks
+    generation.drafts = drafts
+    generation.content_hash = generation_content_hash(load_evidences(db, generation), hooks, drafts)
+    db.commit()
+    db.refresh(generation)
+    return generation
+
+
+def merge_drafts(existing: List[dict], regenerated: List[dict]) -> List[dict]:
+    """
+    再生成したトーンのドラフトだけを差し替える（それ以外のトーンは保存済みのものを残す）
+
+    既存の並び順を保ち、新しいトーンは末尾に追加する
+    """
+    by_tone = {d["tone"]: d for d in regenerated}
+    merged = [by_tone.pop(d["tone"], d) for d in existing or []]
+    merged.extend(by_tone.values())
+    return merged
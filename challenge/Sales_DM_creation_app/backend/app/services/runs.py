@@ -0,0 +1,243 @@
+"""
+SSEストリームの再開用に、生成ごとのイベントログを保持する
+
+- 生成（run）ごとに ID を振り、進捗イベントを上限付きのログに記録する
+- パイプラインは接続とは独立したタスクで動くので、接続が切れても続行できる
+- 再接続時は Last-Event-ID（"{run_id}:{seq}"）以降のイベントを再送し、実行中の run に合流する
+- 購読者がいなくなってから stream_resume_grace_seconds 以内に再接続がなければ run をキャンセル
+- 終了した run のログは run_log_ttl_seconds 後に破棄する
+- ログのスナップショットは共有ストアにも書くので、本番モード（複数ワーカー）で別のワーカーに再接続しても
+  そのワーカーがスナップショットをポーリングして配信する（RemoteRunLog）。別ワーカーの購読者も
+  run のリースのフォロワーとして数え、誰も見ていない run だけをキャンセルする
+"""
+from __future__ import annotations
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.security import ConflictError
+from app.core.shared_state import SharedStore, shared_store
+
+_LOG_NAMESPACE = "run_log"
+_POLL_INTERVAL_SECONDS = 0.5
+# 別ワーカーの購読者数の更新（投げっぱなしのタスク）が GC されないよう参照を持っておく
+_background: Set[asyncio.Task] = set()
+
+
+def _lease_key(run_id: str) -> str:
+    return f"run:{run_id}"
+
+
+def _in_background(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+class RunLog:
+    """1回の生成のイベントログ（イベントループのスレッドからのみ操作する）"""
+
+    def __init__(self, run_id: str, max_events: int, store: Optional[SharedStore] = None, lease: str = ""):
+        self.run_id = run_id
+        self.events: Deque[Tuple[int, dict]] = deque(maxlen=max_events)
+        self.next_seq = 1
+        self.done = False
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+        self._store = store
+        self.lease = lease
+        self._dirty = False
+        self._publishing = False
+
+    def append(self, data: dict, final: bool = False) -> int:
+        seq = self.next_seq
+        self.next_seq += 1
+        self.events.append((seq, data))
+        if final:
+            self.done = True
+            self.finished_at = time.monotonic()
+        # 待っている購読者を起こし、次の待機用に新しい Event を用意する
+        self._changed.set()
+        self._changed = asyncio.Event()
+        self._schedule_publish()
+        return seq
+
+    def snapshot(self) -> dict:
+        return {"events": list(self.events), "next_seq": self.next_seq, "done": self.done}
+
+    def _schedule_publish(self) -> None:
+        if self._store is None:
+            return
+        self._dirty = True
+        if not self._publishing:
+            self._publishing = True
+            _in_background(self._publish())
+
+    async def _publish(self) -> None:
+        """スナップショットを共有ストアに書く（書き込み中に追加されたイベントは次の1回にまとめる）"""
+        try:
+            while self._dirty:
+                self._dirty = False
+                ttl = settings.run_log_ttl_seconds if self.done else settings.run_log_max_age_seconds
+                await asyncio.to_thread(self._store.cache_set, _LOG_NAMESPACE, self.run_id, self.snapshot(), ttl)
+            if self.done:
+                await asyncio.to_thread(self._store.release_lease, _lease_key(self.run_id), self.lease)
+        except Exception as e:
+            # 共有できなくても、このワーカーへの再接続は引き続きメモリ上のログで配信できる
+            print(f"Failed to publish run log {self.run_id}: {e}")
+        finally:
+            self._publishing = False
+
+    def events_after(self, seq: int) -> List[Tuple[int, dict]]:
+        return [(s, data) for s, data in self.events if s > seq]
+
+    async def wait_for_change(self, timeout: float) -> None:
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def attach(self) -> None:
+        self.subscribers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+
+    def detach(self) -> None:
+        self.subscribers = max(self.subscribers - 1, 0)
+        if self.subscribers == 0 and not self.done and self.task is not None:
+            # 猶予時間内に再接続がなければ生成を止める
+            loop = asyncio.get_running_loop()
+            self._cancel_handle = loop.call_later(
+                settings.stream_resume_grace_seconds, self._cancel_if_abandoned
+            )
+
+    def _cancel_if_abandoned(self) -> None:
+        self._cancel_handle = None
+        if self.subscribers != 0 or self.task is None or self.task.done():
+            return
+        if self._store is not None and self._store.follower_count(_lease_key(self.run_id)) > 0:
+            # 別のワーカーに再接続した購読者がいる。その購読者が去った場合に備えて猶予後にもう一度確認する
+            self._cancel_handle = asyncio.get_running_loop().call_later(
+                settings.stream_resume_grace_seconds, self._cancel_if_abandoned
+            )
+            return
+        self.task.cancel()
+
+
+class RemoteRunLog:
+    """別のワーカーが実行中（または終了直後）の run のイベントログ（共有ストアのスナップショットをポーリングする）"""
+
+    def __init__(self, run_id: str, snapshot: dict, store: SharedStore):
+        self.run_id = run_id
+        self._store = store
+        self._apply(snapshot)
+
+    def _apply(self, snapshot: dict) -> None:
+        self.events: List[Tuple[int, dict]] = [(seq, data) for seq, data in snapshot["events"]]
+        self.next_seq: int = snapshot["next_seq"]
+        self.done: bool = snapshot["done"]
+
+    def events_after(self, seq: int) -> List[Tuple[int, dict]]:
+        return [(s, data) for s, data in self.events if s > seq]
+
+    async def wait_for_change(self, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            await asyncio.sleep(max(0.0, min(_POLL_INTERVAL_SECONDS, deadline - time.monotonic())))
+            snapshot = await asyncio.to_thread(self._store.cache_get, _LOG_NAMESPACE, self.run_id)
+            if snapshot is None:
+                # 期限切れ（実行していたワーカーが落ちた場合も含む）。配信を終える
+                self.done = True
+                return
+            if snapshot["next_seq"] != self.next_seq or snapshot["done"] != self.done:
+                self._apply(snapshot)
+                return
+            if time.monotonic() >= deadline:
+                return
+
+    def attach(self) -> None:
+        _in_background(asyncio.to_thread(self._store.add_follower, _lease_key(self.run_id), 1))
+
+    def detach(self) -> None:
+        _in_background(asyncio.to_thread(self._store.add_follower, _lease_key(self.run_id), -1))
+
+
+AnyRunLog = Union[RunLog, RemoteRunLog]
+
+
+class RunRegistry:
+    def __init__(self, store: Optional[SharedStore] = None):
+        self._runs: Dict[str, RunLog] = {}
+        self._store = store
+
+    async def create(self, run_id: Optional[str] = None) -> RunLog:
+        """
+        新しい run を登録（同じ run_id の終了済みログは置き換える）
+
+        同じ run_id を実行中（他のワーカーがリースを持っている）なら ConflictError
+        """
+        self.purge_expired()
+        run_id = run_id or uuid.uuid4().hex
+        lease = uuid.uuid4().hex
+        if self._store is not None:
+            previous = self._runs.get(run_id)
+            if previous is not None and previous.done:
+                # このワーカーで終了済みの run は、スナップショットの書き込み後のリース解放を待たずに置き換える
+                await asyncio.to_thread(self._store.release_lease, _lease_key(run_id), previous.lease)
+            # 別ワーカーの購読者数を数えるためのリース（生成が終わったら解放する）
+            acquired = await asyncio.to_thread(
+                self._store.acquire_lease, _lease_key(run_id), lease, settings.run_log_max_age_seconds
+            )
+            if not acquired:
+                raise ConflictError(f"Run is already running: {run_id}")
+        run = RunLog(run_id, settings.run_log_max_events, self._store, lease)
+        self._runs[run.run_id] = run
+        return run
+
+    def get(self, run_id: str) -> Optional[RunLog]:
+        """このワーカーで実行している run"""
+        self.purge_expired()
+        return self._runs.get(run_id)
+
+    async def find(self, run_id: str) -> Optional[AnyRunLog]:
+        """このワーカー、なければ共有ストアから run を探す"""
+        run = self.get(run_id)
+        if run is not None or self._store is None:
+            return run
+        snapshot = await asyncio.to_thread(self._store.cache_get, _LOG_NAMESPACE, run_id)
+        return RemoteRunLog(run_id, snapshot, self._store) if snapshot else None
+
+    def purge_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            run_id for run_id, run in self._runs.items()
+            if (run.done and now - run.finished_at > settings.run_log_ttl_seconds)
+            or (not run.done and now - run.created_at > settings.run_log_max_age_seconds)
+        ]
+        for run_id in expired:
+            run = self._runs.pop(run_id)
+            if run.task is not None and not run.task.done():
+                run.task.cancel()
+
+
+def parse_last_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """Last-Event-ID（"{run_id}:{seq}"）を (run_id, seq) に分解"""
+    if not value or ":" not in value:
+        return None, 0
+    run_id, _, seq = value.rpartition(":")
+    try:
+        return run_id, int(seq)
+    except ValueError:
+        return run_id, 0
+
+
+run_registry = RunRegistry(shared_store)
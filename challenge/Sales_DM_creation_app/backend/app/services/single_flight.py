@@ -0,0 +1,175 @@
+"""
+同一リクエストの生成を1回にまとめる single-flight
+
+- 同じプロセス内: 実行中のタスクを共有して待つ
+- 別のワーカープロセス: 共有ストアのリースでリーダーを1つに決め、
+  フォロワーはリーダーが書き込む結果をポーリングして受け取る
+
+リーダーは実行中ハートビートでリースを延長し、落ちた場合はリースの期限切れ後にフォロワーがリーダーを引き継ぐ。
+リーダーの呼び出し元がキャンセルされた（クライアント切断）場合は、待っているフォロワーが
+いなくなった時点で on_abandon を呼び、パイプラインを止めてもらう（別ワーカーのフォロワーが
+去ったことはハートビートごとに共有ストアのフォロワー数で確認する）。
+"""
+from __future__ import annotations
+from typing import Awaitable, Callable, Dict
+import asyncio
+import hashlib
+import json
+import uuid
+
+from app.core.config import settings
+from app.core.metrics import SINGLE_FLIGHT
+from app.core.security import APIError
+from app.core.shared_state import SharedStore, shared_store
+
+_RESULT_NAMESPACE = "single_flight"
+_POLL_INTERVAL_SECONDS = 0.5
+_HEARTBEAT_SECONDS = 5.0
+
+
+def request_key(**params) -> str:
+    """リクエストパラメータから single-flight のキーを作る"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, store: SharedStore):
+        self.store = store
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._local_followers: Dict[str, int] = {}
+        self._abandon_callbacks: Dict[str, Callable[[], None]] = {}
+        self._abandoned: set = set()
+
+    def follower_count(self, key: str) -> int:
+        """このキーの結果を待っているフォロワー数（全ワーカー合計）"""
+        return self._local_followers.get(key, 0) + self.store.follower_count(key)
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[dict]],
+        on_follow: Callable[[], None] | None = None,
+        on_abandon: Callable[[], None] | None = None,
+    ) -> dict:
+        while True:
+            # 同じプロセス内で実行中ならそのタスクを待つ
+            task = self._inflight.get(key)
+            if task is not None:
+                return await self._follow_local(key, task, on_follow)
+
+            token = uuid.uuid4().hex
+            acquired = await asyncio.to_thread(
+                self.store.acquire_lease, key, token, settings.single_flight_lease_seconds
+            )
+            if acquired:
+                SINGLE_FLIGHT.inc(role="leader")
+                task = asyncio.create_task(self._lead(key, token, fn))
+                # 呼び出し元が去った後に失敗しても "exception was never retrieved" にしない
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                self._inflight[key] = task
+                if on_abandon:
+                    self._abandon_callbacks[key] = on_abandon
+                # 呼び出し元がキャンセルされてもフォロワーがいれば実行は継続する
+                try:
+                    return await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    self._abandoned.add(key)
+                    self._cancel_if_unwanted(key)
+                    raise
+
+            result = await self._follow_remote(key, on_follow)
+            if result is not None:
+                return result
+            # リーダーが結果を残さずに消えた → リーダーを引き継ぐ
+
+    async def _lead(self, key: str, token: str, fn: Callable[[], Awaitable[dict]]) -> dict:
+        result_key = f"{key}:{token}"
+        ttl = settings.single_flight_result_ttl_seconds
+        heartbeat = asyncio.create_task(self._heartbeat(key, token))
+        try:
+            result = await fn()
+            await asyncio.to_thread(self.store.cache_set, _RESULT_NAMESPACE, result_key, {"result": result}, ttl)
+            return result
+        except APIError as e:
+            await asyncio.to_thread(
+                self.store.cache_set,
+                _RESULT_NAMESPACE,
+                result_key,
+                {"error": e.message, "status_code": e.status_code, "headers": e.headers},
+                ttl,
+            )
+            raise
+        finally:
+            heartbeat.cancel()
+            self._inflight.pop(key, None)
+            self._abandon_callbacks.pop(key, None)
+            self._abandoned.discard(key)
+            await asyncio.to_thread(self.store.release_lease, key, token)
+
+    async def _heartbeat(self, key: str, token: str) -> None:
+        """リースを延長し、呼び出し元が去った後は別ワーカーのフォロワーが残っているかを確認する"""
+        while True:
+            await asyncio.sleep(_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(
+                    self.store.acquire_lease, key, token, settings.single_flight_lease_seconds
+                )
+                if key in self._abandoned:
+                    self._cancel_if_unwanted(key, await asyncio.to_thread(self.follower_count, key))
+            except Exception as e:
+                # 共有ストアの一時的な障害では実行を止めない（次のハートビートで再試行する）
+                print(f"Single-flight heartbeat failed: {key}, error: {e}")
+
+    def _cancel_if_unwanted(self, key: str, followers: int | None = None) -> None:
+        """リーダーの呼び出し元が去り、フォロワーも残っていなければ実行を止める"""
+        if key not in self._abandoned or key not in self._inflight:
+            return
+        if (self.follower_count(key) if followers is None else followers) > 0:
+            return
+        callback = self._abandon_callbacks.pop(key, None)
+        if callback:
+            callback()
+
+    async def _follow_local(self, key: str, task: asyncio.Task, on_follow) -> dict:
+        SINGLE_FLIGHT.inc(role="follower")
+        if on_follow:
+            on_follow()
+        self._local_followers[key] = self._local_followers.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._local_followers[key] -= 1
+            if self._local_followers[key] <= 0:
+                self._local_followers.pop(key, None)
+            self._cancel_if_unwanted(key)
+
+    async def _follow_remote(self, key: str, on_follow) -> dict | None:
+        token = await asyncio.to_thread(self.store.lease_owner, key)
+        if token is None:
+            return None
+        SINGLE_FLIGHT.inc(role="follower")
+        if on_follow:
+            on_follow()
+        result_key = f"{key}:{token}"
+        await asyncio.to_thread(self.store.add_follower, key, 1)
+        try:
+            while True:
+                entry = await asyncio.to_thread(self.store.cache_get, _RESULT_NAMESPACE, result_key)
+                if entry is None and await asyncio.to_thread(self.store.lease_owner, key) != token:
+                    # リース解放と結果書き込みの順序差を吸収するためもう一度確認
+                    entry = await asyncio.to_thread(self.store.cache_get, _RESULT_NAMESPACE, result_key)
+                    if entry is None:
+                        return None
+                if entry is not None:
+                    if "error" in entry:
+                        raise APIError(
+                            entry["error"], status_code=entry.get("status_code", 502), headers=entry.get("headers")
+                        )
+                    return entry["result"]
+                await asyncio.sleep(_POLL_INTERVAL_SECONDS)
+        finally:
+            await asyncio.to_thread(self.store.add_follower, key, -1)
+
+
+single_flight = SingleFlight(shared_store)
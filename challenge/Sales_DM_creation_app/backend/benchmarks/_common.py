@@ -0,0 +1,43 @@
+"""
+ベンチマーク共通のヘルパー（オフライン環境の設定・パーセンタイル）
+"""
+from __future__ import annotations
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+
+def configure_offline_env(prefix: str, overrides: Optional[Dict[str, object]] = None, isolated: bool = True) -> str:
+    """
+    app を import する前に Settings を環境変数で上書きする（OpenAI / Tavily はオフラインのスタンドイン）
+
+    isolated=True のときはパイプラインだけを測るよう single-flight・チェックポイント・トレースを止め、
+    DB と共有ストアを一時ディレクトリに作る。False のときは DB だけを一時ディレクトリに作る（DATABASE_URL があればそれを使う）。
+    overrides の値が None の項目は設定しない。作った一時ディレクトリを返す
+    """
+    workdir = tempfile.mkdtemp(prefix=f"insight_dm_{prefix}_")
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["SEARCH_PROVIDER"] = "fake"
+    if isolated:
+        os.environ["SINGLE_FLIGHT_ENABLED"] = "false"
+        os.environ["CHECKPOINT_ENABLED"] = "false"
+        os.environ["TRACE_ENABLED"] = "false"
+        os.environ["SHARED_STATE_PATH"] = os.path.join(workdir, "shared_state.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    elif "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, f'{prefix}.db')}"
+    for name, value in (overrides or {}).items():
+        if value is not None:
+            os.environ[name] = str(value)
+    return workdir
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """線形補間のパーセンタイル（空なら NaN）"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
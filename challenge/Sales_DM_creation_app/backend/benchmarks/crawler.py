@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+企業サイトの直接クロールと site: 検索だけの場合のリサーチのレイテンシを比較するベンチマーク（オフライン）
+
+ローカルの http.server で企業サイトのスタンドイン（トップページ・ニュース・プレスリリース・採用ページ・robots.txt。
+レスポンスごとに --site-latency-ms の遅延）を --sites 個立て、company_name なしでリサーチ（researcher ノード）だけを実行する。
+
+- crawl:  サイトを直接読む（結果が CRAWLER_MIN_RESULTS 件以上なら検索は行わない）
+- search: クローラーを無効にし、site: 検索（スタンドイン。--search-latency-ms の遅延）だけを行う
+
+サイトごとのリクエストから、クローラーの振る舞いも確認する（守られていなければ終了コード 1）:
+
+- ホストごとの同時リクエスト数・間隔の制限（間隔はサーバー側の到着時刻で測るので、
+  スレッドのスケジューリング分の数 ms だけ短く出ることがある。_INTERVAL_TOLERANCE まで許容する）
+- robots.txt で禁止されたパスは取得しない（リダイレクト先が禁止されたパスの場合も）
+- 同じサイト内のリダイレクト（/news → /news/）はたどり、別サイト（localhost:port）へのリダイレクトはたどらない
+- Content-Type に charset がない Shift_JIS のページを <meta charset> で正しくデコードする
+
+サイトは3種類を順に立てる: 0 = プレスリリースが robots.txt で禁止されたパスへリダイレクト、
+1 = Shift_JIS のページ、2 = 採用ページが別サイトへリダイレクト。
+
+使い方（backend/ から実行）:
+    python -m benchmarks.crawler
+    python -m benchmarks.crawler --sites 20 --site-latency-ms 150 --search-latency-ms 2500
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks._common import configure_offline_env, percentile
+
+_ROBOTS = "User-agent: *\nDisallow: /private/\n"
+_NAV = (
+    '<nav><a href="/">Home</a> <a href="/about">About</a> <a href="/news">News</a> '
+    '<a href="/press-releases">Press Releases</a> <a href="{careers}">Careers</a> '
+    '<a href="/private/admin">Admin</a></nav>'
+)
+# Shift_JIS のページの本文（① は Shift_JIS の拡張文字）
+_SJIS_TEXT = "株式会社サイト{site}は①新製品の提供を開始しました。全国の拠点で順次導入を進めています。"
+_INTERVAL_TOLERANCE = 0.01
+
+
+def _configure_offline_env(args: argparse.Namespace) -> None:
+    """app を import する前に Settings を環境変数で上書きする"""
+    configure_offline_env("crawler", {
+        "FAKE_LATENCY_DISTRIBUTION": "fixed",
+        "FAKE_SEARCH_LATENCY_MS": args.search_latency_ms,
+        "SCHEDULER_SEARCH_SLOTS": args.concurrency * 3,
+        "CRAWLER_PER_HOST_CONCURRENCY": args.per_host_concurrency,
+        "CRAWLER_PER_HOST_INTERVAL_SECONDS": args.per_host_interval,
+        # スタンドインのサイトはループバックの任意ポートで立てるので、内部アドレスの制限から外す
+        "CRAWLER_ALLOWED_HOSTS": '["127.0.0.1"]',
+    })
+
+
+# ---- 企業サイトのスタンドイン ----
+def _site_pages(site: int, seed: int) -> Dict[str, str]:
+    from benchmarks.micro import build_corpus
+
+    corpus = build_corpus(16, "en", seed + site)
+    charset = "Shift_JIS" if site % 3 == 1 else "utf-8"
+    extra = f"<p>{_SJIS_TEXT.format(site=site)}</p>" if site % 3 == 1 else ""
+    nav = _NAV.format(careers="/recruit" if site % 3 == 2 else "/careers/")
+
+    def page(title: str, entries: List[dict]) -> str:
+        sections = "".join(
+            f'<section><h2 id="item-{i}">{e["title"]}</h2><p>{e["content"]}</p>{extra}'
+            f'<p><time>2026-0{i % 9 + 1}-15</time></p></section>'
+            for i, e in enumerate(entries)
+        )
+        return (
+            f'<!doctype html><html><head><meta charset="{charset}"><title>{title} | Site {site}</title>'
+            f'<meta name="description" content="Site {site} corporate website">'
+            f"<script>var tracking = 'ignored';</script><style>body {{ margin: 0 }}</style></head>"
+            f"<body><header>{nav}</header><main><h1>{title}</h1>{sections}</main>"
+            f"<footer>&copy; Site {site} Inc.</footer></body></html>"
+        )
+
+    return {
+        "/": page("Home", corpus[0:2]),
+        "/news/": page("News", corpus[2:6]),
+        "/press-releases": page("Press Releases", corpus[6:10]),
+        "/careers/": page("Careers", corpus[10:13]),
+        "/about": page("About", corpus[13:16]),
+    }
+
+
+class _SiteServer:
+    """1つの企業サイト（ポートごとに別のホストとして扱われる）"""
+
+    def __init__(self, site: int, latency_ms: float, seed: int):
+        pages = _site_pages(site, seed)
+        self.site = site
+        self.shift_jis = site % 3 == 1
+        self.requests: List[Tuple[float, str]] = []
+        self.active = 0
+        self.max_active = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with lock:
+                    server.requests.append((time.monotonic(), self.path))
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    time.sleep(latency_ms / 1000)
+                    port = server._httpd.server_address[1]
+                    if self.path == "/robots.txt":
+                        self._send(200, "text/plain", _ROBOTS)
+                    elif self.path == "/news":
+                        self._redirect("/news/")
+                    elif self.path == "/press-releases" and site % 3 == 0:
+                        self._redirect("/private/press-releases")
+                    elif self.path == "/recruit":
+                        # ホスト名が違うので別サイト扱い（たどってはいけない）
+                        self._redirect(f"http://localhost:{port}/offsite/careers/")
+                    elif self.path.startswith("/offsite/"):
+                        self._send(200, "text/html; charset=utf-8", pages["/careers/"])
+                    elif self.path in pages and server.shift_jis:
+                        # charset は <meta> にだけ書く
+                        self._send(200, "text/html", pages[self.path], "cp932")
+                    elif self.path in pages:
+                        self._send(200, "text/html; charset=utf-8", pages[self.path])
+                    else:
+                        self._send(404, "text/html", "<h1>Not Found</h1>")
+                finally:
+                    with lock:
+                        server.active -= 1
+
+            def _redirect(self, location: str):
+                self.send_response(302)
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _send(self, status: int, content_type: str, body: str, encoding: str = "utf-8"):
+                data = body.encode(encoding)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}/"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def min_interval(self) -> float:
+        """リクエストの到着間隔の最小値（最初のリクエストは接続の確立分だけ到着が遅れるので、2件目以降で測る）"""
+        starts = sorted(t for t, _ in self.requests)[1:]
+        return min((b - a for a, b in zip(starts, starts[1:])), default=float("nan"))
+
+    def paths(self) -> List[str]:
+        return [path for _, path in self.requests]
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# ---- 計測 ----
+def _source(evidence) -> str:
+    return evidence["source"] if isinstance(evidence, dict) else evidence.source
+
+
+async def _run_mode(args: argparse.Namespace, mode: str, servers: List[_SiteServer]) -> dict:
+    from app.core.config import settings
+    from app.services.ai.agents import research_async
+
+    settings.crawler_enabled = mode == "crawl"
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(server: _SiteServer) -> Tuple[float, List]:
+        async with semaphore:
+            start = time.perf_counter()
+            evidences = await research_async(
+                target_url=server.url,
+                target_role="CTO",
+                company_name=None,
+                your_product_name="Pipeline CRM",
+                your_product_summary="A CRM that automates sales pipeline hygiene",
+            )
+            return time.perf_counter() - start, evidences
+
+    results = await asyncio.gather(*(one(s) for s in servers))
+    latencies = [r[0] for r in results]
+    evidences = [e for r in results for e in r[1]]
+    return {
+        "mode": mode,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "evidences": len(evidences) / len(servers),
+        "from_site": sum(1 for e in evidences if _source(e) == "company_site") / len(servers),
+    }
+
+
+async def _decoded_shift_jis(servers: List[_SiteServer]) -> Optional[bool]:
+    """Shift_JIS のサイトを直接クロールし、本文が文字化けせずに取れたか（Shift_JIS のサイトがなければ None）"""
+    from app.services.crawler import get_crawler
+
+    sjis = [s for s in servers if s.shift_jis]
+    if not sjis:
+        return None
+    for server in sjis:
+        items = await asyncio.to_thread(get_crawler().crawl, server.url)
+        if not any(_SJIS_TEXT.format(site=server.site) in item["content"] for item in items):
+            return False
+    return True
+
+
+def _violations(args: argparse.Namespace, servers: List[_SiteServer], shift_jis_ok: Optional[bool]) -> List[str]:
+    """クローラーが守るべき振る舞いの違反"""
+    violations = []
+    max_active = max(s.max_active for s in servers)
+    if max_active > args.per_host_concurrency:
+        violations.append(f"max concurrent requests per host {max_active} > {args.per_host_concurrency}")
+    interval = min(s.min_interval() for s in servers)
+    if interval < args.per_host_interval - _INTERVAL_TOLERANCE:
+        violations.append(f"min arrival interval {interval:.3f}s < {args.per_host_interval}s")
+    disallowed = [p for s in servers for p in s.paths() if p.startswith("/private/")]
+    if disallowed:
+        violations.append(f"fetched robots.txt-disallowed paths: {sorted(set(disallowed))}")
+    offsite = [p for s in servers for p in s.paths() if p.startswith("/offsite/")]
+    if offsite:
+        violations.append(f"followed off-site redirects: {sorted(set(offsite))}")
+    not_followed = [s.url for s in servers if "/news/" not in s.paths()]
+    if not_followed:
+        violations.append(f"same-site redirect /news -> /news/ not followed on {len(not_followed)} sites")
+    if shift_jis_ok is False:
+        violations.append("Shift_JIS page declared only in <meta charset> was not decoded")
+    return violations
+
+
+async def _main(args: argparse.Namespace) -> Tuple[List[dict], List[_SiteServer], Optional[bool]]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(32, args.concurrency * 2)))
+    from app.db.base import Base, engine
+    import app.models.dm  # noqa: F401  テーブル定義を登録
+
+    Base.metadata.create_all(bind=engine)
+    servers = [_SiteServer(i, args.site_latency_ms, args.seed) for i in range(args.sites)]
+    results = [await _run_mode(args, mode, servers) for mode in ("crawl", "search")]
+    return results, servers, await _decoded_shift_jis(servers)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Company site crawler vs site: search benchmark (offline)")
+    parser.add_argument("--sites", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--site-latency-ms", type=float, default=100.0, help="スタンドインのサイトの1レスポンスの遅延")
+    parser.add_argument("--search-latency-ms", type=float, default=2000.0, help="advanced の検索1回の遅延")
+    parser.add_argument("--per-host-concurrency", type=int, default=2)
+    parser.add_argument("--per-host-interval", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    _configure_offline_env(args)
+    results, servers, shift_jis_ok = asyncio.run(_main(args))
+    from app.services.crawler import close_crawler
+
+    close_crawler()
+    for server in servers:
+        server.close()
+
+    print(
+        f"{args.sites} sites, concurrency {args.concurrency}, site latency {args.site_latency_ms:.0f}ms, "
+        f"search latency {args.search_latency_ms:.0f}ms\n"
+    )
+    print(f"{'mode':<10}{'p50 s':>10}{'p95 s':>10}{'evidences':>12}{'from site':>12}")
+    baseline = results[-1]["p50"]
+    for r in results:
+        print(
+            f"{r['mode']:<10}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['evidences']:>12.1f}{r['from_site']:>12.1f}"
+            f"   (p50 {r['p50'] / baseline - 1:+.0%} vs search)"
+        )
+
+    requests = [len(s.requests) for s in servers]
+    print(
+        f"\nper site: {min(requests)}-{max(requests)} requests, "
+        f"max concurrent {max(s.max_active for s in servers)} (limit {args.per_host_concurrency}), "
+        f"min arrival interval {min(s.min_interval() for s in servers):.3f}s (limit {args.per_host_interval})"
+    )
+    violations = _violations(args, servers, shift_jis_ok)
+    for violation in violations:
+        print(f"FAIL: {violation}")
+    if not violations:
+        print("OK: politeness limits, robots.txt, redirects and charset detection")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Evidence 正規化の効果を測るベンチマーク（DBサイズ・書き込み量）
+
+同じ企業に何度もDMを生成する状況を想定し、企業ごとの記事プールから Evidence を選んだ
+生成結果を N 件保存する。次の3通りで DB ファイルサイズ・書き込みバイト数・時間を比較する。
+
+- legacy:     dm_generations.evidences（JSON）に Evidence を丸ごと埋め込む（従来の保存方法）
+- normalized: evidence テーブルに1行だけ保存し、generation_evidences で参照する
+- migrated:   legacy の DB に run_migrations を適用して VACUUM したもの
+
+使い方（backend/ から実行）:
+    python -m benchmarks.evidence_dedup
+    python -m benchmarks.evidence_dedup --generations 5000 --companies 100 --keep
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.db.migrations import run_migrations
+from app.models.dm import DMGeneration
+from app.services.generations import save_generation
+
+_WORDS_JA = ["導入", "DX", "業務効率化", "顧客体験", "採用強化", "新サービス", "資金調達", "提携", "海外展開", "生成AI"]
+_WORDS_EN = ["launch", "growth", "customer", "platform", "expansion", "funding", "partnership", "AI", "hiring", "security"]
+
+
+def _snippet(rng: random.Random, company: str) -> str:
+    words = _WORDS_JA if rng.random() < 0.5 else _WORDS_EN
+    body = " ".join(rng.choice(words) for _ in range(rng.randint(60, 90)))
+    return f"{company}: {body}"[:500]
+
+
+def build_dataset(args: argparse.Namespace) -> List[dict]:
+    """企業ごとの記事プールから Evidence を選んだ生成結果を作る（シード固定）"""
+    rng = random.Random(args.seed)
+    pools: Dict[str, List[dict]] = {}
+    for c in range(args.companies):
+        company = f"Company{c:04d}"
+        pools[company] = [
+            {
+                "source": "web",
+                "title": f"{company} article {i}",
+                "snippet": _snippet(rng, company),
+                "url": f"https://news.example.com/{company.lower()}/{i}",
+            }
+            for i in range(args.articles_per_company)
+        ]
+
+    generations = []
+    companies = list(pools)
+    for g in range(args.generations):
+        company = rng.choice(companies)
+        # 上位の記事ほど検索で上がりやすい
+        weights = [1.0 / (i + 1) for i in range(args.articles_per_company)]
+        picked: List[dict] = []
+        while len(picked) < args.evidences_per_generation:
+            article = rng.choices(pools[company], weights=weights)[0]
+            if article not in picked:
+                picked.append(article)
+        evidences = []
+        for article in picked:
+            item = dict(article)
+            if rng.random() < 0.3:
+                # 同じ記事でもトラッキングパラメータ付きのURLで返ってくることがある
+                item["url"] += f"?utm_source=search&utm_campaign={rng.randint(1, 9)}"
+            evidences.append(item)
+        generations.append({
+            "target_url": f"https://{company.lower()}.example.com",
+            "target_role": rng.choice(["CTO", "CS責任者", "営業VP"]),
+            "company_name": company,
+            "product_name": "AIチャットボット",
+            "product_summary": "問い合わせ対応を自動化するAIチャットボット",
+            "result": {
+                "evidences": evidences,
+                "hooks": [
+                    {"id": i, "title": f"Hook {i}", "reason": "理由" * 40, "related_evidence_indices": [i]}
+                    for i in range(3)
+                ],
+                "drafts": [
+                    {"tone": tone, "title": f"{company} 向け", "body_markdown": "本文" * 300}
+                    for tone in ("polite", "casual", "problem_solver")
+                ],
+            },
+        })
+    return generations
+
+
+@dataclass
+class Result:
+    name: str
+    seconds: float
+    written_bytes: int
+    statements: int
+    file_bytes: int
+    evidence_rows: int
+
+
+def _count_writes(engine):
+    """INSERT/UPDATE のバインドパラメータのバイト数を数える"""
+    counter = {"bytes": 0, "statements": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+            return
+        rows = parameters if executemany else [parameters]
+        for row in rows:
+            values = row.values() if isinstance(row, dict) else row
+            for value in values or ():
+                if isinstance(value, (str, bytes)):
+                    counter["bytes"] += len(value.encode("utf-8") if isinstance(value, str) else value)
+                elif value is not None:
+                    counter["bytes"] += 8
+        counter["statements"] += 1
+
+    return counter
+
+
+def _file_size(path: str, vacuum: bool = False) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        if vacuum:
+            conn.execute("VACUUM")
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+    finally:
+        conn.close()
+
+
+def _evidence_rows(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM evidence").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_legacy(path: str, dataset: List[dict]) -> Result:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    counter = _count_writes(engine)
+    start = time.perf_counter()
+    with Session(engine) as db:
+        for item in dataset:
+            db.add(DMGeneration(
+                target_url=item["target_url"],
+                target_role=item["target_role"],
+                company_name=item["company_name"],
+                product_name=item["product_name"],
+                product_summary=item["product_summary"],
+                evidences=item["result"]["evidences"],
+                hooks=item["result"]["hooks"],
+                drafts=item["result"]["drafts"],
+            ))
+            db.commit()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return Result("legacy", elapsed, counter["bytes"], counter["statements"], _file_size(path), 0)
+
+
+def run_normalized(path: str, dataset: List[dict]) -> Result:
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    counter = _count_writes(engine)
+    start = time.perf_counter()
+    with Session(engine) as db:
+        for item in dataset:
+            save_generation(db, **item)
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return Result(
+        "normalized", elapsed, counter["bytes"], counter["statements"], _file_size(path), _evidence_rows(path)
+    )
+
+
+def run_migrated(legacy_path: str, path: str) -> Result:
+    shutil.copyfile(legacy_path, path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    counter = _count_writes(engine)
+    start = time.perf_counter()
+    run_migrations(engine)
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return Result(
+        "migrated", elapsed, counter["bytes"], counter["statements"],
+        _file_size(path, vacuum=True), _evidence_rows(path),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evidence normalization benchmark")
+    parser.add_argument("--generations", type=int, default=2000)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--articles-per-company", type=int, default=20)
+    parser.add_argument("--evidences-per-generation", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="DBファイルを削除せずに残す")
+    args = parser.parse_args(argv)
+
+    dataset = build_dataset(args)
+    workdir = tempfile.mkdtemp(prefix="insight_dm_evidence_")
+    try:
+        legacy = run_legacy(os.path.join(workdir, "legacy.db"), dataset)
+        normalized = run_normalized(os.path.join(workdir, "normalized.db"), dataset)
+        migrated = run_migrated(os.path.join(workdir, "legacy.db"), os.path.join(workdir, "migrated.db"))
+    finally:
+        if args.keep:
+            print(f"DB files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"{args.generations} generations, {args.companies} companies, "
+        f"{args.evidences_per_generation} evidences/generation "
+        f"({args.generations * args.evidences_per_generation} evidence references)\n"
+    )
+    print(f"{'mode':<12}{'file MB':>10}{'written MB':>12}{'statements':>12}{'evidence rows':>15}{'seconds':>10}")
+    for r in (legacy, normalized, migrated):
+        print(
+            f"{r.name:<12}{r.file_bytes / 1e6:>10.2f}{r.written_bytes / 1e6:>12.2f}"
+            f"{r.statements:>12}{r.evidence_rows:>15}{r.seconds:>10.2f}"
+        )
+    print(
+        f"\nnormalized vs legacy: file size {1 - normalized.file_bytes / legacy.file_bytes:.0%} smaller, "
+        f"write volume {1 - normalized.written_bytes / legacy.written_bytes:.0%} smaller"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+エクスポートのメモリ使用量を測るベンチマーク
+
+evidence_dedup と同じデータセットで生成結果を保存し、次の2通りで同じ出力を作って
+ピークメモリ（tracemalloc）と時間を比較する。件数を変えて実行すると、streaming の
+ピークメモリが件数に比例しないことを確認できる。
+
+- naive:     DMGeneration を ORM で全件読み込み、出力全体をメモリ上で組み立てる
+- streaming: app.services.export.export_stream（yield_per + チャンク書き出し）
+
+使い方（backend/ から実行）:
+    python -m benchmarks.export_memory
+    python -m benchmarks.export_memory --generations 20000 --kind drafts --format csv --gzip
+"""
+from __future__ import annotations
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Optional, Tuple
+
+
+def _configure_env(workdir: str) -> None:
+    """app を import する前に DB を一時ディレクトリに向ける"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'export.db')}"
+
+
+def _seed(args: argparse.Namespace) -> None:
+    from benchmarks.evidence_dedup import build_dataset
+    from app.db.base import Base, SessionLocal, engine
+    from app.services.generations import save_generation
+
+    Base.metadata.create_all(bind=engine)
+    dataset = build_dataset(argparse.Namespace(
+        seed=0,
+        generations=args.generations,
+        companies=args.companies,
+        articles_per_company=20,
+        evidences_per_generation=8,
+    ))
+    with SessionLocal() as db:
+        for item in dataset:
+            save_generation(db, **item)
+
+
+def _naive(args: argparse.Namespace) -> int:
+    """全件をメモリに載せてから出力を組み立てる（比較用）"""
+    import gzip
+    from app.db.base import SessionLocal
+    from app.models.dm import DMGeneration
+    from app.services.evidence import load_evidences
+    from app.services.export import DRAFT_FIELDS, GENERATION_FIELDS, encode_csv, encode_jsonl
+
+    with SessionLocal() as db:
+        generations = db.query(DMGeneration).order_by(DMGeneration.id).all()
+        if args.kind == "generations":
+            records = [
+                {
+                    "generation_id": g.id,
+                    "created_at": g.created_at.isoformat() if g.created_at else None,
+                    "updated_at": g.updated_at.isoformat() if g.updated_at else None,
+                    "target_url": g.target_url,
+                    "target_role": g.target_role,
+                    "company_name": g.company_name,
+                    "product_name": g.product_name,
+                    "product_summary": g.product_summary,
+                    "evidences": load_evidences(db, g),
+                    "hooks": g.hooks or [],
+                    "drafts": g.drafts or [],
+                }
+                for g in generations
+            ]
+            fieldnames = GENERATION_FIELDS
+        else:
+            records = [
+                {
+                    "generation_id": g.id,
+                    "created_at": g.created_at.isoformat() if g.created_at else None,
+                    "target_url": g.target_url,
+                    "target_role": g.target_role,
+                    "company_name": g.company_name,
+                    "product_name": g.product_name,
+                    "tone": d.get("tone"),
+                    "title": d.get("title"),
+                    "body_markdown": d.get("body_markdown"),
+                    "edited_body": None,
+                }
+                for g in generations
+                for d in g.drafts or []
+            ]
+            fieldnames = DRAFT_FIELDS
+    lines = encode_csv(records, fieldnames) if args.format == "csv" else encode_jsonl(records)
+    body = "".join(lines).encode("utf-8")
+    if args.gzip:
+        body = gzip.compress(body, compresslevel=6)
+    return len(body)
+
+
+def _streaming(args: argparse.Namespace) -> int:
+    from app.services.export import ExportFilters, export_stream
+
+    return sum(len(chunk) for chunk in export_stream(args.kind, args.format, ExportFilters(), gzip=args.gzip))
+
+
+def _measure(fn: Callable[[argparse.Namespace], int], args: argparse.Namespace) -> Tuple[int, int, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak, elapsed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export memory benchmark")
+    parser.add_argument("--generations", type=int, default=5000)
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--kind", choices=["generations", "drafts"], default="generations")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="insight_dm_export_")
+    try:
+        _configure_env(workdir)
+        _seed(args)
+        # 計測順による差が出ないよう、先に1回ずつ import・ウォームアップしておく
+        import app.services.export  # noqa: F401
+        results = [("naive", *_measure(_naive, args)), ("streaming", *_measure(_streaming, args))]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.generations} generations, kind={args.kind}, format={args.format}, gzip={args.gzip}\n")
+    print(f"{'mode':<12}{'output MB':>12}{'peak MB':>10}{'seconds':>10}")
+    for name, size, peak, elapsed in results:
+        print(f"{name:<12}{size / 1e6:>12.2f}{peak / 1e6:>10.2f}{elapsed:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
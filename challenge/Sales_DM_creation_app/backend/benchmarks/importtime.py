@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+起動時 import 時間のベンチマーク（-X importtime の集計）
+
+`python -X importtime -c "import app.main"` を別プロセスで実行し、
+累積時間の大きいモジュールを表示する。次のいずれかに該当すると終了コード 1 を返すので、
+CIで起動時間の退行検知に使える。
+
+- LangChain / LangGraph / Tavily / OpenAI が app.main の import 時に読み込まれている
+- app.main の累積 import 時間が --budget-ms を超えている
+
+使い方（backend/ から実行）:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 1500 --top 30 --runs 5
+"""
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app.main の import 時に読み込まれてはいけないモジュール（遅延 import 対象）
+FORBIDDEN_PREFIXES = (
+    "langchain",
+    "langgraph",
+    "langsmith",
+    "tavily",
+    "openai",
+    "tiktoken",
+)
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) のリストに変換"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        raw_name = parts[2].rstrip()
+        depth = (len(raw_name) - len(raw_name.lstrip(" "))) // 2
+        rows.append((raw_name.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def measure(module: str) -> List[Tuple[str, int, int, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return _parse_importtime(result.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time benchmark for app startup")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3, help="計測回数（中央値を採用）")
+    parser.add_argument("--top", type=int, default=20, help="表示するモジュール数")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="累積import時間の上限")
+    args = parser.parse_args(argv)
+
+    totals: List[float] = []
+    cumulative_by_module: Dict[str, List[int]] = {}
+    loaded: set = set()
+    for _ in range(args.runs):
+        rows = measure(args.module)
+        for name, _, cumulative_us, _ in rows:
+            cumulative_by_module.setdefault(name, []).append(cumulative_us)
+            loaded.add(name)
+        totals.append(next((c for n, _, c, _ in rows if n == args.module), 0) / 1000)
+
+    total_ms = statistics.median(totals)
+    print(f"import {args.module}: {total_ms:.1f} ms (median of {args.runs}, budget {args.budget_ms:.0f} ms)\n")
+    print(f"{'cumulative ms':>14}  module")
+    ranked = sorted(
+        ((statistics.median(v) / 1000, name) for name, v in cumulative_by_module.items()),
+        reverse=True,
+    )
+    for cumulative_ms, name in ranked[: args.top]:
+        print(f"{cumulative_ms:>14.1f}  {name}")
+
+    failed = False
+    forbidden = sorted(
+        name for name in loaded
+        if name.split(".")[0].startswith(FORBIDDEN_PREFIXES)
+    )
+    if forbidden:
+        failed = True
+        print(f"\nFAIL: heavy provider modules imported eagerly: {', '.join(forbidden[:10])}"
+              + (" ..." if len(forbidden) > 10 else ""))
+    if total_ms > args.budget_ms:
+        failed = True
+        print(f"\nFAIL: import time {total_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if not failed:
+        print("\nOK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+生成APIの負荷試験ハーネス
+
+OpenAI / Tavily をオフラインのスタンドイン（app.services.ai.fakes）に差し替え、
+FastAPIアプリをローカルの uvicorn で起動して /api/dm/generate または
+/api/dm/generate/stream に負荷をかける。ネットワークには出ない（127.0.0.1 のみ）。
+
+使い方（backend/ から実行）:
+    python -m benchmarks.loadtest --endpoint stream --concurrency 20 --requests 200
+    python -m benchmarks.loadtest --endpoint generate --rps 10 --duration 30
+
+レポート内容: スループット、レイテンシ p50/p95/p99、SSE最初のイベントまでの時間、
+同時実行中リクエスト1件あたりのメモリ使用量
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from benchmarks._common import configure_offline_env, percentile
+
+
+def _configure_offline_env(args: argparse.Namespace) -> None:
+    """app を import する前に Settings を環境変数で上書きする（single-flight などはサーバーの既定のまま）"""
+    configure_offline_env("loadtest", {
+        "FAKE_LATENCY_DISTRIBUTION": args.latency_distribution,
+        "FAKE_LLM_LATENCY_MS": args.llm_latency_ms,
+        "FAKE_LLM_LATENCY_STDDEV_MS": args.llm_latency_stddev_ms,
+        "FAKE_LLM_ERROR_RATE": args.llm_error_rate,
+        "FAKE_SEARCH_LATENCY_MS": args.search_latency_ms,
+        "FAKE_SEARCH_LATENCY_STDDEV_MS": args.search_latency_stddev_ms,
+        "FAKE_SEARCH_ERROR_RATE": args.search_error_rate,
+        "FAKE_SEED": args.seed,
+    }, isolated=False)
+
+
+SAMPLE_PAYLOADS = [
+    {
+        "target_url": "https://www.example.co.jp",
+        "target_role": "CTO",
+        "company_name": "株式会社サンプル",
+        "your_product_name": "AIチャットボット",
+        "your_product_summary": "問い合わせ対応を自動化するAIチャットボット",
+    },
+    {
+        "target_url": "https://www.example.com",
+        "target_role": "VP of Sales",
+        "company_name": "Example Inc.",
+        "your_product_name": "Pipeline CRM",
+        "your_product_summary": "A CRM that automates sales pipeline hygiene",
+    },
+]
+
+
+@dataclass
+class RequestResult:
+    ok: bool
+    status: int
+    latency: float
+    first_event: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadTestStats:
+    results: List[RequestResult] = field(default_factory=list)
+    in_flight: int = 0
+    max_in_flight: int = 0
+    memory_samples: List[tuple] = field(default_factory=list)  # (bytes_over_baseline, in_flight)
+
+
+async def _send(client, endpoint: str, payload: dict, stats: LoadTestStats) -> None:
+    stats.in_flight += 1
+    stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+    start = time.perf_counter()
+    try:
+        if endpoint == "generate":
+            response = await client.post("/api/dm/generate", json=payload)
+            ok = response.status_code == 200
+            stats.results.append(RequestResult(
+                ok=ok,
+                status=response.status_code,
+                latency=time.perf_counter() - start,
+                error=None if ok else response.text[:200],
+            ))
+            return
+
+        first_event = None
+        error = None
+        completed = False
+        async with client.stream("POST", "/api/dm/generate/stream", json=payload) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if first_event is None:
+                    first_event = time.perf_counter() - start
+                data = json.loads(line[len("data: "):])
+                if data.get("stage") == "completed":
+                    completed = True
+                elif "error" in data:
+                    error = data["error"]
+            status = response.status_code
+        stats.results.append(RequestResult(
+            ok=completed and status == 200,
+            status=status,
+            latency=time.perf_counter() - start,
+            first_event=first_event,
+            error=error,
+        ))
+    except Exception as e:
+        stats.results.append(RequestResult(
+            ok=False, status=0, latency=time.perf_counter() - start, error=repr(e)
+        ))
+    finally:
+        stats.in_flight -= 1
+
+
+async def _sample_memory(stats: LoadTestStats, baseline: int, interval: float) -> None:
+    while True:
+        current, _ = tracemalloc.get_traced_memory()
+        stats.memory_samples.append((current - baseline, stats.in_flight))
+        await asyncio.sleep(interval)
+
+
+async def _run_closed_loop(client, args, stats: LoadTestStats) -> None:
+    """一定の同時実行数を維持しながら requests 件を送る"""
+    counter = iter(range(args.requests))
+
+    async def worker():
+        for i in counter:
+            await _send(client, args.endpoint, SAMPLE_PAYLOADS[i % len(SAMPLE_PAYLOADS)], stats)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+async def _run_open_loop(client, args, stats: LoadTestStats) -> None:
+    """応答を待たずに一定のRPSでリクエストを投入する"""
+    tasks = []
+    interval = 1.0 / args.rps
+    total = int(args.rps * args.duration)
+    start = time.perf_counter()
+    for i in range(total):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = SAMPLE_PAYLOADS[i % len(SAMPLE_PAYLOADS)]
+        tasks.append(asyncio.create_task(_send(client, args.endpoint, payload, stats)))
+    await asyncio.gather(*tasks)
+
+
+def _report(stats: LoadTestStats, elapsed: float, args) -> dict:
+    latencies = [r.latency for r in stats.results if r.ok]
+    first_events = [r.first_event for r in stats.results if r.first_event is not None]
+    errors = [r for r in stats.results if not r.ok]
+
+    per_request = [b / n for b, n in stats.memory_samples if n > 0]
+    report = {
+        "endpoint": args.endpoint,
+        "mode": "open-loop" if args.rps else "closed-loop",
+        "requests": len(stats.results),
+        "succeeded": len(latencies),
+        "failed": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1) if latencies else None,
+        },
+        "max_in_flight": stats.max_in_flight,
+    }
+    if args.endpoint == "stream":
+        report["sse_first_event_ms"] = {
+            "p50": round(percentile(first_events, 50) * 1000, 1),
+            "p95": round(percentile(first_events, 95) * 1000, 1),
+            "p99": round(percentile(first_events, 99) * 1000, 1),
+        }
+    if per_request:
+        report["memory_per_in_flight_kib"] = {
+            "median": round(statistics.median(per_request) / 1024, 1),
+            "max": round(max(per_request) / 1024, 1),
+        }
+    if errors:
+        report["error_samples"] = sorted({e.error or f"HTTP {e.status}" for e in errors})[:5]
+    return report
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    import httpx
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=0, log_level="warning", lifespan="on"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    stats = LoadTestStats()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        timeout=args.timeout,
+        limits=limits,
+    ) as client:
+        # ウォームアップ（初回のimportやテーブル作成を計測から除外）
+        await client.get("/health")
+
+        sampler = None
+        if args.memory:
+            tracemalloc.start()
+            baseline, _ = tracemalloc.get_traced_memory()
+            sampler = asyncio.create_task(_sample_memory(stats, baseline, 0.05))
+
+        start = time.perf_counter()
+        if args.rps:
+            await _run_open_loop(client, args, stats)
+        else:
+            await _run_closed_loop(client, args, stats)
+        elapsed = time.perf_counter() - start
+
+        if sampler:
+            sampler.cancel()
+            tracemalloc.stop()
+
+    server.should_exit = True
+    await server_task
+    return _report(stats, elapsed, args)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for the DM generation API")
+    parser.add_argument("--endpoint", choices=["generate", "stream"], default="stream")
+    parser.add_argument("--concurrency", type=int, default=10, help="closed-loop: 同時実行数")
+    parser.add_argument("--requests", type=int, default=50, help="closed-loop: 総リクエスト数")
+    parser.add_argument("--rps", type=float, default=0.0, help="open-loop: 目標RPS（指定時はこちらを優先）")
+    parser.add_argument("--duration", type=float, default=30.0, help="open-loop: 実行秒数")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--latency-distribution", default="lognormal",
+                        choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--llm-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--llm-latency-stddev-ms", type=float, default=500.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--search-latency-ms", type=float, default=800.0)
+    parser.add_argument("--search-latency-stddev-ms", type=float, default=300.0)
+    parser.add_argument("--search-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="tracemalloc によるメモリ計測を無効化（計測オーバーヘッドを除く）")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    args = parser.parse_args(argv)
+
+    _configure_offline_env(args)
+    report = asyncio.run(_main(args))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>26}: {value}")
+    return 0 if report["succeeded"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
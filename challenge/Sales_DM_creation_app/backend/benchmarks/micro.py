@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+パイプラインの CPU 側の処理のマイクロベンチマーク
+
+プロバイダーを呼ばない処理（言語判定・キーワード抽出・不適切コンテンツ判定・スコアリング・
+検索結果の重複排除と並べ替え・プロンプト組み立て）を、シード固定で生成した日本語・英語の
+検索結果コーパス（既定 10〜10,000 件）に対して計測する。
+
+- 処理件数あたりのスループット（items/s。autorange した上で --repeat 回の最良値）
+- 1回の呼び出しのメモリ割り当て（tracemalloc のピーク。計時とは別に計測する）
+
+--save-baseline で結果を JSON に保存し、--baseline で比較すると、スループットが
+--tolerance 以上落ちた・割り当てが --alloc-tolerance 以上増えたケースがあれば終了コード 1 を返す。
+他プロセスの影響で遅く出ただけのケースを退行と判定しないよう、許容範囲を超えたケースは
+--retries 回まで計測し直し、最良値で判定する（本当の退行は何度測っても遅い）。
+計時はマシンに依存するので、ベースラインは同じマシンで取ったものと比較する。
+
+使い方（backend/ から実行）:
+    python -m benchmarks.micro --save-baseline micro_baseline.json
+    python -m benchmarks.micro --baseline micro_baseline.json
+    python -m benchmarks.micro --sizes 10 1000 --filter rank --language ja
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+_JA_COMPANIES = ["株式会社サンプル", "テックフォワード株式会社", "未来商事", "さくらソリューションズ", "ACME Japan"]
+_EN_COMPANIES = ["Example Inc.", "Northwind Traders", "Contoso Ltd.", "Globex Corporation", "Initech"]
+_JA_WORDS = [
+    "導入", "課題", "検討", "効率化", "改善", "強化", "投資", "DX", "成長", "発表", "リリース", "調達", "提携",
+    "顧客対応", "問い合わせ対応", "採用", "営業支援", "業務", "サービス", "新規", "事業", "推進", "データ", "活用",
+]
+_EN_WORDS = [
+    "implement", "challenge", "improve", "efficiency", "growth", "invest", "digital", "launch", "announce",
+    "funding", "partnership", "customer", "support", "sales", "pipeline", "platform", "team", "market", "data",
+]
+_BLOCKED_SAMPLES = ["adult", "アダルト", "xxx"]
+
+
+def build_corpus(size: int, language: str, seed: int) -> List[dict]:
+    """Tavily の検索結果と同じ形の dict を size 件作る（約1割が URL の重複、約1%が不適切コンテンツ）"""
+    rng = random.Random(f"{seed}:{language}:{size}")
+    words = _JA_WORDS if language == "ja" else _EN_WORDS
+    companies = _JA_COMPANIES if language == "ja" else _EN_COMPANIES
+    sep = "" if language == "ja" else " "
+    results: List[dict] = []
+    for i in range(size):
+        if results and rng.random() < 0.1:
+            results.append(dict(rng.choice(results)))
+            continue
+        company = rng.choice(companies)
+        body = sep.join(rng.choice(words) for _ in range(rng.randint(40, 120)))
+        if rng.random() < 0.01:
+            body += f" {rng.choice(_BLOCKED_SAMPLES)}"
+        results.append({
+            "title": f"{company} {sep.join(rng.sample(words, 4))}",
+            "url": f"https://news.example.{'jp' if language == 'ja' else 'com'}/{i:06d}",
+            "content": f"{company}{sep}{body}",
+            "score": round(rng.uniform(0.3, 0.99), 3),
+        })
+    return results
+
+
+def _targets(size: int, seed: int) -> List[Tuple[str, Optional[str]]]:
+    rng = random.Random(f"{seed}:targets:{size}")
+    hosts = ["example.co.jp", "example.com", "shop.rakuten.co.jp", "example.io", "mercari.example.com"]
+    return [
+        (f"https://www{i}.{rng.choice(hosts)}/about", rng.choice(_JA_COMPANIES + _EN_COMPANIES + [None]))
+        for i in range(size)
+    ]
+
+
+def _products(size: int, seed: int) -> List[Tuple[str, str]]:
+    rng = random.Random(f"{seed}:products:{size}")
+    names = ["AIチャットボット", "クラウドCRM", "Security Suite", "MA Cloud", "HR SaaS", "Pipeline CRM"]
+    summaries = [
+        "問い合わせ対応を自動化するAIチャットボット",
+        "営業支援と顧客管理をひとつに",
+        "A CRM that automates sales pipeline hygiene",
+        "Marketing automation for B2B lead generation",
+    ]
+    return [(rng.choice(names), rng.choice(summaries)) for _ in range(size)]
+
+
+@dataclass
+class Case:
+    """size 件分の入力を準備して、計測対象の処理（引数なし）を返す"""
+    name: str
+    prepare: Callable[[int, str, int], Callable[[], object]]
+
+
+def _cases() -> List[Case]:
+    from app.schemas.dm import EvidenceItem, HookItem
+    from app.services.ai.agents import (
+        _build_analyzer_prompts,
+        _build_copywriter_prompts,
+        _detect_region,
+        _extract_product_keywords,
+        _is_inappropriate_content,
+        _rank_search_results,
+        _score_evidence,
+    )
+
+    keywords = _extract_product_keywords("AIチャットボット", "問い合わせ対応を自動化するAIチャットボット") + \
+        _extract_product_keywords("Pipeline CRM", "A CRM that automates sales pipeline hygiene")
+
+    def detect_region(size, language, seed):
+        targets = _targets(size, seed)
+        return lambda: [_detect_region(url, company) for url, company in targets]
+
+    def extract_keywords(size, language, seed):
+        products = _products(size, seed)
+        return lambda: [_extract_product_keywords(name, summary) for name, summary in products]
+
+    def inappropriate(size, language, seed):
+        texts = [(f"{r['title']} {r['content']}", r["url"]) for r in build_corpus(size, language, seed)]
+        return lambda: [_is_inappropriate_content(text, url) for text, url in texts]
+
+    def score(size, language, seed):
+        texts = [f"{r['title']} {r['content']}" for r in build_corpus(size, language, seed)]
+        return lambda: [_score_evidence(text, keywords, language) for text in texts]
+
+    def rank(size, language, seed):
+        corpus = build_corpus(size, language, seed)
+        return lambda: _rank_search_results(corpus, keywords, language)
+
+    def _evidences(size, language, seed):
+        return [
+            EvidenceItem(source="web", title=r["title"], snippet=r["content"][:500], url=r["url"])
+            for r in build_corpus(size, language, seed)
+        ]
+
+    def analyzer_prompt(size, language, seed):
+        evidences = _evidences(size, language, seed)
+        return lambda: _build_analyzer_prompts(evidences)
+
+    def copywriter_prompt(size, language, seed):
+        evidences = _evidences(size, language, seed)
+        state = {
+            "target_url": "https://www.example.co.jp",
+            "target_role": "CTO",
+            "company_name": "株式会社サンプル",
+            "your_product_name": "AIチャットボット",
+            "your_product_summary": "問い合わせ対応を自動化するAIチャットボット",
+            "evidences": evidences,
+            "hooks": [
+                HookItem(id=i, title=e.title[:50], reason=e.snippet[:200], related_evidence_indices=[i])
+                for i, e in enumerate(evidences[:3])
+            ],
+        }
+        return lambda: _build_copywriter_prompts(state)
+
+    return [
+        Case("detect_region", detect_region),
+        Case("extract_product_keywords", extract_keywords),
+        Case("is_inappropriate_content", inappropriate),
+        Case("score_evidence", score),
+        Case("rank_search_results", rank),
+        Case("analyzer_prompt", analyzer_prompt),
+        Case("copywriter_prompt", copywriter_prompt),
+    ]
+
+
+@dataclass
+class Result:
+    case: str
+    language: str
+    size: int
+    items_per_s: float
+    seconds_per_call: float
+    peak_alloc_bytes: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.case}[{self.language}:{self.size}]"
+
+
+def _time(fn: Callable[[], object], repeat: int, min_seconds: float) -> float:
+    """1回あたりの秒数（min_seconds 以上かかる回数を autorange で決め、repeat 回の最良値）"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_seconds:
+            break
+        number *= 2 if elapsed * 4 > min_seconds else 10
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        best = min(best, timer.timeit(number) / number)
+    return best
+
+
+def _peak_alloc(fn: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run(args: argparse.Namespace, baseline: Optional[dict] = None) -> List[Result]:
+    """全ケースを計測する（baseline があれば、許容範囲より遅いケースは --retries 回まで測り直す）"""
+    base = {r["key"]: r for r in baseline["results"]} if baseline else {}
+    results = []
+    for case in _cases():
+        if args.filter and not any(f in case.name for f in args.filter):
+            continue
+        for language in args.language:
+            for size in args.sizes:
+                fn = case.prepare(size, language, args.seed)
+                fn()  # ウォームアップ
+                seconds = _time(fn, args.repeat, args.min_seconds)
+                b = base.get(f"{case.name}[{language}:{size}]")
+                for _ in range(args.retries if b else 0):
+                    if b["seconds_per_call"] / seconds >= 1 - args.tolerance:
+                        break
+                    seconds = min(seconds, _time(fn, args.repeat, args.min_seconds))
+                result = Result(case.name, language, size, size / seconds, seconds, _peak_alloc(fn))
+                results.append(result)
+                print(
+                    f"{result.key:<44}{result.items_per_s:>14,.0f}{result.seconds_per_call * 1e6:>14,.1f}"
+                    f"{result.peak_alloc_bytes / 1024:>14,.1f}",
+                    flush=True,
+                )
+    return results
+
+
+def compare(results: List[Result], baseline: dict, tolerance: float, alloc_tolerance: float) -> List[str]:
+    """ベースラインより遅くなった・割り当てが増えたケースを返す"""
+    base = {r["key"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get(r.key)
+        if b is None:
+            continue
+        ratio = r.items_per_s / b["items_per_s"]
+        if ratio < 1 - tolerance:
+            regressions.append(
+                f"{r.key}: throughput {ratio - 1:+.0%} "
+                f"({b['items_per_s']:,.0f} -> {r.items_per_s:,.0f} items/s)"
+            )
+        # 小さい割り当ては計測の揺らぎが大きいので 4KiB 未満の増加は無視する
+        grown = r.peak_alloc_bytes - b["peak_alloc_bytes"]
+        if grown > 4096 and r.peak_alloc_bytes > b["peak_alloc_bytes"] * (1 + alloc_tolerance):
+            regressions.append(
+                f"{r.key}: peak allocation {r.peak_alloc_bytes / b['peak_alloc_bytes'] - 1:+.0%} "
+                f"({b['peak_alloc_bytes'] / 1024:,.1f} -> {r.peak_alloc_bytes / 1024:,.1f} KiB)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the CPU-side pipeline stages")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="コーパスの件数")
+    parser.add_argument("--language", nargs="+", choices=["ja", "en"], default=["ja", "en"])
+    parser.add_argument("--filter", nargs="+", help="名前にこの文字列を含むケースだけ実行")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="1回の計測の最短時間")
+    parser.add_argument("--save-baseline", metavar="PATH", help="結果をベースラインとして保存")
+    parser.add_argument("--baseline", metavar="PATH", help="このベースラインと比較して退行があれば失敗")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="許容するスループットの低下率")
+    parser.add_argument("--alloc-tolerance", type=float, default=0.10, help="許容する割り当ての増加率")
+    parser.add_argument("--retries", type=int, default=3, help="許容範囲より遅いケースを測り直す回数")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'case[language:size]':<44}{'items/s':>14}{'us/call':>14}{'peak KiB':>14}")
+    results = run(args, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seed": args.seed,
+                "results": [{**asdict(r), "key": r.key} for r in results],
+            }, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if baseline:
+        if baseline.get("seed") != args.seed:
+            print(f"\nWARNING: baseline seed {baseline.get('seed')} != {args.seed}; corpora differ")
+        regressions = compare(results, baseline, args.tolerance, args.alloc_tolerance)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} regression(s) against {args.baseline}")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nOK: no regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ノードごとのモデル設定（tier）による生成レイテンシの比較（オフライン）
+
+OpenAI / Tavily はオフラインのスタンドインに差し替える。スタンドインの LLM は
+fake_llm_model_latency_ms に従ってモデルごとにレイテンシが変わる（既定: gpt-4o 1500ms / gpt-4o-mini 600ms）。
+tier ごとに同じ件数の生成を実行し、エンドツーエンドのレイテンシとスループットを出力する。
+
+使い方（backend/ から実行）:
+    python -m benchmarks.model_tiering
+    python -m benchmarks.model_tiering --tier gpt-4o/gpt-4o --tier gpt-4.1-nano/gpt-4o --requests 40
+    （--tier は「analyzer のモデル/copywriter のモデル」）
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from benchmarks._common import configure_offline_env, percentile
+
+DEFAULT_TIERS = ["gpt-4o/gpt-4o", "gpt-4o-mini/gpt-4o", "gpt-4o-mini/gpt-4o-mini"]
+
+
+def _configure_offline_env(args: argparse.Namespace) -> None:
+    """app を import する前に Settings を環境変数で上書きする"""
+    configure_offline_env("tiering", {
+        "FAKE_LATENCY_DISTRIBUTION": args.latency_distribution,
+        "FAKE_LLM_LATENCY_MS": args.llm_latency_ms,
+        "FAKE_SEARCH_LATENCY_MS": args.search_latency_ms,
+        "FAKE_SEED": args.seed,
+        "FAKE_LLM_MODEL_LATENCY_MS": args.model_latency or None,
+    })
+
+
+def _parse_tier(tier: str) -> Tuple[str, str]:
+    analyzer, _, copywriter = tier.partition("/")
+    return analyzer, copywriter or analyzer
+
+
+async def _run_tier(args: argparse.Namespace, tier: str, round_id: int) -> dict:
+    from app.core.config import settings
+    from app.services.ai.agents import generate_dm_async
+
+    settings.analyzer_llm_model, settings.copywriter_llm_model = _parse_tier(tier)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            # 検索キャッシュに当たらないよう、tier・リクエストごとに別の企業にする
+            await generate_dm_async(
+                target_url=f"https://tier{round_id}-{i}.example.com",
+                target_role="CTO",
+                company_name=f"Tier{round_id} Company {i}",
+                your_product_name="Pipeline CRM",
+                your_product_summary="A CRM that automates sales pipeline hygiene",
+            )
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "tier": tier,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "throughput": len(latencies) / elapsed,
+    }
+
+
+async def _main(args: argparse.Namespace) -> List[dict]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(32, args.concurrency * 2)))
+    from app.db.base import Base, engine
+    import app.models.dm  # noqa: F401  テーブル定義を登録
+
+    Base.metadata.create_all(bind=engine)
+    return [await _run_tier(args, tier, i) for i, tier in enumerate(args.tier or DEFAULT_TIERS)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-node model tiering benchmark (offline)")
+    parser.add_argument("--tier", action="append", help="analyzer のモデル/copywriter のモデル（複数指定可）")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency-distribution", default="lognormal",
+                        choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--llm-latency-ms", type=float, default=1500.0, help="fake_llm_model_latency_ms にないモデルのレイテンシ")
+    parser.add_argument("--model-latency", default=None,
+                        help='モデルごとのレイテンシ（JSON。例: \'{"gpt-4o-mini": 600}\'）')
+    parser.add_argument("--search-latency-ms", type=float, default=800.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    _configure_offline_env(args)
+    results = asyncio.run(_main(args))
+
+    from app.core.config import settings
+    print(
+        f"{args.requests} generations per tier, concurrency {args.concurrency}, "
+        f"model latency {json.dumps(settings.fake_llm_model_latency_ms)} (others {args.llm_latency_ms:.0f}ms)\n"
+    )
+    print(f"{'analyzer/copywriter':<28}{'p50 s':>10}{'p95 s':>10}{'gen/s':>10}")
+    baseline = results[0]["p50"]
+    for r in results:
+        print(
+            f"{r['tier']:<28}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['throughput']:>10.2f}"
+            f"   (p50 {r['p50'] / baseline - 1:+.0%} vs {results[0]['tier']})"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+プロバイダー呼び出しの優先度クラスの効果を測るベンチマーク（オフライン）
+
+大量の batch 生成（キャンペーンの一括実行を想定）を流し続けている間に、
+interactive の生成を一定間隔で投げ、interactive のレイテンシを比較する。
+
+- prioritized: batch を priority="batch" で実行（interactive が常に先に枠を取る）
+- fair:        batch も priority="interactive" で実行（優先度なし。クライアント間の公平キューイングのみ）
+- fifo:        さらに client_id も同じにする（スケジューラーなしの先着順と同じ）
+
+OpenAI / Tavily はオフラインのスタンドインに差し替え、生成関数を直接呼ぶ（HTTP・流量制御は通らない）。
+
+使い方（backend/ から実行）:
+    python -m benchmarks.priority_lanes
+    python -m benchmarks.priority_lanes --batch-concurrency 40 --interactive-requests 20 --llm-slots 4
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from benchmarks._common import configure_offline_env, percentile
+
+
+def _configure_offline_env(args: argparse.Namespace) -> None:
+    """app を import する前に Settings を環境変数で上書きする"""
+    configure_offline_env("priority", {
+        "FAKE_LATENCY_DISTRIBUTION": "fixed",
+        "FAKE_LLM_LATENCY_MS": args.llm_latency_ms,
+        "FAKE_SEARCH_LATENCY_MS": args.search_latency_ms,
+        "SCHEDULER_LLM_SLOTS": args.llm_slots,
+        "SCHEDULER_SEARCH_SLOTS": args.search_slots,
+    })
+
+
+def _payload(kind: str, i: int) -> dict:
+    # 検索キャッシュに当たらないよう、リクエストごとに別の企業にする
+    return {
+        "target_url": f"https://{kind}-{i}.example.com",
+        "target_role": "CTO",
+        "company_name": f"{kind.title()} {i} Inc.",
+        "your_product_name": "Pipeline CRM",
+        "your_product_summary": "A CRM that automates sales pipeline hygiene",
+    }
+
+
+async def _run_mode(args: argparse.Namespace, batch_priority: str, ui_client: str, round_id: int) -> dict:
+    from app.services.ai.agents import generate_dm_async
+
+    stop = asyncio.Event()
+    batch_done = 0
+
+    async def batch_worker(worker: int):
+        nonlocal batch_done
+        i = 0
+        while not stop.is_set():
+            await generate_dm_async(
+                **_payload(f"batch{round_id}w{worker}", i),
+                priority=batch_priority,
+                client_id="campaign",
+            )
+            batch_done += 1
+            i += 1
+
+    workers = [asyncio.create_task(batch_worker(w)) for w in range(args.batch_concurrency)]
+    # batch がプロバイダーの枠を埋めるまで待つ
+    await asyncio.sleep(args.warmup_seconds)
+
+    async def interactive(i: int) -> float:
+        start = time.perf_counter()
+        await generate_dm_async(**_payload(f"ui{round_id}", i), priority="interactive", client_id=ui_client)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(args.interactive_requests):
+        tasks.append(asyncio.create_task(interactive(i)))
+        await asyncio.sleep(args.interactive_interval)
+    latencies = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*workers, return_exceptions=True)
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": max(latencies),
+        "batch_per_s": batch_done / (elapsed + args.warmup_seconds),
+    }
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=256))
+    from app.db.base import Base, engine
+    import app.models.dm  # noqa: F401  テーブル定義を登録
+
+    Base.metadata.create_all(bind=engine)
+    # 生成1回分の理想値（枠の待ちなし）: 検索3回 + LLM（分析1回 + トーン3通）
+    ideal = (3 * args.search_latency_ms + 4 * args.llm_latency_ms) / 1000
+    return {
+        "ideal": ideal,
+        "prioritized": await _run_mode(args, "batch", "ui", 0),
+        "fair": await _run_mode(args, "interactive", "ui", 1),
+        "fifo": await _run_mode(args, "interactive", "campaign", 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Priority lanes benchmark for provider scheduling")
+    parser.add_argument("--batch-concurrency", type=int, default=24, help="同時に流す batch 生成の数")
+    parser.add_argument("--interactive-requests", type=int, default=12)
+    parser.add_argument("--interactive-interval", type=float, default=0.5, help="interactive を投げる間隔（秒）")
+    parser.add_argument("--warmup-seconds", type=float, default=2.0)
+    parser.add_argument("--llm-slots", type=int, default=4)
+    parser.add_argument("--search-slots", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--search-latency-ms", type=float, default=100.0)
+    args = parser.parse_args(argv)
+
+    _configure_offline_env(args)
+    report = asyncio.run(_main(args))
+
+    print(
+        f"{args.batch_concurrency} concurrent batch generations, {args.interactive_requests} interactive, "
+        f"llm slots {args.llm_slots}, search slots {args.search_slots} "
+        f"(ideal interactive latency {report['ideal']:.2f}s)\n"
+    )
+    print(f"{'mode':<14}{'p50 s':>10}{'p95 s':>10}{'max s':>10}{'batch/s':>10}")
+    for mode in ("prioritized", "fair", "fifo"):
+        r = report[mode]
+        print(f"{mode:<14}{r['p50']:>10.2f}{r['p95']:>10.2f}{r['max']:>10.2f}{r['batch_per_s']:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
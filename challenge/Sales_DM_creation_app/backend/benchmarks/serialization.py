@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+生成結果のシリアライズの CPU 時間と転送量を比較するベンチマーク
+
+シード固定で作った生成結果（evidence・フック・ドラフト）について、次の経路を比較する。
+
+- response pydantic: GenerateDMResponse に詰め直してから response_model で検証・JSON 化（従来の /generate）
+- response orjson:   検証済みの dict をそのまま ORJSONResponse でエンコード
+- sse json:          completed イベントを json.dumps（ensure_ascii=True）で組み立てて UTF-8 にする（従来の SSE）
+- sse orjson:        app.core.responses.sse_event
+
+それぞれ1回あたりの時間と、そのままのバイト数・gzip（--gzip-level）後のバイト数を出力する。
+最後に gzip の圧縮レベルごとの圧縮時間とサイズも出力する（GZIP_COMPRESS_LEVEL の目安）。
+
+使い方（backend/ から実行）:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --language en --evidences 20 --drafts 3
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import json
+import random
+import sys
+import timeit
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+
+def build_result(args: argparse.Namespace) -> dict:
+    """パイプラインの結果と同じ形（model_dump 済みの dict）の生成結果を作る"""
+    from benchmarks.micro import build_corpus
+    from app.schemas.dm import DMDraft, EvidenceItem, HookItem
+
+    rng = random.Random(args.seed)
+    corpus = build_corpus(max(args.evidences, args.hooks, args.drafts) * 4, args.language, args.seed)
+    evidences = [
+        EvidenceItem(source="news", title=r["title"], snippet=r["content"][:300], url=r["url"])
+        for r in corpus[:args.evidences]
+    ]
+    hooks = [
+        HookItem(
+            id=i + 1,
+            title=corpus[i]["title"],
+            reason=corpus[i]["content"][:160],
+            related_evidence_indices=sorted(rng.sample(range(args.evidences), min(2, args.evidences))),
+        )
+        for i in range(args.hooks)
+    ]
+    tones = ["polite", "casual", "problem_solver"]
+    drafts = [
+        DMDraft(
+            tone=tones[i % len(tones)],
+            title=corpus[i]["title"],
+            body_markdown="\n\n".join(r["content"][:400] for r in corpus[i * 3:i * 3 + 3]),
+        )
+        for i in range(args.drafts)
+    ]
+    return {
+        "evidences": [e.model_dump() for e in evidences],
+        "hooks": [h.model_dump() for h in hooks],
+        "drafts": [d.model_dump() for d in drafts],
+    }
+
+
+def _paths(result: dict) -> List[Tuple[str, Callable[[], bytes]]]:
+    from pydantic import TypeAdapter
+    from app.api.dm import _dm_response
+    from app.core.responses import sse_event
+    from app.schemas.dm import GenerateDMResponse
+
+    created_at = datetime(2026, 10, 1, 12, 0, 0)
+    # FastAPI の response_model と同じく、TypeAdapter で検証してから JSON にする
+    adapter = TypeAdapter(GenerateDMResponse)
+    event = {"stage": "completed", "result": {**result, "generation_id": 1, "run_id": "0" * 32}}
+
+    def response_pydantic() -> bytes:
+        response = GenerateDMResponse(
+            generation_id=1,
+            run_id="0" * 32,
+            evidences=result["evidences"],
+            hooks=result["hooks"],
+            drafts=result["drafts"],
+            created_at=created_at,
+        )
+        return adapter.dump_json(adapter.validate_python(response))
+
+    def response_orjson() -> bytes:
+        return _dm_response(
+            result["evidences"], result["hooks"], result["drafts"],
+            created_at=created_at, generation_id=1, run_id="0" * 32,
+        ).body
+
+    def sse_json() -> bytes:
+        return f"id: {'0' * 32}:9\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+
+    def sse_orjson() -> bytes:
+        return sse_event(f"{'0' * 32}:9", event)
+
+    return [
+        ("response pydantic", response_pydantic),
+        ("response orjson", response_orjson),
+        ("sse json", sse_json),
+        ("sse orjson", sse_orjson),
+    ]
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    """1回あたりの秒数（autorange した上で repeat 回の最良値）"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument("--language", choices=["ja", "en"], default="ja")
+    parser.add_argument("--evidences", type=int, default=8)
+    parser.add_argument("--hooks", type=int, default=5)
+    parser.add_argument("--drafts", type=int, default=3)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    result = build_result(args)
+    print(
+        f"{args.evidences} evidences, {args.hooks} hooks, {args.drafts} drafts ({args.language}), "
+        f"gzip level {args.gzip_level}\n"
+    )
+    print(f"{'path':<20}{'us/op':>10}{'bytes':>10}{'gzip bytes':>12}")
+    baseline = {}
+    for name, fn in _paths(result):
+        body = fn()
+        seconds = _time(fn, args.repeat)
+        kind = name.split()[0]
+        note = ""
+        if kind in baseline:
+            base_seconds, base_bytes = baseline[kind]
+            note = f"   ({seconds / base_seconds - 1:+.0%} CPU, {len(body) / base_bytes - 1:+.0%} bytes)"
+        else:
+            baseline[kind] = (seconds, len(body))
+        gzipped = gzip.compress(body, compresslevel=args.gzip_level)
+        print(f"{name:<20}{seconds * 1e6:>10.1f}{len(body):>10,}{len(gzipped):>12,}{note}")
+
+    body = dict(_paths(result))["response orjson"]()
+    print(f"\n{'gzip level':<20}{'us/op':>10}{'bytes':>10}")
+    for level in (1, 6, 9):
+        seconds = _time(lambda: gzip.compress(body, compresslevel=level), args.repeat)
+        print(f"{level:<20}{seconds * 1e6:>10.1f}{len(gzip.compress(body, compresslevel=level)):>10,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,57 @@
 #!/usr/bin/env python3
 """
 FastAPIサーバーの起動スクリプト
+
+    python run.py                      # 開発モード（自動リロード・1プロセス）
+    python run.py --prod               # 本番モード（SERVER_WORKERS 個のワーカープロセス）
+    python run.py --prod --workers 16
+
+本番モードでは uvicorn のプロセスマネージャーがワーカーを監視し、落ちたワーカーを再起動する。
+`kill -HUP <pid>` でワーカーを順に再起動でき、SIGTERM では
+graceful_shutdown_seconds の間、処理中のリクエストの完了を待ってから終了する。
+キャッシュ・single-flight・レートリミットは SHARED_STATE_PATH の SQLite で全ワーカーが共有する。
 """
+import argparse
+
 import uvicorn
 
-if __name__ == "__main__":
+from app.core.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Insight DM Master API server")
+    parser.add_argument("--prod", action="store_true", help="本番モード（複数ワーカー・リロードなし）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（既定: SERVER_WORKERS）")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=None,
+        help="ワーカーがこの件数を処理したら再起動する（メモリリーク対策）",
+    )
+    args = parser.parse_args()
+
+    if not args.prod:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+        )
+        return
+
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers or settings.server_workers),
+        timeout_graceful_shutdown=settings.graceful_shutdown_seconds,
+        limit_max_requests=args.max_requests,
+        proxy_headers=True,
+        log_level="info",
     )
+
+
+if __name__ == "__main__":
+    main()
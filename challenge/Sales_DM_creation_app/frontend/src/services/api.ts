@@ -108,59 +108,93 @@ export const dmApi = {
     onComplete: (result: GenerateDMResponse) => void,
     onError: (error: Error) => void
   ): Promise<void> => {
+    // 接続が途中で切れた場合は Last-Event-ID を付けて再接続し、実行中の生成に合流する
+    const maxReconnects = 5;
+    let lastEventId: string | null = null;
+    let reconnects = 0;
+
     try {
-      const response = await fetch(`${API_BASE_URL}/api/dm/generate/stream`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify(request),
-      });
-
-      if (!response.ok) {
-        const errorText = await response.text().catch(() => "");
-        throw new Error(
-          `HTTP error! status: ${response.status}${errorText ? ` - ${errorText}` : ""}`
-        );
-      }
+      while (true) {
+        let response: Response;
+        try {
+          response = await fetch(`${API_BASE_URL}/api/dm/generate/stream`, {
+            method: "POST",
+            headers: {
+              "Content-Type": "application/json",
+              ...(lastEventId ? { "Last-Event-ID": lastEventId } : {}),
+            },
+            body: JSON.stringify(request),
+          });
+        } catch (error) {
+          if (lastEventId && reconnects < maxReconnects) {
+            reconnects += 1;
+            await new Promise((resolve) => setTimeout(resolve, 1000 * reconnects));
+            continue;
+          }
+          throw error;
+        }
 
-      const reader = response.body?.getReader();
-      const decoder = new TextDecoder();
+        if (!response.ok) {
+          const errorText = await response.text().catch(() => "");
+          throw new Error(
+            `HTTP error! status: ${response.status}${errorText ? ` - ${errorText}` : ""}`
+          );
+        }
 
-      if (!reader) {
-        throw new Error("Response body is not readable");
-      }
+        const reader = response.body?.getReader();
+        const decoder = new TextDecoder();
 
-      let buffer = "";
+        if (!reader) {
+          throw new Error("Response body is not readable");
+        }
 
-      while (true) {
-        const { done, value } = await reader.read();
-        
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-        const lines = buffer.split("\n");
-        buffer = lines.pop() || "";
-
-        for (const line of lines) {
-          if (line.startsWith("data: ")) {
-            try {
-              const data = JSON.parse(line.slice(6));
-              
-              if (data.stage === "completed" && data.result) {
-                onComplete(data.result as GenerateDMResponse);
-                return;
-              } else if (data.error) {
-                onError(new Error(data.error));
-                return;
-              } else {
-                onProgress(data);
+        let buffer = "";
+
+        try {
+          while (true) {
+            const { done, value } = await reader.read();
+            
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split("\n");
+            buffer = lines.pop() || "";
+
+            for (const line of lines) {
+              if (line.startsWith("id: ")) {
+                lastEventId = line.slice(4);
+              } else if (line.startsWith("data: ")) {
+                try {
+                  const data = JSON.parse(line.slice(6));
+                  
+                  if (data.stage === "completed" && data.result) {
+                    onComplete(data.result as GenerateDMResponse);
+                    return;
+                  } else if (data.error) {
+                    onError(new Error(data.error));
+                    return;
+                  } else {
+                    onProgress(data);
+                  }
+                } catch (e) {
+                  console.error("Failed to parse SSE data:", e);
+                }
               }
-            } catch (e) {
-              console.error("Failed to parse SSE data:", e);
             }
           }
+        } catch (error) {
+          // 読み取り中の切断は再接続で回復を試みる
+          if (!lastEventId || reconnects >= maxReconnects) {
+            throw error;
+          }
+        }
+
+        // 完了イベントを受け取る前にストリームが終わった
+        if (!lastEventId || reconnects >= maxReconnects) {
+          throw new Error("ストリームが途中で切断されました");
         }
+        reconnects += 1;
+        await new Promise((resolve) => setTimeout(resolve, 1000 * reconnects));
       }
     } catch (error) {
       // より詳細なエラーメッセージを提供